@@ -0,0 +1,65 @@
+"""Gerador determinístico de vendas sintéticas (data, cliente_id, produto, valor).
+
+Distribuições assimétricas como nas lojas reais: poucos clientes concentram a
+maior parte das compras e poucos produtos a maior parte das vendas (Zipf), fim
+de semana vende mais e o movimento cresce ao longo do período. A mesma
+semente gera sempre o mesmo dataset.
+"""
+import io
+
+import numpy as np
+import pandas as pd
+
+from the_way.exportacao import MOTOR_EXCEL
+
+# Peso de cada dia da semana (segunda a domingo)
+PESO_DIA_SEMANA = np.array([0.8, 0.8, 0.9, 1.0, 1.2, 1.6, 1.1])
+
+LIMITE_LINHAS_EXCEL = 1_048_575  # uma linha fica para o cabeçalho
+
+
+def _pesos_zipf(quantidade, expoente):
+    pesos = 1.0 / np.arange(1, quantidade + 1) ** expoente
+    return pesos / pesos.sum()
+
+
+def gerar_vendas(linhas, semente=0, dias=730, clientes=None, produtos=None, inicio="2024-01-01"):
+    """DataFrame com `linhas` transações ordenadas por data.
+
+    Por padrão há ~1 cliente para cada 12 transações e 1 produto para cada
+    2.000 (entre 20 e 500 produtos).
+    """
+    rng = np.random.default_rng(semente)
+    clientes = clientes or max(linhas // 12, 10)
+    produtos = produtos or int(np.clip(linhas // 2_000, 20, 500))
+
+    # Datas: sazonalidade semanal e tendência de crescimento
+    calendario = pd.date_range(inicio, periods=dias, freq='D')
+    pesos_dias = PESO_DIA_SEMANA[calendario.dayofweek] * np.linspace(1.0, 1.5, dias)
+    dia = np.sort(rng.choice(dias, size=linhas, p=pesos_dias / pesos_dias.sum()))
+
+    # Clientes e produtos com popularidade Zipf; ids embaralhados para não seguir o ranking
+    cliente = rng.permutation(clientes)[rng.choice(clientes, size=linhas, p=_pesos_zipf(clientes, 0.7))]
+    produto = rng.choice(produtos, size=linhas, p=_pesos_zipf(produtos, 0.9))
+    nomes_clientes = np.array([f"C{i:07d}" for i in range(clientes)], dtype=object)
+    nomes_produtos = np.array([f"Produto {i:03d}" for i in range(produtos)], dtype=object)
+
+    # Preço-base por produto (log-normal) com variação de ±15% por venda (descontos, tamanhos)
+    preco_base = np.round(np.exp(rng.normal(np.log(90), 0.5, size=produtos)), 2)
+    valor = np.round(preco_base[produto] * rng.uniform(0.85, 1.15, size=linhas), 2)
+
+    return pd.DataFrame({
+        'data': calendario[dia],
+        'cliente_id': nomes_clientes[cliente],
+        'produto': nomes_produtos[produto],
+        'valor': valor,
+    })
+
+
+def para_excel(df):
+    """Bytes de uma planilha .xlsx com as datas em dd/mm/aaaa, como as exportações da loja."""
+    planilha = df.assign(data=df['data'].dt.strftime('%d/%m/%Y'))
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine=MOTOR_EXCEL) as writer:
+        planilha.to_excel(writer, index=False)
+    return buffer.getvalue()
@@ -0,0 +1,88 @@
+"""Orçamento de tempo de importação dos apps (partida a frio de um processo novo).
+
+Uso:
+    python -m benchmarks.importacao
+    python -m benchmarks.importacao --gravar-orcamento
+
+Executa só as importações do topo de cada app (sem o Streamlit rodar o script)
+num interpretador novo, com `-X importtime`, e compara o tempo total com
+`benchmarks/orcamento_importacao.json`. Sai com código 1 se algum app passar
+do orçamento e lista os módulos que mais pesaram.
+"""
+import argparse
+import ast
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+APPS = ('dashboard_the_way_completo.py', 'dashboard_the_way_mobile.py')
+ORCAMENTO = Path(__file__).with_name("orcamento_importacao.json")
+
+# Folga sobre o tempo medido ao gravar um novo orçamento
+FOLGA = 0.5
+
+
+def importacoes_do_topo(caminho):
+    """Código só com os `import` de nível de módulo do app."""
+    arvore = ast.parse(caminho.read_text(encoding='utf-8'))
+    nos = [no for no in arvore.body if isinstance(no, (ast.Import, ast.ImportFrom))]
+    return "\n".join(ast.unparse(no) for no in nos)
+
+
+def medir_app(caminho, repeticoes=3):
+    """Melhor tempo (s) de `repeticoes` partidas e os módulos de maior tempo acumulado na mais rápida."""
+    codigo = importacoes_do_topo(caminho)
+    melhor, mais_pesados = None, []
+    for _ in range(repeticoes):
+        processo = subprocess.run([sys.executable, "-X", "importtime", "-c", codigo], cwd=RAIZ,
+                                  capture_output=True, text=True, check=True)
+        modulos = []
+        for linha in processo.stderr.splitlines():
+            if not linha.startswith("import time:") or "|" not in linha:
+                continue
+            _, acumulado, nome = (parte.strip() for parte in linha.split("|"))
+            # Só os importados diretamente (sem recuo): o acumulado deles já inclui os demais
+            if acumulado.isdigit() and not linha.split("|")[2].startswith("  "):
+                modulos.append((nome, int(acumulado) / 1e6))
+        total = sum(segundos for _, segundos in modulos)
+        if melhor is None or total < melhor:
+            melhor, mais_pesados = total, sorted(modulos, key=lambda item: -item[1])[:5]
+    return melhor, mais_pesados
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tempo de importação dos apps contra o orçamento.")
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--orcamento', default=str(ORCAMENTO))
+    parser.add_argument('--gravar-orcamento', action='store_true',
+                        help=f"Grava o tempo medido + {FOLGA:.0%} como novo orçamento")
+    args = parser.parse_args(argv)
+
+    caminho_orcamento = Path(args.orcamento)
+    orcamento = json.loads(caminho_orcamento.read_text(encoding='utf-8')) if caminho_orcamento.exists() else {}
+    medidos, estourados = {}, []
+    for app in APPS:
+        segundos, mais_pesados = medir_app(RAIZ / app, args.repeticoes)
+        medidos[app] = segundos
+        limite = orcamento.get(app)
+        situacao = "" if limite is None else (f"✅ orçamento {limite:.2f}s" if segundos <= limite
+                                               else f"❌ orçamento {limite:.2f}s")
+        print(f"{app:<32} {segundos:>6.2f}s {situacao}")
+        print("   " + ", ".join(f"{nome} {tempo:.2f}s" for nome, tempo in mais_pesados))
+        if limite is not None and segundos > limite:
+            estourados.append(app)
+
+    if args.gravar_orcamento:
+        novo = {app: round(segundos * (1 + FOLGA), 2) for app, segundos in medidos.items()}
+        caminho_orcamento.write_text(json.dumps(novo, indent=2) + "\n", encoding='utf-8')
+        print(f"💾 Orçamento gravado em {caminho_orcamento}")
+        return 0
+    if not orcamento:
+        print("ℹ️ Sem orçamento para comparar (use --gravar-orcamento).")
+    return 1 if estourados else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
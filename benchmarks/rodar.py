@@ -0,0 +1,291 @@
+"""Benchmark das etapas do dashboard sobre vendas sintéticas.
+
+Uso:
+    python -m benchmarks.rodar --linhas 10k,100k,1m
+    python -m benchmarks.rodar --linhas 10k,100k --gravar-baseline
+    python -m benchmarks.rodar --linhas 20m --max-linhas-excel 0
+
+Mede cada etapa (leitura do Excel, cache em disco, estado incremental, cubo,
+`calcular_todas_estatisticas` em série e no pool de threads, métricas
+rápidas do mobile, filtros e exportações) e cada métrica do grafo isoladamente (tempo próprio, com as
+dependências já calculadas). O tempo é o melhor de N repetições; o pico de
+memória vem de uma execução extra sob tracemalloc. O resultado é comparado com
+`benchmarks/baseline.json` e as regressões acima da tolerância são apontadas.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+# Cache de ingestão e exportações num diretório descartável, antes de importar the_way
+DIRETORIO_TEMPORARIO = Path(tempfile.mkdtemp(prefix="the_way_bench_"))
+os.environ["THE_WAY_CACHE_DIR"] = str(DIRETORIO_TEMPORARIO / "cache")
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+import pyarrow  # noqa: E402
+
+from benchmarks.gerador import LIMITE_LINHAS_EXCEL, gerar_vendas, para_excel  # noqa: E402
+from the_way import armazem, cubo, estatisticas, exportacao, incremental, ingestao  # noqa: E402
+
+MB = 1024 * 1024
+
+BASELINE = Path(__file__).with_name("baseline.json")
+
+# O que a aba Dashboard do mobile lê (ver calcular_metricas_rapidas)
+METRICAS_RAPIDAS = [
+    'fatos_bruto', 'vendas_mensais', 'faturamento_total', 'total_vendas', 'ticket_medio',
+    'total_clientes', 'produto_mais_vendido', 'valor_produto_mais_vendido', 'taxa_churn',
+    'ltv_medio', 'produtos',
+]
+
+# Diferenças abaixo disso são ruído de medição, não regressão
+PISO_SEGUNDOS = 0.01
+PISO_MB = 1.0
+
+
+def _tamanho(texto):
+    """'10k' -> 10_000, '2m' -> 2_000_000."""
+    multiplicadores = {'k': 1_000, 'm': 1_000_000}
+    texto = texto.strip().lower()
+    if texto[-1] in multiplicadores:
+        return int(float(texto[:-1]) * multiplicadores[texto[-1]])
+    return int(texto)
+
+
+def medir(funcao, preparar=None, repeticoes=3):
+    """Melhor tempo de `repeticoes` execuções e pico de memória (MB) de uma execução extra."""
+    tempos = []
+    for _ in range(repeticoes):
+        if preparar:
+            preparar()
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    if preparar:
+        preparar()
+    tracemalloc.start()
+    try:
+        funcao()
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'segundos': min(tempos), 'pico_mb': pico / MB}
+
+
+def ordem_topologica(nomes):
+    """Métricas necessárias para `nomes`, cada uma depois das suas dependências."""
+    ordem, vistos = [], set()
+
+    def visitar(nome):
+        if nome in vistos or nome not in estatisticas.METRICAS:
+            return
+        vistos.add(nome)
+        for dependencia in estatisticas.METRICAS[nome].dependencias:
+            visitar(dependencia)
+        ordem.append(nome)
+
+    for nome in nomes:
+        visitar(nome)
+    return ordem
+
+
+def medir_metricas(entradas, repeticoes=3):
+    """Tempo próprio e pico de memória de cada métrica do grafo."""
+    ordem = ordem_topologica(estatisticas.ESTATISTICAS)
+    tempos = {nome: [] for nome in ordem}
+    for _ in range(repeticoes):
+        stats = estatisticas.Estatisticas(**entradas)
+        for nome in ordem:
+            inicio = time.perf_counter()
+            stats[nome]
+            tempos[nome].append(time.perf_counter() - inicio)
+
+    picos = {}
+    stats = estatisticas.Estatisticas(**entradas)
+    tracemalloc.start()
+    try:
+        for nome in ordem:
+            tracemalloc.reset_peak()
+            base, _ = tracemalloc.get_traced_memory()
+            stats[nome]
+            picos[nome] = (tracemalloc.get_traced_memory()[1] - base) / MB
+    finally:
+        tracemalloc.stop()
+    return {nome: {'segundos': min(tempos[nome]), 'pico_mb': picos[nome]} for nome in ordem}
+
+
+def _limpar_ingestao():
+    armazem.ARMAZEM.limpar()
+    shutil.rmtree(ingestao.DIRETORIO_CACHE, ignore_errors=True)
+
+
+def medir_tamanho(linhas, semente, repeticoes, max_linhas_excel, trabalhadores):
+    """Todas as etapas para um dataset de `linhas` transações."""
+    print(f"\n📦 {linhas:,} linhas", flush=True)
+    etapas = {}
+
+    def registrar(nome, funcao, preparar=None, vezes=repeticoes):
+        etapas[nome] = medir(funcao, preparar, vezes)
+        print(f"   {nome:<28} {etapas[nome]['segundos']:>9.3f}s {etapas[nome]['pico_mb']:>9.1f} MB", flush=True)
+
+    df_bruto = gerar_vendas(linhas, semente=semente)
+    com_excel = linhas <= min(max_linhas_excel, LIMITE_LINHAS_EXCEL)
+    if com_excel:
+        conteudo = para_excel(df_bruto)
+        # Leitura a frio (Excel + gravação do cache) é lenta: uma repetição basta
+        registrar('carregar_excel', lambda: ingestao.carregar_planilha(conteudo), _limpar_ingestao, vezes=1)
+        registrar('carregar_streaming', lambda: ingestao.carregar_planilha(conteudo, streaming=True),
+                  _limpar_ingestao, vezes=1)
+        df_bruto = ingestao.carregar_planilha(conteudo).df
+    else:
+        # Mesmo formato que a ingestão entrega: ordenado por data e indexado pelo dia
+        df_bruto = ingestao.ordenar_por_data(df_bruto)
+
+    total = ingestao.relatorio_memoria(df_bruto).loc['Total']
+    memoria = {'amplo_mb': total['bytes antes'] / MB, 'compacto_mb': total['bytes depois'] / MB}
+    print(f"   {'dataset em memória':<28} {memoria['amplo_mb']:>8.1f} MB → {memoria['compacto_mb']:.1f} MB "
+          f"(modelo compacto)", flush=True)
+
+    arquivo_cache = DIRETORIO_TEMPORARIO / "bench.arrow"
+    registrar('gravar_cache', lambda: ingestao._gravar_cache(df_bruto, arquivo_cache))
+    registrar('carregar_disco', lambda: ingestao._ler_cache(arquivo_cache))
+
+    hoje = df_bruto['data'].max()
+    registrar('estado_incremental', lambda: incremental.EstadoAgregado.de_transacoes(df_bruto))
+    estado = incremental.EstadoAgregado.de_transacoes(df_bruto)
+    registrar('cubo', lambda: cubo.CuboVendas.de_transacoes(df_bruto))
+    cubo_vendas = cubo.CuboVendas.de_transacoes(df_bruto)
+
+    registrar('calcular_todas_estatisticas',
+              lambda: estatisticas.calcular_todas_estatisticas(df_bruto, df_bruto, hoje, 30, trabalhadores=1))
+    registrar('calcular_todas_paralelo',
+              lambda: estatisticas.calcular_todas_estatisticas(df_bruto, df_bruto, hoje, 30,
+                                                               trabalhadores=trabalhadores))
+    aceleracao = etapas['calcular_todas_estatisticas']['segundos'] / etapas['calcular_todas_paralelo']['segundos']
+    print(f"   {'aceleração paralela':<28} {aceleracao:>9.2f}x com {trabalhadores} threads", flush=True)
+
+    entradas = dict(df_bruto=df_bruto, hoje=hoje, dias_projecao=30, estado=estado, cubo_vendas=cubo_vendas)
+
+    def metricas_rapidas():
+        stats = estatisticas.Estatisticas(**entradas)
+        return [stats[nome] for nome in METRICAS_RAPIDAS]
+
+    registrar('metricas_rapidas', metricas_rapidas)
+
+    # Metade dos produtos e o miolo do período, como um filtro típico da barra lateral
+    produtos = cubo_vendas.produtos[::2].tolist()
+    dias = cubo_vendas.dias
+    inicio = pd.Timestamp(dias[len(dias) // 4]).date()
+    fim = pd.Timestamp(dias[3 * len(dias) // 4]).date()
+
+    def filtrar():
+        filtros = estatisticas.normalizar_filtros(cubo_vendas, produtos, inicio, fim)
+        stats = estatisticas.Estatisticas(**entradas, produtos_selecionados=filtros[0],
+                                          data_inicio=filtros[1], data_fim=filtros[2])
+        return [stats[nome] for nome in ('df', 'agregados', 'faturamento_total', 'total_vendas', 'curva_abc')]
+
+    registrar('filtros', filtrar)
+
+    destino = DIRETORIO_TEMPORARIO / "exportacao"
+    registrar('exportar_csv', lambda: exportacao.escrever_csv(destino.with_suffix('.csv'), df_bruto), vezes=1)
+    if com_excel:
+        registrar('exportar_excel',
+                  lambda: exportacao.escrever_excel(destino.with_suffix('.xlsx'), {'Vendas': (df_bruto, False)}),
+                  vezes=1)
+
+    metricas = medir_metricas(entradas, repeticoes)
+    mais_lentas = sorted(metricas.items(), key=lambda item: -item[1]['segundos'])[:5]
+    print("   métricas mais lentas: " + ", ".join(f"{nome} {m['segundos'] * 1000:.1f}ms" for nome, m in mais_lentas))
+    return {'etapas': etapas, 'metricas': metricas, 'aceleracao_paralela': aceleracao, 'memoria_dataset': memoria}
+
+
+def ambiente():
+    return {
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'pyarrow': pyarrow.__version__,
+        'processador': platform.processor() or platform.machine(),
+        'nucleos': os.cpu_count(),
+        'trabalhadores': estatisticas.TRABALHADORES_PADRAO,
+    }
+
+
+def comparar(resultado, baseline, tolerancia):
+    """Lista de regressões (tempo ou memória) em relação à baseline."""
+    regressoes = []
+    for linhas, atual in resultado['tamanhos'].items():
+        anterior = baseline.get('tamanhos', {}).get(linhas)
+        if anterior is None:
+            continue
+        for grupo in ('etapas', 'metricas'):
+            for nome, medida in atual[grupo].items():
+                base = anterior[grupo].get(nome)
+                if base is None:
+                    continue
+                for campo, piso in (('segundos', PISO_SEGUNDOS), ('pico_mb', PISO_MB)):
+                    if medida[campo] > base[campo] * (1 + tolerancia) and medida[campo] - base[campo] > piso:
+                        regressoes.append((int(linhas), grupo, nome, campo, base[campo], medida[campo]))
+    return regressoes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark reprodutível do dashboard The Way.")
+    parser.add_argument('--linhas', default="10k,100k", help="Tamanhos separados por vírgula (ex.: 10k,1m,20m)")
+    parser.add_argument('--semente', type=int, default=0)
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--max-linhas-excel', type=_tamanho, default=200_000,
+                        help="Acima disso não gera planilha (leitura e exportação Excel ficam de fora)")
+    parser.add_argument('--saida', default="benchmarks/resultados.json")
+    parser.add_argument('--baseline', default=str(BASELINE))
+    parser.add_argument('--gravar-baseline', action='store_true', help="Grava o resultado como nova baseline")
+    parser.add_argument('--tolerancia', type=float, default=0.25, help="Piora relativa aceita (padrão: 0.25)")
+    parser.add_argument('--trabalhadores', type=int, default=max(estatisticas.TRABALHADORES_PADRAO, 2),
+                        help="Threads da etapa calcular_todas_paralelo (padrão: as do dashboard, no mínimo 2)")
+    parser.add_argument('--falhar-em-regressao', action='store_true', help="Código de saída 1 se houver regressão")
+    args = parser.parse_args(argv)
+
+    resultado = {'ambiente': ambiente(), 'semente': args.semente, 'trabalhadores': args.trabalhadores,
+                 'tamanhos': {}}
+    try:
+        for texto in args.linhas.split(','):
+            linhas = _tamanho(texto)
+            resultado['tamanhos'][str(linhas)] = medir_tamanho(linhas, args.semente, args.repeticoes,
+                                                              args.max_linhas_excel, args.trabalhadores)
+    finally:
+        shutil.rmtree(DIRETORIO_TEMPORARIO, ignore_errors=True)
+    resultado['pico_processo_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    destino = Path(args.baseline if args.gravar_baseline else args.saida)
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    destino.write_text(json.dumps(resultado, indent=2, ensure_ascii=False), encoding='utf-8')
+    print(f"\n💾 Resultado gravado em {destino}")
+    if args.gravar_baseline:
+        return 0
+
+    caminho_baseline = Path(args.baseline)
+    if not caminho_baseline.exists():
+        print("ℹ️ Sem baseline para comparar (use --gravar-baseline).")
+        return 0
+    regressoes = comparar(resultado, json.loads(caminho_baseline.read_text(encoding='utf-8')), args.tolerancia)
+    if not regressoes:
+        print(f"✅ Nenhuma regressão acima de {args.tolerancia:.0%} em relação à baseline.")
+        return 0
+    print(f"⚠️ {len(regressoes)} regressões acima de {args.tolerancia:.0%}:")
+    for linhas, grupo, nome, campo, antes, depois in regressoes:
+        unidade = 's' if campo == 'segundos' else ' MB'
+        print(f"   {linhas:>11,} {grupo:<8} {nome:<28} {antes:.3f}{unidade} → {depois:.3f}{unidade} "
+              f"({depois / antes if antes else float('inf'):.2f}x)")
+    return 1 if args.falhar_em_regressao else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
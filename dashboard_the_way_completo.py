@@ -1,29 +1,106 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
 import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import matplotlib.pyplot as plt
-import seaborn as sns
-import io
+import os
 from pathlib import Path
-from datetime import datetime, timedelta
-from scipy import stats
+from datetime import datetime
+
+from the_way import (afinidade, armazem, banco, cache_resultados, consolidacao, coortes, cubo, estatisticas,
+                     exportacao, graficos, incremental, ingestao, instrumentacao, preaquecimento, projecao, sketches)
 
 # --- CONFIGURAÇÃO DA PÁGINA ---
 st.set_page_config(page_title="Dashboard The Way - Completo", layout="wide", page_icon="👕")
 
+# Processo novo: com THE_WAY_PREAQUECER=1, o último dataset é preparado enquanto o login é exibido
+preaquecimento.iniciar()
+
 # --- DICA DE OURO: FUNÇÃO DE CACHE ---
-@st.cache_data
-def carregar_dados(arquivo):
-    """Lê o arquivo uma única vez e mantém na memória."""
-    df = pd.read_excel(arquivo)
-    df['data'] = pd.to_datetime(df['data'], format='mixed', dayfirst=True)
-    return df
+def carregar_dados(arquivo, streaming=False):
+    """Lê o arquivo uma única vez: depois serve do cache colunar (memória ou disco)."""
+    barra = None
+
+    def progresso(fracao, linhas):
+        nonlocal barra
+        if barra is None:
+            barra = st.sidebar.progress(0.0)
+        barra.progress(fracao, text=f"Lendo planilha... {linhas:,} linhas")
+
+    try:
+        resultado = ingestao.carregar_planilha(arquivo.getvalue(), streaming=streaming, progresso=progresso)
+    except ValueError as erro:
+        st.sidebar.error(f"Planilha inválida: {erro}")
+        st.stop()
+    if barra is not None:
+        barra.empty()
+    # A sessão segura o dataset compartilhado enquanto estiver usando este arquivo
+    st.session_state["reserva_dataset"] = armazem.ARMAZEM.reservar(
+        resultado.chave, st.session_state.get("reserva_dataset"))
+    if resultado.origem != 'memoria':
+        preaquecimento.registrar(arquivo.name, resultado.chave)
+    return resultado
+
+def carregar_banco(arquivo):
+    """Abre (ou cria, na primeira vez) o banco SQLite da planilha."""
+    barra = st.sidebar.progress(0.0)
+    try:
+        resultado = banco.carregar_banco(
+            arquivo.getvalue(),
+            progresso=lambda fracao, linhas: barra.progress(fracao, text=f"Lendo planilha... {linhas:,} linhas"))
+    except ValueError as erro:
+        st.sidebar.error(f"Planilha inválida: {erro}")
+        st.stop()
+    barra.empty()
+    return resultado
+
+def carregar_lojas(arquivos):
+    """Várias planilhas: cada uma vira um parcial agregado (em processos separados) e os parciais são mesclados."""
+    barra = st.sidebar.progress(0.0)
+    try:
+        resultado = consolidacao.consolidar(
+            [(arquivo.name, arquivo.getvalue()) for arquivo in arquivos],
+            progresso=lambda fracao, prontas: barra.progress(fracao, text=f"Consolidando... {prontas} de {len(arquivos)}"))
+    except ValueError as erro:
+        st.sidebar.error(f"Planilha inválida: {erro}")
+        st.stop()
+    barra.empty()
+    return resultado
+
+# --- EXPORTAÇÃO SOB DEMANDA ---
+def botao_exportar(rotulo, chave, extensao, montar_dados, nome_arquivo, **opcoes):
+    """Só gera o arquivo quando pedido (em segundo plano); depois oferece o download do cache."""
+    situacao = exportacao.situacao(chave, extensao)
+    if situacao in (None, 'erro'):
+        if situacao == 'erro':
+            st.error(f"❌ Falha ao gerar {rotulo}. Tente novamente.")
+        espaco = st.empty()
+        if not espaco.button(f"⚙️ Preparar {rotulo}", key=f"preparar_{chave}_{extensao}", **opcoes):
+            return
+        espaco.empty()
+        exportacao.solicitar(chave, extensao, montar_dados())
+        exportacao.aguardar(chave, extensao, exportacao.ESPERA_SEGUNDOS)
+        situacao = exportacao.situacao(chave, extensao)
+    dados = exportacao.ler(chave, extensao) if situacao == 'pronto' else None
+    if dados is not None:
+        st.download_button(
+            label=f"📥 Baixar {rotulo}",
+            data=dados,
+            file_name=nome_arquivo,
+            mime=exportacao.TIPOS[extensao],
+            key=f"baixar_{chave}_{extensao}",
+            **opcoes
+        )
+    elif situacao == 'pronto':
+        # Saiu do cache (limpeza de outra sessão) entre a consulta e a leitura
+        st.caption(f"♻️ {rotulo} saiu do cache de exportações.")
+        st.button("🔄 Atualizar", key=f"atualizar_{chave}_{extensao}", **opcoes)
+    else:
+        st.caption(f"⏳ Gerando {rotulo} em segundo plano...")
+        st.button("🔄 Atualizar", key=f"atualizar_{chave}_{extensao}", **opcoes)
 
 # --- SISTEMA DE LOGIN ---
 SENHA_CORRETA = "theway2026"
+# Senha de administrador (painel de instrumentação); sem a variável, não há acesso admin
+SENHA_ADMIN = os.environ.get("THE_WAY_SENHA_ADMIN")
 
 def verificar_senha():
     if "autenticado" not in st.session_state:
@@ -38,185 +115,15 @@ def verificar_senha():
                 if senha_digitada == SENHA_CORRETA:
                     st.session_state["autenticado"] = True
                     st.rerun()
+                elif SENHA_ADMIN and senha_digitada == SENHA_ADMIN:
+                    st.session_state["autenticado"] = True
+                    st.session_state["admin"] = True
+                    st.rerun()
                 else:
                     st.error("Senha incorreta!")
         return False
     return True
 
-# --- FUNÇÕES DE CÁLCULO DE ESTATÍSTICAS ---
-
-def calcular_todas_estatisticas(df_bruto, df, hoje, dias_projecao):
-    """Calcula todas as 33 estatísticas"""
-    
-    stats_dict = {}
-    
-    # 1. TOTAL DE VENDAS (quantidade de transações)
-    stats_dict['total_vendas'] = len(df)
-    
-    # 2. FATURAMENTO TOTAL
-    stats_dict['faturamento_total'] = df['valor'].sum()
-    
-    # 3. TICKET MÉDIO
-    stats_dict['ticket_medio'] = df['valor'].mean()
-    
-    # 4. TICKET MEDIANO
-    stats_dict['ticket_mediano'] = df['valor'].median()
-    
-    # 5. VALOR MÍNIMO
-    stats_dict['valor_minimo'] = df['valor'].min()
-    
-    # 6. VALOR MÁXIMO
-    stats_dict['valor_maximo'] = df['valor'].max()
-    
-    # 7. TOTAL DE CLIENTES ÚNICOS
-    stats_dict['total_clientes'] = df['cliente_id'].nunique()
-    
-    # 8. CLIENTES RECORRENTES (2+ compras)
-    cliente_compras = df.groupby('cliente_id').size()
-    stats_dict['clientes_recorrentes'] = len(cliente_compras[cliente_compras >= 2])
-    
-    # 9. TAXA DE CLIENTES RECORRENTES
-    stats_dict['taxa_recorrencia'] = (stats_dict['clientes_recorrentes'] / stats_dict['total_clientes'] * 100) if stats_dict['total_clientes'] > 0 else 0
-    
-    # 10. PRODUTO MAIS VENDIDO
-    produto_vendas = df.groupby('produto')['valor'].sum().idxmax()
-    stats_dict['produto_mais_vendido'] = produto_vendas
-    stats_dict['valor_produto_mais_vendido'] = df.groupby('produto')['valor'].sum().max()
-    
-    # 11. PRODUTO MENOS VENDIDO
-    produto_menos = df.groupby('produto')['valor'].sum().idxmin()
-    stats_dict['produto_menos_vendido'] = produto_menos
-    stats_dict['valor_produto_menos_vendido'] = df.groupby('produto')['valor'].sum().min()
-    
-    # 12. AOV (Average Order Value)
-    stats_dict['aov'] = df.groupby('cliente_id')['valor'].sum().mean()
-    
-    # 13. LIFETIME VALUE (LTV) - Total gasto por cliente
-    ltv_clientes = df_bruto.groupby('cliente_id')['valor'].sum().reset_index()
-    stats_dict['ltv_medio'] = ltv_clientes['valor'].mean()
-    stats_dict['ltv_max'] = ltv_clientes['valor'].max()
-    
-    # 14. FREQUÊNCIA MÉDIA DE COMPRA (dias entre compras)
-    freq_compra = df.sort_values(['cliente_id', 'data']).groupby('cliente_id')['data'].diff().dt.days.mean()
-    stats_dict['freq_compra_dias'] = freq_compra if pd.notna(freq_compra) else 0
-    
-    # 15. TAXA DE CHURN (180 dias)
-    ultima_visita = df_bruto.groupby('cliente_id')['data'].max().reset_index()
-    ultima_visita['dias_parado'] = (hoje - ultima_visita['data']).dt.days
-    ultima_visita['status'] = ultima_visita['dias_parado'].apply(lambda x: 'Churn' if x > 180 else 'Ativo')
-    stats_dict['taxa_churn'] = (len(ultima_visita[ultima_visita['status'] == 'Churn']) / len(ultima_visita) * 100) if len(ultima_visita) > 0 else 0
-    
-    # 16. TAXA DE RETENÇÃO
-    stats_dict['taxa_retencao'] = 100 - stats_dict['taxa_churn']
-    
-    # 17. CLIENTES DORMENTES (90+ dias sem comprar)
-    clientes_dormentes = len(ultima_visita[ultima_visita['dias_parado'] > 90])
-    stats_dict['clientes_dormentes'] = clientes_dormentes
-    stats_dict['taxa_dormentes'] = (clientes_dormentes / len(ultima_visita) * 100) if len(ultima_visita) > 0 else 0
-    
-    # 18. CLIENTES EM RISCO (30-90 dias)
-    clientes_risco = len(ultima_visita[(ultima_visita['dias_parado'] > 30) & (ultima_visita['dias_parado'] <= 90)])
-    stats_dict['clientes_risco'] = clientes_risco
-    
-    # 19. CLIENTE MELHOR PAGADOR
-    cliente_top = df.groupby('cliente_id')['valor'].sum().idxmax()
-    stats_dict['cliente_top'] = cliente_top
-    stats_dict['valor_cliente_top'] = df.groupby('cliente_id')['valor'].sum().max()
-    
-    # 20. TOP 5 CLIENTES
-    top_5_clientes = df.groupby('cliente_id')['valor'].sum().nlargest(5).reset_index()
-    stats_dict['top_5_clientes'] = top_5_clientes
-    
-    # 21. CRESCIMENTO MOM (Mês a Mês)
-    df_temp = df.copy()
-    df_temp['mes_ano'] = df_temp['data'].dt.to_period('M')
-    vendas_mensais = df_temp.groupby('mes_ano')['valor'].sum()
-    if len(vendas_mensais) >= 2:
-        crescimento_mom = ((vendas_mensais.iloc[-1] - vendas_mensais.iloc[-2]) / vendas_mensais.iloc[-2] * 100) if vendas_mensais.iloc[-2] > 0 else 0
-    else:
-        crescimento_mom = 0
-    stats_dict['crescimento_mom'] = crescimento_mom
-    
-    # 22. SAZONALIDADE MENSAL
-    stats_dict['vendas_mensais'] = vendas_mensais
-    
-    # 23. DISTRIBUIÇÃO POR DIA DA SEMANA
-    df_temp['dia_semana'] = df_temp['data'].dt.day_name()
-    stats_dict['vendas_por_dia_semana'] = df_temp.groupby('dia_semana')['valor'].sum()
-    
-    # 24. PROJEÇÃO FINANCEIRA
-    imr_global = df.sort_values(['cliente_id', 'data']).groupby('cliente_id')['data'].diff().dt.days.mean()
-    ultima_visita['prevista'] = ultima_visita['data'] + pd.to_timedelta(imr_global, unit='D')
-    proximos = ultima_visita[(ultima_visita['prevista'] > hoje) & 
-                             (ultima_visita['prevista'] <= hoje + pd.Timedelta(days=dias_projecao)) &
-                             (ultima_visita['status'] == 'Ativo')]
-    faturamento_por_cliente = df.groupby('cliente_id')['valor'].mean().reset_index()
-    faturamento_proj = proximos.merge(faturamento_por_cliente, on='cliente_id')['valor'].sum()
-    stats_dict['faturamento_projecao'] = faturamento_proj
-    
-    # 25. MATRIZ RFM (Recency, Frequency, Monetary)
-    rfm = df_bruto.groupby('cliente_id').agg({
-        'data': lambda x: (hoje - x.max()).days,
-        'cliente_id': 'count',
-        'valor': 'sum'
-    }).rename(columns={'data': 'recency', 'cliente_id': 'frequency', 'valor': 'monetary'})
-    stats_dict['rfm'] = rfm
-    
-    # 26. SEGMENTAÇÃO DE CLIENTES POR FAIXA DE GASTO
-    ltv_clientes_seg = df_bruto.groupby('cliente_id')['valor'].sum().reset_index()
-    ltv_clientes_seg['segmento'] = pd.cut(ltv_clientes_seg['valor'], 
-                                           bins=[0, ltv_clientes_seg['valor'].quantile(0.33), 
-                                                 ltv_clientes_seg['valor'].quantile(0.66), 
-                                                 ltv_clientes_seg['valor'].max()],
-                                           labels=['Básico', 'Standard', 'Premium'])
-    stats_dict['segmentacao_clientes'] = ltv_clientes_seg['segmento'].value_counts()
-    
-    # 27. ELASTICIDADE DE PREÇO (variação de preço vs quantidade)
-    produto_preco = df.groupby('produto').agg({'valor': ['mean', 'count']})
-    stats_dict['elasticidade_preco'] = produto_preco
-    
-    # 28. PRODUTOS MAIS FREQUENTES
-    produtos_freq = df['produto'].value_counts().head(5)
-    stats_dict['produtos_frequentes'] = produtos_freq
-    
-    # 29. VARIÂNCIA DE VENDAS
-    stats_dict['desvio_padrao'] = df['valor'].std()
-    stats_dict['coeficiente_variacao'] = (stats_dict['desvio_padrao'] / stats_dict['ticket_medio'] * 100) if stats_dict['ticket_medio'] > 0 else 0
-    
-    # 30. PERCENTIS DE VENDA
-    stats_dict['percentil_25'] = df['valor'].quantile(0.25)
-    stats_dict['percentil_50'] = df['valor'].quantile(0.50)
-    stats_dict['percentil_75'] = df['valor'].quantile(0.75)
-    stats_dict['percentil_90'] = df['valor'].quantile(0.90)
-    
-    # 31. ÍNDICE DE CONCENTRAÇÃO (Curva ABC)
-    abc = df.groupby('produto')['valor'].sum().sort_values(ascending=False).reset_index()
-    abc['Participação %'] = (abc['valor'] / abc['valor'].sum() * 100).round(1)
-    abc['Cumulative %'] = abc['Participação %'].cumsum()
-    stats_dict['curva_abc'] = abc
-    
-    # 32. ANÁLISE DE COHORT (Clientes por período)
-    df_cohort = df_bruto.copy()
-    df_cohort['cohort_mes'] = df_cohort['data'].dt.to_period('M')
-    stats_dict['cohort_periodo'] = df_cohort.groupby('cohort_mes')['cliente_id'].nunique()
-    
-    # 33. RECOMENDAÇÃO DE AÇÕES
-    recomendacoes = []
-    if stats_dict['taxa_churn'] > 30:
-        recomendacoes.append("🔴 ALERTA: Taxa de churn acima de 30%! Foco em retenção.")
-    if stats_dict['taxa_dormentes'] > 20:
-        recomendacoes.append("🟡 AVISO: Mais de 20% de clientes dormentes. Campanhas de reativação necessárias.")
-    if stats_dict['crescimento_mom'] < 0:
-        recomendacoes.append("📉 Vendas em queda MoM. Revisar estratégia.")
-    if stats_dict['taxa_recorrencia'] > 50:
-        recomendacoes.append("✅ Excelente! Mais de 50% de clientes recorrentes.")
-    if len(recomendacoes) == 0:
-        recomendacoes.append("✅ Dashboard operacional. Monitore continuamente.")
-    
-    stats_dict['recomendacoes'] = recomendacoes
-    
-    return stats_dict
-
 # --- EXECUÇÃO DO DASHBOARD ---
 if verificar_senha():
     # Barra Lateral - Tentar carregar logo com fallback
@@ -228,16 +135,76 @@ if verificar_senha():
     
     st.sidebar.title("⚙️ Menu de Gestão")
     
-    arquivo_upload = st.sidebar.file_uploader("1. Suba o arquivo Excel", type=['xlsx'])
+    arquivos_upload = st.sidebar.file_uploader(
+        "1. Suba o arquivo Excel", type=['xlsx'], accept_multiple_files=True,
+        help="Várias planilhas (uma por loja ou por mês) são consolidadas numa visão única."
+    )
+
+    if arquivos_upload:
+        # Instrumentação opcional (painel do admin): etapas marcadas ao longo do rerun
+        medidor = instrumentacao.medidor_da_sessao(st.session_state)
+
+        consolidado = None
+        if len(arquivos_upload) > 1:
+            # Várias lojas: só os agregados de cada planilha chegam ao app
+            medidor.marcar("carregar_dados")
+            consolidado = ingestao_info = carregar_lojas(arquivos_upload)
+            st.sidebar.caption(consolidado.descricao())
+            banco_vendas = df_bruto = None
+            estado = consolidado.estado
+            hoje = consolidado.hoje
+            cubo_vendas = consolidado.cubo
+            lista_produtos = cubo_vendas.produtos.tolist()
+            data_minima, data_maxima = pd.Timestamp(cubo_vendas.dias[0]), pd.Timestamp(cubo_vendas.dias[-1])
+        else:
+            arquivo_upload = arquivos_upload[0]
+
+            # Backend: tudo em memória ou banco local, com filtros e agregações feitos por consulta
+            backends = list(banco.BACKENDS)
+            backend = st.sidebar.radio(
+                "Processamento:", backends, index=backends.index(banco.BACKEND_PADRAO), format_func=banco.BACKENDS.get,
+                help="O banco local (SQLite) não carrega as transações na memória: cada filtro vira uma consulta."
+            )
 
-    if arquivo_upload is not None:
-        # Chamada da função com Cache
-        df_bruto = carregar_dados(arquivo_upload)
-        hoje = df_bruto['data'].max()
+            if backend == 'sqlite':
+                medidor.marcar("carregar_dados")
+                ingestao_info = carregar_banco(arquivo_upload)
+                banco_vendas = ingestao_info.banco
+                st.sidebar.caption(ingestao_info.descricao())
+                st.sidebar.caption(banco_vendas.descricao())
+                df_bruto = estado = None
+                hoje = banco_vendas.hoje
+                cubo_vendas = banco_vendas.cubo()
+                lista_produtos = cubo_vendas.produtos.tolist()
+                data_minima, data_maxima = pd.Timestamp(cubo_vendas.dias[0]), pd.Timestamp(cubo_vendas.dias[-1])
+            else:
+                # Arquivos grandes: leitura em lotes com memória controlada
+                tamanho_arquivo = len(arquivo_upload.getvalue())
+                modo_streaming = st.sidebar.checkbox(
+                    "Leitura em streaming (arquivos grandes)",
+                    value=tamanho_arquivo > ingestao.LIMITE_STREAMING_BYTES,
+                    help="Lê a planilha em lotes, com pico de memória menor. Traz apenas as colunas data, cliente_id, produto e valor."
+                )
+
+                # Chamada da função com Cache
+                medidor.marcar("carregar_dados")
+                ingestao_info = carregar_dados(arquivo_upload, streaming=modo_streaming)
+                banco_vendas = None
+                df_bruto = ingestao_info.df
+                st.sidebar.caption(ingestao_info.descricao())
+
+                # Estado agregado do histórico: só as linhas novas são agregadas
+                medidor.marcar("estado_incremental")
+                estado, modo_estado = incremental.estado_para(arquivo_upload.name, ingestao_info.chave, df_bruto)
+                st.sidebar.caption(incremental.MODOS[modo_estado])
+                hoje = df_bruto['data'].max()
+                cubo_vendas = cubo.cubo_para(ingestao_info.chave, df_bruto)
+                lista_produtos = cubo_vendas.produtos.tolist()
+                data_minima, data_maxima = df_bruto['data'].min(), df_bruto['data'].max()
 
         # Filtro de Produtos
+        medidor.marcar("barra_lateral")
         st.sidebar.markdown("---")
-        lista_produtos = sorted(df_bruto['produto'].unique().tolist())
         produtos_selecionados = st.sidebar.multiselect(
             "2. Filtre por Produto:",
             options=lista_produtos,
@@ -247,42 +214,86 @@ if verificar_senha():
         # Slider de Projeção
         dias_projecao = st.sidebar.slider("3. Horizonte de Projeção (dias):", 7, 90, 30)
 
+        # Limites de recência (dias sem comprar): mudar é só uma nova busca no índice de recência
+        with st.sidebar.expander("⏱️ Limites de Recência"):
+            limite_risco, limite_dormente = st.slider("Em risco / dormente após (dias sem comprar):", 1, 365, (30, 90))
+            limite_churn = st.slider("Churn após (dias sem comprar):", limite_dormente, 730, max(180, limite_dormente))
+        limites = (limite_risco, limite_dormente, limite_churn)
+
         # Filtro de Data
         st.sidebar.markdown("---")
-        data_inicio = st.sidebar.date_input("Data Inicial:", value=df_bruto['data'].min())
-        data_fim = st.sidebar.date_input("Data Final:", value=df_bruto['data'].max())
-
-        # Aplicando Filtros
-        df = df_bruto[(df_bruto['produto'].isin(produtos_selecionados)) & 
-                      (df_bruto['data'].dt.date >= data_inicio) & 
-                      (df_bruto['data'].dt.date <= data_fim)]
-
-        # Calcular todas as estatísticas
-        stats = calcular_todas_estatisticas(df_bruto, df, hoje, dias_projecao)
+        data_inicio = st.sidebar.date_input("Data Inicial:", value=data_minima)
+        data_fim = st.sidebar.date_input("Data Final:", value=data_maxima)
+
+        # Modo aproximado: clientes únicos e percentis saem de sketches por dia × produto
+        # (no banco local as contagens já são consultas exatas; na visão consolidada, só há sketches)
+        if consolidado is not None:
+            modo_aproximado = True
+            st.sidebar.caption("📐 Visão consolidada: percentis e desvio padrão aproximados; clientes e "
+                               "métricas por cliente consideram todo o período e todos os produtos.")
+        else:
+            modo_aproximado = banco_vendas is None and st.sidebar.checkbox(
+                "📐 Modo aproximado (sketches)",
+                value=False,
+                help="Para arquivos muito grandes: clientes únicos com erro padrão de ~1,6% e percentis e desvio padrão a no máximo 1% do valor exato, sem reprocessar as transações a cada filtro."
+            )
+        aprox = "≈ " if modo_aproximado else ""
+
+        # Estatísticas sob demanda: cada seção calcula só o que lê, uma vez por combinação de filtros
+        medidor.marcar("cubo_e_filtros")
+        if consolidado is not None:
+            sketches_vendas = consolidado.sketches
+        else:
+            sketches_vendas = sketches.sketches_para(ingestao_info.chave, df_bruto, cubo_vendas) if modo_aproximado else None
+        filtros = estatisticas.normalizar_filtros(cubo_vendas, produtos_selecionados, data_inicio, data_fim)
+        stats = estatisticas.da_sessao(
+            st.session_state, "stats", (ingestao_info.chave, filtros, dias_projecao, modo_aproximado, limites),
+            impressao=ingestao_info.chave,
+            df_bruto=df_bruto, hoje=hoje, dias_projecao=dias_projecao, estado=estado, cubo_vendas=cubo_vendas,
+            aproximado=modo_aproximado, sketches_vendas=sketches_vendas, banco=banco_vendas,
+            limite_risco=limite_risco, limite_dormente=limite_dormente, limite_churn=limite_churn,
+            produtos_selecionados=filtros[0], data_inicio=filtros[1], data_fim=filtros[2],
+            **(consolidado.entradas() if consolidado is not None else {})
+        )
+        medidor.observar(stats)
+        # Com mais de um núcleo, as estatísticas das seções são calculadas antes, em paralelo
+        if estatisticas.TRABALHADORES_PADRAO > 1:
+            medidor.marcar("estatisticas_paralelas")
+            stats.calcular()
 
         # --- INTERFACE VISUAL ---
         st.title("📊 Dashboard Estratégico - The Way (COMPLETO)")
         st.markdown(f"**Período:** {data_inicio} a {data_fim} | **Produtos:** {len(produtos_selecionados)}")
 
         # --- SEÇÃO 1: RECOMENDAÇÕES E ALERTAS ---
+        medidor.marcar("secao_recomendacoes")
         st.markdown("---")
         st.subheader("🎯 Recomendações e Alertas")
         for rec in stats['recomendacoes']:
             st.info(rec)
 
         # --- SEÇÃO 2: KPIs PRINCIPAIS ---
+        medidor.marcar("secao_kpis")
         st.markdown("---")
         st.subheader("📈 KPIs Principais")
         
+        # Visão consolidada com filtro: as métricas por cliente não seguem o filtro (ver Consolidado.entradas)
+        historico_clientes = consolidado is not None and filtros != (None, None, None)
+        if historico_clientes:
+            st.caption("🏬 Faturamento, vendas, ticket, produtos e a tabela por loja seguem o filtro; clientes, "
+                       "recorrência, churn, LTV e melhor cliente são do histórico inteiro de todas as lojas.")
+
         kpi1, kpi2, kpi3, kpi4 = st.columns(4)
         kpi1.metric("💰 Faturamento Total", f"R$ {stats['faturamento_total']:,.2f}")
         kpi2.metric("🛍️ Total de Vendas", f"{stats['total_vendas']} transações")
-        kpi3.metric("👥 Clientes Únicos", f"{stats['total_clientes']}")
+        kpi3.metric("👥 Clientes (histórico)" if historico_clientes else "👥 Clientes Únicos",
+                    f"{aprox if consolidado is None else ''}{stats['total_clientes']}")
         kpi4.metric("📊 Ticket Médio", f"R$ {stats['ticket_medio']:,.2f}")
 
         kpi5, kpi6, kpi7, kpi8 = st.columns(4)
         kpi5.metric("💹 Crescimento MoM", f"{stats['crescimento_mom']:.1f}%", delta_color="inverse")
-        kpi6.metric("🔄 Taxa Recorrência", f"{stats['taxa_recorrencia']:.1f}%")
+        kpi6.metric("🔄 Taxa Recorrência (histórico)" if historico_clientes else "🔄 Taxa Recorrência",
+                    f"{stats['taxa_recorrencia']:.1f}%")
         kpi7.metric("📉 Taxa Churn", f"{stats['taxa_churn']:.1f}%", delta_color="inverse")
         kpi8.metric("✅ Taxa Retenção", f"{stats['taxa_retencao']:.1f}%")
 
@@ -295,10 +306,25 @@ if verificar_senha():
         kpi13, kpi14, kpi15, kpi16 = st.columns(4)
         kpi13.metric("🏆 Melhor Produto", stats['produto_mais_vendido'][:15])
         kpi14.metric("📦 Produto + Fraco", stats['produto_menos_vendido'][:15])
-        kpi15.metric("🎯 Projeção 30d", f"R$ {stats['faturamento_projecao']:,.2f}")
-        kpi16.metric("👑 Melhor Cliente", f"R$ {stats['valor_cliente_top']:,.2f}")
+        kpi15.metric(f"🎯 Projeção {dias_projecao}d", f"R$ {stats['faturamento_projecao']:,.2f}")
+        kpi16.metric("👑 Melhor Cliente (histórico)" if historico_clientes else "👑 Melhor Cliente", f"R$ {stats['valor_cliente_top']:,.2f}")
+
+        # --- LOJAS (VISÃO CONSOLIDADA) ---
+        if consolidado is not None:
+            medidor.marcar("secao_lojas")
+            st.markdown("---")
+            st.subheader("🏬 Desempenho por Loja")
+            por_loja = consolidado.por_loja(*filtros[1:], filtros[0])
+            col_l1, col_l2 = st.columns([1, 2])
+            with col_l1:
+                fig_lojas = px.bar(por_loja, x='Loja', y='Faturamento', color_discrete_sequence=['#000000'])
+                fig_lojas.update_layout(height=300)
+                st.plotly_chart(fig_lojas, use_container_width=True)
+            with col_l2:
+                st.dataframe(por_loja, hide_index=True, use_container_width=True)
 
         # --- SEÇÃO 3: ANÁLISE DE PRODUTOS ---
+        medidor.marcar("secao_produtos")
         st.markdown("---")
         st.subheader("👕 Análise de Produtos")
         
@@ -316,7 +342,23 @@ if verificar_senha():
             fig_prod.update_layout(title="", xaxis_title="Quantidade", yaxis_title="Produto", height=300)
             st.plotly_chart(fig_prod, use_container_width=True)
 
+        st.markdown("**🧺 Afinidade de Produtos (comprados pelos mesmos clientes)**")
+        afinidade_produtos = stats['afinidade']
+        formato_afinidade = {'suporte %': '{:.1f}', 'confiança %': '{:.1f}', 'lift': '{:.2f}'}
+        col_af1, col_af2 = st.columns(2)
+
+        with col_af1:
+            if len(afinidade_produtos.produtos):
+                produto_base = st.selectbox("Quem compra", afinidade_produtos.produtos.tolist(), key="produto_afinidade")
+                st.dataframe(afinidade_produtos.top_por_produto(produto_base).style.format(formato_afinidade),
+                             use_container_width=True)
+
+        with col_af2:
+            st.caption(f"Pares mais associados (lift), com pelo menos {afinidade.MINIMO_CLIENTES_PAR} clientes em comum")
+            st.dataframe(afinidade_produtos.top_pares().style.format(formato_afinidade), use_container_width=True)
+
         # --- SEÇÃO 4: ANÁLISE DE CLIENTES ---
+        medidor.marcar("secao_clientes")
         st.markdown("---")
         st.subheader("👥 Análise de Clientes")
         
@@ -335,6 +377,7 @@ if verificar_senha():
             st.dataframe(stats['top_5_clientes'].rename(columns={'cliente_id': 'Cliente', 'valor': 'Total Gasto'}), use_container_width=True)
 
         # --- SEÇÃO 5: TENDÊNCIAS TEMPORAIS ---
+        medidor.marcar("secao_tendencias")
         st.markdown("---")
         st.subheader("📅 Tendências Temporais")
         
@@ -342,9 +385,11 @@ if verificar_senha():
 
         with col_temp1:
             st.markdown("**Sazonalidade Mensal**")
-            fig_saz = px.line(x=stats['vendas_mensais'].index.astype(str), 
-                             y=stats['vendas_mensais'].values, 
-                             markers=True, color_discrete_sequence=['#000000'])
+            vendas_mensais = stats['vendas_mensais']
+            fig_saz = px.line(x=vendas_mensais.index.astype(str), 
+                             y=vendas_mensais.values, 
+                             markers=True, color_discrete_sequence=['#000000'],
+                             render_mode=graficos.modo_render(len(vendas_mensais)))
             fig_saz.update_layout(title="", xaxis_title="Mês", yaxis_title="Faturamento (R$)", height=350)
             st.plotly_chart(fig_saz, use_container_width=True)
 
@@ -356,7 +401,29 @@ if verificar_senha():
             fig_dia.update_layout(title="", xaxis_title="Dia", yaxis_title="Faturamento (R$)", height=350)
             st.plotly_chart(fig_dia, use_container_width=True)
 
+        # Série diária longa: só os pontos escolhidos pelo LTTB vão ao navegador
+        st.markdown("**Faturamento Diário**")
+        vendas_diarias = stats['vendas_diarias']
+        serie_diaria = graficos.reduzir_serie(vendas_diarias)
+        fig_diario = px.line(x=serie_diaria.index, y=serie_diaria.values, color_discrete_sequence=['#000000'],
+                             render_mode=graficos.modo_render(len(serie_diaria)))
+        fig_diario.update_layout(title="", xaxis_title="Data", yaxis_title="Faturamento (R$)", height=300)
+        st.plotly_chart(fig_diario, use_container_width=True)
+        if len(serie_diaria) < len(vendas_diarias):
+            st.caption(f"{len(serie_diaria)} de {len(vendas_diarias)} dias no gráfico, escolhidos para manter picos e vales.")
+
+        # Curva pré-calculada para todos os horizontes; o slider só marca o ponto
+        st.markdown(f"**Projeção de Faturamento (próximos {projecao.HORIZONTE_MAXIMO} dias)**")
+        curva_projecao = stats['projecao_acumulada']
+        fig_proj = px.line(x=curva_projecao.index, y=curva_projecao.values, color_discrete_sequence=['#000000'])
+        fig_proj.add_vline(x=dias_projecao, line_dash='dash', line_color='#999999')
+        fig_proj.update_layout(title="", xaxis_title="Dias a partir da última data", yaxis_title="Faturamento acumulado (R$)",
+                               height=300)
+        st.plotly_chart(fig_proj, use_container_width=True)
+        st.caption("Próxima compra de cada cliente ativo pelo próprio intervalo médio entre compras e ticket médio.")
+
         # --- SEÇÃO 6: ANÁLISE ESTATÍSTICA ---
+        medidor.marcar("secao_analise_estatistica")
         st.markdown("---")
         st.subheader("📊 Análise Estatística de Vendas")
         
@@ -367,16 +434,16 @@ if verificar_senha():
             col_s1, col_s2 = st.columns(2)
             col_s1.metric("Valor Mínimo", f"R$ {stats['valor_minimo']:.2f}")
             col_s2.metric("Valor Máximo", f"R$ {stats['valor_maximo']:.2f}")
-            col_s1.metric("Mediana", f"R$ {stats['ticket_mediano']:.2f}")
-            col_s2.metric("Desvio Padrão", f"R$ {stats['desvio_padrao']:.2f}")
+            col_s1.metric("Mediana", f"{aprox}R$ {stats['ticket_mediano']:.2f}")
+            col_s2.metric("Desvio Padrão", f"{aprox}R$ {stats['desvio_padrao']:.2f}")
 
         with col_stat2:
             st.markdown("**Percentis**")
             col_p1, col_p2 = st.columns(2)
-            col_p1.metric("P25", f"R$ {stats['percentil_25']:.2f}")
-            col_p2.metric("P50", f"R$ {stats['percentil_50']:.2f}")
-            col_p1.metric("P75", f"R$ {stats['percentil_75']:.2f}")
-            col_p2.metric("P90", f"R$ {stats['percentil_90']:.2f}")
+            col_p1.metric("P25", f"{aprox}R$ {stats['percentil_25']:.2f}")
+            col_p2.metric("P50", f"{aprox}R$ {stats['percentil_50']:.2f}")
+            col_p1.metric("P75", f"{aprox}R$ {stats['percentil_75']:.2f}")
+            col_p2.metric("P90", f"{aprox}R$ {stats['percentil_90']:.2f}")
 
         with col_stat3:
             st.markdown("**Variabilidade**")
@@ -384,76 +451,123 @@ if verificar_senha():
             st.info(f"**Interpretação:** Vendas com {stats['coeficiente_variacao']:.1f}% de variabilidade")
 
         # --- SEÇÃO 7: MATRIZ RFM ---
+        medidor.marcar("secao_rfm")
         st.markdown("---")
         st.subheader("🎯 Análise RFM (Recency, Frequency, Monetary)")
-        st.dataframe(stats['rfm'].head(10), use_container_width=True)
-        st.caption("Recency: dias desde última compra | Frequency: total de compras | Monetary: valor total gasto")
+        segmentos_rfm = stats['segmentos_rfm']
+        col_rfm1, col_rfm2 = st.columns(2)
+
+        with col_rfm1:
+            st.markdown("**Clientes por Segmento**")
+            fig_rfm = px.bar(x=segmentos_rfm['clientes'], y=segmentos_rfm.index.astype(str),
+                             orientation='h', color_discrete_sequence=['#000000'])
+            fig_rfm.update_layout(title="", xaxis_title="Clientes", yaxis_title="Segmento", height=350,
+                                  yaxis={'autorange': 'reversed'})
+            st.plotly_chart(fig_rfm, use_container_width=True)
+
+        with col_rfm2:
+            st.markdown("**Faturamento por Segmento**")
+            st.dataframe(segmentos_rfm.rename(columns={
+                'clientes': 'Clientes', 'faturamento': 'Faturamento', 'pct_clientes': '% Clientes',
+                'pct_faturamento': '% Faturamento', 'recencia_media': 'Recência Média', 'frequencia_media': 'Frequência Média',
+            }), use_container_width=True)
+
+        # Tabela completa (ordenável clicando no cabeçalho), filtrável por segmento
+        filtro_segmentos = st.multiselect("Segmentos na tabela:", options=segmentos_rfm.index.tolist(),
+                                          default=segmentos_rfm.index.tolist())
+        tabela_rfm = stats['rfm']
+        if len(filtro_segmentos) < len(segmentos_rfm):
+            tabela_rfm = tabela_rfm[tabela_rfm['segmento'].isin(filtro_segmentos)]
+        graficos.mostrar_tabela_paginada(st, tabela_rfm, "tabela_rfm", ordenavel=True)
+        st.caption("Recency: dias desde última compra | Frequency: total de compras | Monetary: valor total gasto | R, F, M: notas de 1 a 5 por quintil")
 
         # --- SEÇÃO 8: ANÁLISE DE CHURN E RETENÇÃO ---
+        medidor.marcar("secao_churn")
         st.markdown("---")
         st.subheader("🔴 Análise de Churn e Retenção")
         
         col_churn1, col_churn2 = st.columns(2)
 
+        status_clientes = stats['status_clientes']
+
         with col_churn1:
-            status_counts = pd.DataFrame({
-                'Status': ['Ativo', 'Risco', 'Dormente', 'Churn'],
-                'Quantidade': [
-                    len(df_bruto[df_bruto.groupby('cliente_id')['data'].transform('max') > (hoje - pd.Timedelta(days=30))]),
-                    stats['clientes_risco'],
-                    stats['clientes_dormentes'],
-                    int(stats['taxa_churn'] / 100 * stats['total_clientes'])
-                ]
-            })
-            fig_status = px.pie(status_counts, values='Quantidade', names='Status',
+            # Clientes por faixa de recência, sem sobreposição
+            status_counts = status_clientes.rename('Quantidade').rename_axis('Status').reset_index()
+            fig_status = px.pie(status_counts, values='Quantidade', names='Status', color='Status',
                                color_discrete_map={'Ativo':'#000000', 'Risco':'#ffcc00', 'Dormente':'#ff9900', 'Churn':'#cccccc'})
             st.plotly_chart(fig_status, use_container_width=True)
 
         with col_churn2:
             st.markdown("**Clientes Precisam de Ação**")
             col_c1, col_c2, col_c3 = st.columns(3)
-            col_c1.metric("Em Risco", f"{stats['clientes_risco']}", "30-90 dias")
-            col_c2.metric("Dormentes", f"{stats['clientes_dormentes']}", "90+ dias")
-            col_c3.metric("Churn", f"{int(stats['taxa_churn'] / 100 * stats['total_clientes'])}", f"{stats['taxa_churn']:.1f}%")
+            col_c1.metric("Em Risco", f"{stats['clientes_risco']}", f"{limite_risco}-{limite_dormente} dias")
+            col_c2.metric("Dormentes", f"{stats['clientes_dormentes']}", f"{limite_dormente}-{limite_churn} dias")
+            col_c3.metric("Churn", f"{status_clientes['Churn']}", f"{stats['taxa_churn']:.1f}%")
+
+        # Retenção por coorte: mês da primeira compra × meses desde a aquisição (histórico inteiro)
+        st.markdown("**Retenção por Coorte de Aquisição**")
+        medida_coorte = st.radio("Mostrar:", ["Retenção %", "Clientes", "Receita"], horizontal=True, key="medida_coorte")
+        tabela_coorte = getattr(stats['coortes'], {"Retenção %": 'retencao', "Clientes": 'clientes',
+                                                   "Receita": 'receita'}[medida_coorte])
+        tabela_coorte = tabela_coorte.tail(coortes.COORTES_NO_GRAFICO).dropna(axis=1, how='all')
+        if tabela_coorte.empty:
+            st.info("Sem dados para montar as coortes.")
+        else:
+            fig_coorte = px.imshow(tabela_coorte.set_axis(tabela_coorte.index.astype(str), axis=0),
+                                   text_auto='.3s' if medida_coorte == "Receita" else '.0f', aspect='auto',
+                                   color_continuous_scale='Greys',
+                                   labels={'x': "Meses desde a primeira compra", 'y': "Coorte", 'color': medida_coorte})
+            fig_coorte.update_layout(height=max(300, 28 * len(tabela_coorte)))
+            st.plotly_chart(fig_coorte, use_container_width=True)
+            st.caption(f"Últimas {len(tabela_coorte)} coortes. Cada linha acompanha os clientes que compraram pela primeira vez naquele mês.")
 
         # --- SEÇÃO 9: EXPORTAÇÃO ---
+        medidor.marcar("secao_exportacao")
         st.markdown("---")
         st.subheader("📥 Exportação de Dados")
 
-        # Preparar dados para exportação
-        buffer = io.BytesIO()
-        with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-            df.to_excel(writer, sheet_name='Vendas Filtradas', index=False)
-            stats['curva_abc'].to_excel(writer, sheet_name='Curva ABC', index=False)
-            stats['top_5_clientes'].to_excel(writer, sheet_name='Top Clientes', index=False)
-            stats['rfm'].to_excel(writer, sheet_name='Matriz RFM')
-
+        # Arquivos gerados só quando pedidos, em cache por combinação de filtros
+        chave_relatorio = exportacao.chave_exportacao(ingestao_info.chave, filtros, hoje, 'relatorio')
+        chave_vendas = exportacao.chave_exportacao(ingestao_info.chave, filtros, hoje, 'vendas')
         col_export1, col_export2, col_export3 = st.columns(3)
-        
+
         with col_export1:
-            st.download_button(
-                label="📥 Exportar Excel Completo",
-                data=buffer.getvalue(),
-                file_name=f"relatorio_theway_{datetime.now().strftime('%Y%m%d')}.xlsx",
-                mime="application/vnd.ms-excel"
+            botao_exportar(
+                "Excel Completo", chave_relatorio, 'xlsx',
+                lambda: {
+                    **({'Lojas': (por_loja, False)} if consolidado is not None
+                       else {'Vendas Filtradas': (stats['df'], False)}),
+                    'Curva ABC': (stats['curva_abc'], False),
+                    'Top Clientes': (stats['top_5_clientes'], False),
+                    'Matriz RFM': (stats['rfm'], True),
+                },
+                f"relatorio_theway_{datetime.now().strftime('%Y%m%d')}.xlsx"
             )
 
         with col_export2:
-            csv = df.to_csv(index=False)
-            st.download_button(
-                label="📄 Exportar CSV",
-                data=csv,
-                file_name=f"vendas_theway_{datetime.now().strftime('%Y%m%d')}.csv",
-                mime="text/csv"
+            # Na visão consolidada as transações não chegam ao app: o CSV é o resumo por loja
+            botao_exportar(
+                "CSV", chave_vendas, 'csv', lambda: por_loja if consolidado is not None else stats['df'],
+                f"{'lojas' if consolidado is not None else 'vendas'}_theway_{datetime.now().strftime('%Y%m%d')}.csv"
             )
 
         with col_export3:
             st.sidebar.markdown("---")
             if st.sidebar.button("🚪 Log out"):
                 st.session_state["autenticado"] = False
+                st.session_state["admin"] = False
                 st.rerun()
 
         # Footer
+        st.sidebar.caption(cache_resultados.CACHE.descricao())
+        st.sidebar.caption(armazem.ARMAZEM.descricao())
+        historico = instrumentacao.concluir(st.session_state, medidor)
+        if st.session_state.get("admin"):
+            instrumentacao.mostrar_painel(st.sidebar, historico)
+            if df_bruto is not None:
+                with st.sidebar.expander("🧠 Memória do Dataset"):
+                    st.caption("Bytes por coluna: texto como objeto e dia em int64 (antes) × modelo compacto (depois).")
+                    st.dataframe(ingestao.relatorio_memoria(df_bruto), use_container_width=True)
         st.markdown("---")
         st.caption(f"Dashboard The Way - Atualizado em {datetime.now().strftime('%d/%m/%Y às %H:%M')} | Data máxima dos dados: {hoje.strftime('%d/%m/%Y')}")
 
@@ -1,11 +1,11 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
 import plotly.express as px
-import plotly.graph_objects as go
-import io
-from pathlib import Path
-from datetime import datetime, timedelta
+import os
+from datetime import datetime
+
+from the_way import (armazem, banco, cache_resultados, consolidacao, cubo, estatisticas, exportacao, graficos,
+                     incremental, ingestao, instrumentacao, preaquecimento)
 
 # --- CONFIGURAÇÃO DA PÁGINA (MOBILE FIRST) ---
 st.set_page_config(
@@ -15,6 +15,9 @@ st.set_page_config(
     initial_sidebar_state="collapsed"  # Sidebar colapsada por padrão em mobile
 )
 
+# Processo novo: com THE_WAY_PREAQUECER=1, o último dataset é preparado enquanto o login é exibido
+preaquecimento.iniciar()
+
 # --- CSS CUSTOMIZADO PARA MOBILE ---
 st.markdown("""
 <style>
@@ -57,15 +60,92 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # --- DICA DE OURO: FUNÇÃO DE CACHE ---
-@st.cache_data
-def carregar_dados(arquivo):
-    """Lê o arquivo uma única vez e mantém na memória."""
-    df = pd.read_excel(arquivo)
-    df['data'] = pd.to_datetime(df['data'], format='mixed', dayfirst=True)
-    return df
+def carregar_dados(arquivo, streaming=False):
+    """Lê o arquivo uma única vez: depois serve do cache colunar (memória ou disco)."""
+    barra = None
+
+    def progresso(fracao, linhas):
+        nonlocal barra
+        if barra is None:
+            barra = st.progress(0.0)
+        barra.progress(fracao, text=f"Lendo planilha... {linhas:,} linhas")
+
+    try:
+        resultado = ingestao.carregar_planilha(arquivo.getvalue(), streaming=streaming, progresso=progresso)
+    except ValueError as erro:
+        st.error(f"Planilha inválida: {erro}")
+        st.stop()
+    if barra is not None:
+        barra.empty()
+    # A sessão segura o dataset compartilhado enquanto estiver usando este arquivo
+    st.session_state["reserva_dataset"] = armazem.ARMAZEM.reservar(
+        resultado.chave, st.session_state.get("reserva_dataset"))
+    if resultado.origem != 'memoria':
+        preaquecimento.registrar(arquivo.name, resultado.chave)
+    return resultado
+
+def carregar_banco(arquivo):
+    """Abre (ou cria, na primeira vez) o banco SQLite da planilha."""
+    barra = st.progress(0.0)
+    try:
+        resultado = banco.carregar_banco(
+            arquivo.getvalue(),
+            progresso=lambda fracao, linhas: barra.progress(fracao, text=f"Lendo planilha... {linhas:,} linhas"))
+    except ValueError as erro:
+        st.error(f"Planilha inválida: {erro}")
+        st.stop()
+    barra.empty()
+    return resultado
+
+def carregar_lojas(arquivos):
+    """Várias planilhas: cada uma vira um parcial agregado (em processos separados) e os parciais são mesclados."""
+    barra = st.progress(0.0)
+    try:
+        resultado = consolidacao.consolidar(
+            [(arquivo.name, arquivo.getvalue()) for arquivo in arquivos],
+            progresso=lambda fracao, prontas: barra.progress(fracao, text=f"Consolidando... {prontas} de {len(arquivos)}"))
+    except ValueError as erro:
+        st.error(f"Planilha inválida: {erro}")
+        st.stop()
+    barra.empty()
+    return resultado
+
+# --- EXPORTAÇÃO SOB DEMANDA ---
+def botao_exportar(rotulo, chave, extensao, montar_dados, nome_arquivo, **opcoes):
+    """Só gera o arquivo quando pedido (em segundo plano); depois oferece o download do cache."""
+    situacao = exportacao.situacao(chave, extensao)
+    if situacao in (None, 'erro'):
+        if situacao == 'erro':
+            st.error(f"❌ Falha ao gerar {rotulo}. Tente novamente.")
+        espaco = st.empty()
+        if not espaco.button(f"⚙️ Preparar {rotulo}", key=f"preparar_{chave}_{extensao}", **opcoes):
+            return
+        espaco.empty()
+        exportacao.solicitar(chave, extensao, montar_dados())
+        exportacao.aguardar(chave, extensao, exportacao.ESPERA_SEGUNDOS)
+        situacao = exportacao.situacao(chave, extensao)
+    dados = exportacao.ler(chave, extensao) if situacao == 'pronto' else None
+    if dados is not None:
+        st.download_button(
+            label=f"📥 Baixar {rotulo}",
+            data=dados,
+            file_name=nome_arquivo,
+            mime=exportacao.TIPOS[extensao],
+            key=f"baixar_{chave}_{extensao}",
+            **opcoes
+        )
+    elif situacao == 'pronto':
+        # Saiu do cache (limpeza de outra sessão) entre a consulta e a leitura
+        st.caption(f"♻️ {rotulo} saiu do cache de exportações.")
+        st.button("🔄 Atualizar", key=f"atualizar_{chave}_{extensao}", **opcoes)
+    else:
+        st.caption(f"⏳ Gerando {rotulo} em segundo plano...")
+        st.button("🔄 Atualizar", key=f"atualizar_{chave}_{extensao}", **opcoes)
 
 # --- SISTEMA DE LOGIN ---
 SENHA_CORRETA = "theway2026"
+# Senha de administrador (painel de instrumentação); sem a variável, não há acesso admin
+SENHA_ADMIN = os.environ.get("THE_WAY_SENHA_ADMIN")
 
 def verificar_senha():
     if "autenticado" not in st.session_state:
@@ -81,44 +161,37 @@ def verificar_senha():
             if senha_digitada == SENHA_CORRETA:
                 st.session_state["autenticado"] = True
                 st.rerun()
+            elif SENHA_ADMIN and senha_digitada == SENHA_ADMIN:
+                st.session_state["autenticado"] = True
+                st.session_state["admin"] = True
+                st.rerun()
             else:
                 st.error("❌ Senha incorreta!")
         return False
     return True
 
 # --- FUNÇÕES DE CÁLCULO ---
-def calcular_metricas_rapidas(df_bruto, df, hoje):
-    """Calcula métricas principais de forma rápida"""
+def calcular_metricas_rapidas(stats):
+    """Métricas da aba Dashboard, lidas do grafo de estatísticas (só o que a aba usa)"""
     
-    metricas = {
-        'faturamento': df['valor'].sum(),
-        'total_vendas': len(df),
-        'ticket_medio': df['valor'].mean(),
-        'clientes': df['cliente_id'].nunique(),
-        'produto_top': df.groupby('produto')['valor'].sum().idxmax(),
-        'valor_top_produto': df.groupby('produto')['valor'].sum().max(),
+    ltv = stats['fatos_bruto']['total']
+    vendas_mes = stats['vendas_mensais']
+    vendas_mes = vendas_mes.set_axis(vendas_mes.index.astype(str), copy=False)
+
+    return {
+        'faturamento': stats['faturamento_total'],
+        'total_vendas': stats['total_vendas'],
+        'ticket_medio': stats['ticket_medio'],
+        'clientes': stats['total_clientes'],
+        'produto_top': stats['produto_mais_vendido'],
+        'valor_top_produto': stats['valor_produto_mais_vendido'],
+        'taxa_churn': stats['taxa_churn'],
+        'ltv_medio': stats['ltv_medio'],
+        'cliente_top': ltv.idxmax(),
+        'valor_cliente_top': ltv.max(),
+        'top_produtos': stats['produtos']['sum'].nlargest(5),
+        'vendas_mes': vendas_mes,
     }
-    
-    # Churn simples
-    ultima_visita = df_bruto.groupby('cliente_id')['data'].max()
-    dias_parado = (hoje - ultima_visita).dt.days
-    metricas['taxa_churn'] = (len(dias_parado[dias_parado > 180]) / len(dias_parado) * 100) if len(dias_parado) > 0 else 0
-    
-    # LTV
-    ltv = df_bruto.groupby('cliente_id')['valor'].sum()
-    metricas['ltv_medio'] = ltv.mean()
-    metricas['cliente_top'] = ltv.idxmax()
-    metricas['valor_cliente_top'] = ltv.max()
-    
-    # Top 5 produtos
-    metricas['top_produtos'] = df.groupby('produto')['valor'].sum().nlargest(5)
-    
-    # Vendas por mês
-    df_temp = df.copy()
-    df_temp['mes'] = df_temp['data'].dt.to_period('M').astype(str)
-    metricas['vendas_mes'] = df_temp.groupby('mes')['valor'].sum()
-    
-    return metricas
 
 # --- EXECUÇÃO DO DASHBOARD ---
 if verificar_senha():
@@ -130,18 +203,76 @@ if verificar_senha():
     with col2:
         if st.button("🚪", help="Sair"):
             st.session_state["autenticado"] = False
+            st.session_state["admin"] = False
             st.rerun()
     
     # Upload de arquivo
-    arquivo_upload = st.file_uploader(
+    arquivos_upload = st.file_uploader(
         "📤 Suba seu Excel aqui",
         type=['xlsx'],
-        help="Colunas necessárias: data, cliente_id, produto, valor"
+        accept_multiple_files=True,
+        help="Colunas necessárias: data, cliente_id, produto, valor. Várias planilhas (uma por loja) viram uma visão consolidada."
     )
 
-    if arquivo_upload is not None:
-        df_bruto = carregar_dados(arquivo_upload)
-        hoje = df_bruto['data'].max()
+    if arquivos_upload:
+        # Instrumentação opcional (painel do admin): etapas marcadas ao longo do rerun
+        medidor = instrumentacao.medidor_da_sessao(st.session_state)
+
+        consolidado = None
+        extras = {}
+        if len(arquivos_upload) > 1:
+            # Várias lojas: só os agregados de cada planilha chegam ao app
+            medidor.marcar("carregar_dados")
+            consolidado = ingestao_info = carregar_lojas(arquivos_upload)
+            st.caption(consolidado.descricao())
+            banco_vendas = df_bruto = None
+            estado = consolidado.estado
+            hoje = consolidado.hoje
+            fatos_bruto = estado.tabela_clientes()
+            cubo_vendas = consolidado.cubo
+            data_minima, data_maxima = pd.Timestamp(cubo_vendas.dias[0]), pd.Timestamp(cubo_vendas.dias[-1])
+            extras = dict(aproximado=True, sketches_vendas=consolidado.sketches, **consolidado.entradas())
+        else:
+            arquivo_upload = arquivos_upload[0]
+
+            # Banco local: as transações ficam no SQLite e cada filtro vira uma consulta
+            backends = list(banco.BACKENDS)
+            backend = st.selectbox("Processamento:", backends, index=backends.index(banco.BACKEND_PADRAO),
+                                   format_func=banco.BACKENDS.get)
+
+            if backend == 'sqlite':
+                medidor.marcar("carregar_dados")
+                ingestao_info = carregar_banco(arquivo_upload)
+                banco_vendas = ingestao_info.banco
+                st.caption(ingestao_info.descricao())
+                df_bruto = estado = None
+                hoje = banco_vendas.hoje
+                medidor.marcar("estado_e_cubo")
+                fatos_bruto = banco_vendas.tabela_clientes()
+                cubo_vendas = banco_vendas.cubo()
+                data_minima, data_maxima = pd.Timestamp(cubo_vendas.dias[0]), pd.Timestamp(cubo_vendas.dias[-1])
+            else:
+                tamanho_arquivo = len(arquivo_upload.getvalue())
+                modo_streaming = st.checkbox(
+                    "Leitura em streaming (arquivos grandes)",
+                    value=tamanho_arquivo > ingestao.LIMITE_STREAMING_BYTES,
+                    help="Lê a planilha em lotes, com pico de memória menor. Traz apenas as colunas obrigatórias."
+                )
+                medidor.marcar("carregar_dados")
+                ingestao_info = carregar_dados(arquivo_upload, streaming=modo_streaming)
+                banco_vendas = None
+                df_bruto = ingestao_info.df
+                st.caption(ingestao_info.descricao())
+                hoje = df_bruto['data'].max()
+                medidor.marcar("estado_e_cubo")
+                estado, modo_estado = incremental.estado_para(arquivo_upload.name, ingestao_info.chave, df_bruto)
+                st.caption(incremental.MODOS[modo_estado])
+                fatos_bruto = estado.tabela_clientes()
+                cubo_vendas = cubo.cubo_para(ingestao_info.chave, df_bruto)
+                data_minima, data_maxima = df_bruto['data'].min(), df_bruto['data'].max()
+        lista_produtos = cubo_vendas.produtos.tolist()
+        entradas = dict(impressao=ingestao_info.chave, df_bruto=df_bruto, hoje=hoje, estado=estado,
+                        cubo_vendas=cubo_vendas, banco=banco_vendas, **extras)
 
         # --- MENU COM ABAS MOBILE ---
         st.markdown("---")
@@ -149,6 +280,7 @@ if verificar_senha():
         abas = st.tabs(["📊 Dashboard", "👕 Produtos", "👥 Clientes", "📈 Tendências", "⚙️ Filtros"])
 
         # --- ABA 1: DASHBOARD PRINCIPAL ---
+        medidor.marcar("aba_dashboard")
         with abas[0]:
             st.subheader("Dashboard Principal")
             
@@ -156,7 +288,6 @@ if verificar_senha():
             if st.checkbox("Aplicar filtros?"):
                 col_f1, col_f2 = st.columns(2)
                 with col_f1:
-                    lista_produtos = sorted(df_bruto['produto'].unique().tolist())
                     produtos_selecionados = st.multiselect(
                         "Produtos:",
                         options=lista_produtos,
@@ -166,28 +297,65 @@ if verificar_senha():
                 with col_f2:
                     dias_projecao = st.slider("Projeção (dias):", 7, 90, 30, key="tab0_dias")
                 
-                df = df_bruto[df_bruto['produto'].isin(produtos_selecionados)]
             else:
-                df = df_bruto.copy()
+                produtos_selecionados = None
                 dias_projecao = 30
 
-            metricas = calcular_metricas_rapidas(df_bruto, df, hoje)
+            # Estatísticas da aba: recalculadas só quando o filtro muda
+            filtro, _, _ = estatisticas.normalizar_filtros(cubo_vendas, produtos_selecionados, None, None)
+            stats_dashboard = estatisticas.da_sessao(
+                st.session_state, "stats_dashboard", (ingestao_info.chave, filtro, dias_projecao),
+                dias_projecao=dias_projecao, produtos_selecionados=filtro, **entradas
+            )
+            medidor.observar(stats_dashboard)
+            metricas = calcular_metricas_rapidas(stats_dashboard)
 
             # KPIs em Stack (mobile-friendly)
             st.metric("💰 Faturamento", f"R$ {metricas['faturamento']:,.2f}")
             st.metric("🛍️ Vendas", f"{metricas['total_vendas']}")
+            if consolidado is not None and filtro is not None:
+                st.caption("🏬 Clientes, churn e LTV: histórico inteiro de todas as lojas (não seguem o filtro).")
             st.metric("👥 Clientes", f"{metricas['clientes']}")
             st.metric("📊 Ticket Médio", f"R$ {metricas['ticket_medio']:,.2f}")
             st.metric("💹 Churn", f"{metricas['taxa_churn']:.1f}%")
             st.metric("💎 LTV Médio", f"R$ {metricas['ltv_medio']:,.2f}")
+            st.metric(f"🎯 Projeção {dias_projecao}d", f"R$ {stats_dashboard['faturamento_projecao']:,.2f}")
+
+            # Visão consolidada: faturamento de cada loja, direto dos parciais
+            if consolidado is not None:
+                st.subheader("🏬 Lojas")
+                por_loja = consolidado.por_loja(produtos=filtro)
+                for _, row in por_loja.sort_values('Faturamento', ascending=False).iterrows():
+                    col1, col2 = st.columns([3, 1])
+                    with col1:
+                        st.write(f"{row['Loja']} · {row['Vendas']} vendas")
+                    with col2:
+                        st.write(f"R$ {row['Faturamento']:,.0f}")
+                    st.progress(row['% do Total'] / 100)
+
+            # Projeção acumulada (pré-calculada para todos os horizontes)
+            st.subheader("🎯 Projeção de Faturamento")
+            curva_projecao = stats_dashboard['projecao_acumulada']
+            fig_proj = px.line(x=curva_projecao.index, y=curva_projecao.values, color_discrete_sequence=['#000000'])
+            fig_proj.add_vline(x=dias_projecao, line_dash='dash', line_color='#999999')
+            fig_proj.update_layout(
+                title="",
+                xaxis_title="Dias",
+                yaxis_title="R$ acumulado",
+                height=250,
+                margin=dict(l=40, r=20, t=20, b=40)
+            )
+            st.plotly_chart(fig_proj, use_container_width=True, config={'responsive': True})
 
             # Gráfico de Sazonalidade
             st.subheader("📈 Vendas Mensais")
+            vendas_mes = metricas['vendas_mes']
             fig_saz = px.line(
-                x=metricas['vendas_mes'].index.astype(str),
-                y=metricas['vendas_mes'].values,
+                x=vendas_mes.index,
+                y=vendas_mes.values,
                 markers=True,
-                color_discrete_sequence=['#000000']
+                color_discrete_sequence=['#000000'],
+                render_mode=graficos.modo_render(len(vendas_mes))
             )
             fig_saz.update_layout(
                 title="",
@@ -199,11 +367,11 @@ if verificar_senha():
             st.plotly_chart(fig_saz, use_container_width=True, config={'responsive': True})
 
         # --- ABA 2: PRODUTOS ---
+        medidor.marcar("aba_produtos")
         with abas[1]:
             st.subheader("👕 Análise de Produtos")
             
             # Filtro de produtos
-            lista_produtos = sorted(df_bruto['produto'].unique().tolist())
             produtos_selecionados = st.multiselect(
                 "Filtre produtos:",
                 options=lista_produtos,
@@ -211,11 +379,16 @@ if verificar_senha():
                 key="tab1_produtos"
             )
             
-            df_prod = df_bruto[df_bruto['produto'].isin(produtos_selecionados)]
-            
             # Top Produtos
             st.markdown("**Top 5 Produtos**")
-            top_prod = df_prod.groupby('produto')['valor'].sum().nlargest(5).reset_index()
+            filtro, _, _ = estatisticas.normalizar_filtros(cubo_vendas, produtos_selecionados, None, None)
+            stats_produtos = estatisticas.da_sessao(
+                st.session_state, "stats_produtos", (ingestao_info.chave, filtro),
+                dias_projecao=30, produtos_selecionados=filtro, **entradas
+            )
+            medidor.observar(stats_produtos)
+            vendas_produto = stats_produtos['produtos']['sum']
+            top_prod = vendas_produto.nlargest(5).rename('valor').reset_index()
             
             for idx, row in top_prod.iterrows():
                 col1, col2 = st.columns([3, 1])
@@ -236,11 +409,22 @@ if verificar_senha():
             fig_pie.update_layout(height=400, margin=dict(l=0, r=0, t=0, b=0))
             st.plotly_chart(fig_pie, use_container_width=True, config={'responsive': True})
 
+            # Comprados juntos (afinidade pelos mesmos clientes, nos produtos filtrados)
+            st.markdown("**🧺 Comprados Juntos**")
+            pares = stats_produtos['afinidade'].top_pares(5)
+            if pares.empty:
+                st.caption("Sem pares de produtos com clientes suficientes em comum.")
+            for _, row in pares.iterrows():
+                st.write(f"{row['produto']} + {row['comprado_junto']}")
+                st.caption(f"{row['clientes']:,} clientes · lift {row['lift']:.2f} · "
+                           f"{row['confiança %']:.0f}% de quem leva {row['produto']} leva também")
+
         # --- ABA 3: CLIENTES ---
+        medidor.marcar("aba_clientes")
         with abas[2]:
             st.subheader("👥 Análise de Clientes")
             
-            ltv_clientes = df_bruto.groupby('cliente_id')['valor'].sum().reset_index()
+            ltv_clientes = fatos_bruto['total'].reset_index()
             ltv_clientes.columns = ['Cliente', 'Total Gasto']
             ltv_clientes = ltv_clientes.sort_values('Total Gasto', ascending=False)
 
@@ -260,8 +444,8 @@ if verificar_senha():
             col1, col2 = st.columns(2)
             
             with col1:
-                total_clientes = df_bruto['cliente_id'].nunique()
-                cliente_compras = df_bruto.groupby('cliente_id').size()
+                total_clientes = len(fatos_bruto)
+                cliente_compras = fatos_bruto['compras']
                 recorrentes = len(cliente_compras[cliente_compras >= 2])
                 st.metric("Total", total_clientes)
                 st.metric("Recorrentes", recorrentes)
@@ -271,24 +455,26 @@ if verificar_senha():
                 st.metric("Compra Média", f"{cliente_compras.mean():.1f}")
 
         # --- ABA 4: TENDÊNCIAS ---
+        medidor.marcar("aba_tendencias")
         with abas[3]:
             st.subheader("📈 Tendências")
             
-            lista_produtos = sorted(df_bruto['produto'].unique().tolist())
             produto_selecionado = st.selectbox("Selecione um produto:", lista_produtos, key="tab3_produto")
             
-            df_trend = df_bruto[df_bruto['produto'] == produto_selecionado].copy()
-            df_trend['data_dia'] = df_trend['data'].dt.date
-            vendas_dia = df_trend.groupby('data_dia')['valor'].agg(['sum', 'count']).reset_index()
-            vendas_dia.columns = ['Data', 'Faturamento', 'Quantidade']
+            vendas_dia = cubo_vendas.recortar(produtos=[produto_selecionado]).vendas_diarias()
+
+            # Períodos longos: barras por semana ou mês em vez de uma por dia
+            dias_periodo = (vendas_dia['Data'].iloc[-1] - vendas_dia['Data'].iloc[0]).days + 1 if len(vendas_dia) else 0
+            balde = graficos.escolher_balde(dias_periodo)
+            vendas_periodo = graficos.agrupar_periodo(vendas_dia, balde)
 
             # Gráfico de Tendência
             fig_trend = px.bar(
-                vendas_dia,
+                vendas_periodo,
                 x='Data',
                 y='Faturamento',
                 color_discrete_sequence=['#000000'],
-                title=f"Vendas de {produto_selecionado}"
+                title=f"Vendas de {produto_selecionado} (por {graficos.BALDES[balde]})"
             )
             fig_trend.update_layout(
                 height=300,
@@ -298,53 +484,61 @@ if verificar_senha():
             st.plotly_chart(fig_trend, use_container_width=True, config={'responsive': True})
 
             # Tabela resumida
-            st.dataframe(vendas_dia, use_container_width=True)
+            graficos.mostrar_tabela_paginada(st, vendas_periodo, "tab3_tabela")
 
         # --- ABA 5: FILTROS AVANÇADOS ---
+        medidor.marcar("aba_filtros")
         with abas[4]:
             st.subheader("⚙️ Filtros e Exportação")
             
             # Data Range
             col1, col2 = st.columns(2)
             with col1:
-                data_inicio = st.date_input("Data Inicial:", value=df_bruto['data'].min())
+                data_inicio = st.date_input("Data Inicial:", value=data_minima)
             with col2:
-                data_fim = st.date_input("Data Final:", value=df_bruto['data'].max())
+                data_fim = st.date_input("Data Final:", value=data_maxima)
 
-            # Aplicar filtro
-            df_filtrado = df_bruto[(df_bruto['data'].dt.date >= data_inicio) & 
-                                   (df_bruto['data'].dt.date <= data_fim)]
+            # Contagem pelo cubo; as transações só são recortadas se alguém exportar
+            filtros = estatisticas.normalizar_filtros(cubo_vendas, None, data_inicio, data_fim)
+            st.info(f"📊 {cubo_vendas.recortar(data_inicio, data_fim).linhas} transações no período")
 
-            st.info(f"📊 {len(df_filtrado)} transações no período")
+            def transacoes_periodo():
+                # Na visão consolidada as transações não chegam ao app: exporta o resumo por loja
+                if consolidado is not None:
+                    return consolidado.por_loja(filtros[1], filtros[2])
+                return estatisticas.Estatisticas(
+                    df_bruto=df_bruto, banco=banco_vendas, produtos_selecionados=None,
+                    data_inicio=filtros[1], data_fim=filtros[2]
+                )['df']
 
             # Exportar
             st.markdown("**Exportar Dados**")
-            
-            csv = df_filtrado.to_csv(index=False)
-            st.download_button(
-                label="📥 Download CSV",
-                data=csv,
-                file_name=f"theway_{datetime.now().strftime('%Y%m%d')}.csv",
-                mime="text/csv",
+
+            botao_exportar(
+                "CSV", exportacao.chave_exportacao(ingestao_info.chave, filtros, hoje, 'vendas'), 'csv',
+                transacoes_periodo, f"theway_{datetime.now().strftime('%Y%m%d')}.csv",
                 use_container_width=True
             )
 
             # Excel
-            buffer = io.BytesIO()
-            with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-                df_filtrado.to_excel(writer, sheet_name='Vendas', index=False)
-            
-            st.download_button(
-                label="📊 Download Excel",
-                data=buffer.getvalue(),
-                file_name=f"theway_{datetime.now().strftime('%Y%m%d')}.xlsx",
-                mime="application/vnd.ms-excel",
+            botao_exportar(
+                "Excel", exportacao.chave_exportacao(ingestao_info.chave, filtros, hoje, 'vendas_excel'), 'xlsx',
+                lambda: {'Lojas' if consolidado is not None else 'Vendas': (transacoes_periodo(), False)},
+                f"theway_{datetime.now().strftime('%Y%m%d')}.xlsx",
                 use_container_width=True
             )
 
         # Footer
         st.markdown("---")
         st.caption(f"The Way Mobile | {datetime.now().strftime('%d/%m/%Y')}")
+        st.caption(cache_resultados.CACHE.descricao())
+        st.caption(armazem.ARMAZEM.descricao())
+        historico = instrumentacao.concluir(st.session_state, medidor)
+        if st.session_state.get("admin"):
+            instrumentacao.mostrar_painel(st, historico)
+            if df_bruto is not None:
+                with st.expander("🧠 Memória do Dataset"):
+                    st.dataframe(ingestao.relatorio_memoria(df_bruto), use_container_width=True)
 
     else:
         st.info("📤 Suba seu arquivo Excel para começar!")
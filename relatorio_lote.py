@@ -0,0 +1,138 @@
+"""Relatório em lote, sem Streamlit: estatísticas de várias planilhas em paralelo.
+
+Uso:
+    python relatorio_lote.py vendas/*.xlsx --saida relatorios --processos 8
+
+Para cada planilha grava `<saida>/<nome>/kpis.json` (indicadores e
+recomendações) e uma tabela Parquet por estatística tabular (curva ABC, RFM,
+vendas mensais...). Ao final grava `<saida>/resumo.parquet` e
+`<saida>/resumo.json` com uma linha de KPIs por arquivo. Cada arquivo é
+processado num processo separado, então o throughput acompanha o número de
+núcleos.
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from the_way import estatisticas, ingestao
+
+
+def _para_json(valor):
+    if isinstance(valor, (np.integer, int)):
+        return int(valor)
+    if isinstance(valor, (np.floating, float)):
+        return None if math.isnan(valor) else float(valor)
+    if isinstance(valor, list):
+        return [_para_json(v) for v in valor]
+    return valor
+
+
+def _para_tabela(valor):
+    """DataFrame/Series em formato gravável em Parquet (índice vira coluna)."""
+    tabela = valor.to_frame() if isinstance(valor, pd.Series) else valor
+    if not isinstance(tabela.index, pd.RangeIndex):
+        indice = tabela.index
+        if isinstance(indice, (pd.PeriodIndex, pd.CategoricalIndex)):
+            indice = indice.astype(str)
+        tabela = tabela.set_axis(indice, axis=0).reset_index()
+    tabela.columns = [str(c) for c in tabela.columns]
+    return tabela
+
+
+def processar_arquivo(caminho, destino, dias_projecao=30, streaming=False):
+    """Calcula as estatísticas de uma planilha e grava os resultados em `destino`.
+
+    Devolve a linha do resumo (KPIs escalares, tempo e erro, se houver).
+    """
+    inicio = time.perf_counter()
+    linha = {'arquivo': str(caminho)}
+    try:
+        df = ingestao.carregar_planilha(Path(caminho).read_bytes(), streaming=streaming).df
+        hoje = df['data'].max()
+        # Os núcleos já estão divididos entre os arquivos: dentro de cada um, em série
+        stats = estatisticas.calcular_todas_estatisticas(df, df, hoje, dias_projecao, trabalhadores=1)
+    except Exception as erro:  # uma planilha ruim não derruba o lote
+        linha['erro'] = f"{type(erro).__name__}: {erro}"
+        linha['segundos'] = time.perf_counter() - inicio
+        return linha
+
+    destino.mkdir(parents=True, exist_ok=True)
+    kpis = {}
+    for nome, valor in stats.items():
+        if isinstance(valor, (pd.DataFrame, pd.Series)):
+            _para_tabela(valor).to_parquet(destino / f"{nome}.parquet", index=False)
+        else:
+            kpis[nome] = _para_json(valor)
+    (destino / "kpis.json").write_text(json.dumps(kpis, ensure_ascii=False, indent=2), encoding='utf-8')
+
+    linha.update({nome: valor for nome, valor in kpis.items() if not isinstance(valor, list)})
+    linha['erro'] = None
+    linha['segundos'] = time.perf_counter() - inicio
+    return linha
+
+
+def _destinos(arquivos, saida):
+    """Uma pasta por arquivo; nomes repetidos (mesmo nome em pastas diferentes) ganham sufixo."""
+    usados = {}
+    destinos = []
+    for arquivo in arquivos:
+        nome = Path(arquivo).stem
+        usados[nome] = usados.get(nome, 0) + 1
+        destinos.append(saida / (nome if usados[nome] == 1 else f"{nome}_{usados[nome]}"))
+    return destinos
+
+
+def executar(arquivos, saida, processos=None, dias_projecao=30, streaming=False):
+    """Processa os arquivos num pool de processos e grava o resumo consolidado."""
+    saida = Path(saida)
+    saida.mkdir(parents=True, exist_ok=True)
+    linhas = []
+    with ProcessPoolExecutor(max_workers=processos) as pool:
+        tarefas = {
+            pool.submit(processar_arquivo, arquivo, destino, dias_projecao, streaming): arquivo
+            for arquivo, destino in zip(arquivos, _destinos(arquivos, saida))
+        }
+        for tarefa in as_completed(tarefas):
+            linha = tarefa.result()
+            linhas.append(linha)
+            situacao = f"❌ {linha['erro']}" if linha['erro'] else "✅"
+            print(f"{situacao} {linha['arquivo']} ({linha['segundos']:.1f}s)", flush=True)
+
+    ordem = {str(arquivo): i for i, arquivo in enumerate(arquivos)}
+    resumo = pd.DataFrame(sorted(linhas, key=lambda l: ordem[l['arquivo']]))
+    resumo.to_parquet(saida / "resumo.parquet", index=False)
+    (saida / "resumo.json").write_text(
+        json.dumps([{k: _para_json(v) for k, v in linha.items()} for linha in resumo.to_dict('records')],
+                   ensure_ascii=False, indent=2),
+        encoding='utf-8'
+    )
+    return resumo
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Estatísticas The Way para várias planilhas, sem abrir o dashboard.")
+    parser.add_argument('arquivos', nargs='+', help="Planilhas .xlsx (data, cliente_id, produto, valor)")
+    parser.add_argument('--saida', default="relatorios", help="Pasta de saída (padrão: relatorios)")
+    parser.add_argument('--processos', type=int, default=os.cpu_count(),
+                        help="Processos em paralelo (padrão: número de núcleos)")
+    parser.add_argument('--dias-projecao', type=int, default=30, help="Horizonte de projeção em dias (padrão: 30)")
+    parser.add_argument('--streaming', action='store_true', help="Lê as planilhas em lotes (arquivos grandes)")
+    args = parser.parse_args(argv)
+
+    inicio = time.perf_counter()
+    resumo = executar(args.arquivos, args.saida, args.processos, args.dias_projecao, args.streaming)
+    falhas = int(resumo['erro'].notna().sum())
+    print(f"📊 {len(resumo) - falhas} de {len(resumo)} arquivos em {time.perf_counter() - inicio:.1f}s → {args.saida}")
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,18 @@
+import numpy as np
+import pandas as pd
+
+from the_way.cubo import CuboVendas
+
+
+def test_linha_sem_data_fica_fora_do_cubo():
+    df = pd.DataFrame({
+        'data': pd.to_datetime(['2025-01-02', None, '2025-01-03']),
+        'cliente_id': ['a', 'b', 'c'],
+        'produto': ['Camiseta', 'Camiseta', 'Boné'],
+        'valor': [10.0, 20.0, 30.0],
+    })
+    cubo = CuboVendas.de_transacoes(df)
+    recorte = cubo.recortar()
+    assert list(cubo.dias) == list(np.array(['2025-01-02', '2025-01-03'], dtype='datetime64[D]'))
+    assert recorte.linhas == 2
+    assert recorte.faturamento_total == 40.0
@@ -0,0 +1,35 @@
+import pandas as pd
+import pytest
+
+from the_way import ingestao
+
+
+def test_ordenar_por_data_descarta_linhas_sem_data():
+    df = pd.DataFrame({
+        'data': pd.to_datetime(['2025-01-03', None, '2025-01-02']),
+        'cliente_id': ['a', 'b', 'c'],
+        'produto': ['Camiseta', 'Camiseta', 'Boné'],
+        'valor': [10.0, 20.0, 30.0],
+    })
+    with pytest.warns(UserWarning, match="1 linha"):
+        ordenado = ingestao.ordenar_por_data(df)
+    assert ordenado['valor'].tolist() == [30.0, 10.0]
+    assert ordenado.index.tolist() == [ingestao.numero_dia('2025-01-02'), ingestao.numero_dia('2025-01-03')]
+    assert ordenado.index.is_monotonic_increasing
+    assert len(ingestao.fatia_periodo(ordenado, pd.Timestamp('2025-01-03').date(), None)) == 1
+
+
+def test_ordenar_lotes_igual_ao_caminho_pandas():
+    import pyarrow as pa
+
+    df = pd.DataFrame({
+        'data': pd.to_datetime(['2025-01-03', None, '2025-01-02', '2025-01-02', '2025-01-01', '2025-01-03']),
+        'cliente_id': ['b', 'a', 'b', 'a', 'b', 'a'],
+        'produto': ['Camiseta', 'Boné', 'Boné', 'Camiseta', 'Camiseta', 'Camiseta'],
+        'valor': [10.0, 20.0, 30.0, 40.0, 50.0, 60.0],
+    })
+    tabela = pa.Table.from_pandas(df, schema=ingestao.ESQUEMA_LOTES, preserve_index=False)
+    with pytest.warns(UserWarning):
+        esperado = ingestao.ordenar_por_data(df)
+    with pytest.warns(UserWarning):
+        pd.testing.assert_frame_equal(ingestao.ordenar_lotes(tabela), esperado)
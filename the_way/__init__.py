@@ -0,0 +1 @@
+"""Módulos compartilhados pelos dashboards The Way (completo e mobile)."""
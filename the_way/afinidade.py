@@ -0,0 +1,93 @@
+"""Afinidade entre produtos (cesta de compras) por matriz esparsa cliente × produto.
+
+Cada cliente é uma linha e cada produto uma coluna da matriz binária X
+(comprou ou não, no recorte). A co-ocorrência de todos os pares sai de um
+único produto esparso XᵀX: a diagonal conta os clientes de cada produto e as
+outras células, os clientes que compraram os dois. Suporte, confiança e lift
+são operações vetorizadas sobre as células não nulas, sem laço por par.
+
+Para um par A → B, com N clientes no recorte:
+- suporte: clientes de A e B / N
+- confiança: clientes de A e B / clientes de A
+- lift: confiança / (clientes de B / N); acima de 1, comprar A aumenta a
+  chance de comprar B
+"""
+import numpy as np
+import pandas as pd
+
+# Pares com menos clientes em comum ficam fora (lift de amostras pequenas é ruído)
+MINIMO_CLIENTES_PAR = 5
+
+
+class AfinidadeProdutos:
+    def __init__(self, produtos, coocorrencia, total_clientes):
+        self.produtos = produtos                # pd.Index ordenado
+        self.coocorrencia = coocorrencia        # csr int64 (produtos × produtos), simétrica
+        self.total_clientes = total_clientes
+        self.clientes_por_produto = coocorrencia.diagonal()
+
+    @classmethod
+    def de_pares(cls, cliente_id, produto):
+        """Monta a matriz a partir das colunas cliente_id e produto (transações ou pares distintos)."""
+        from scipy import sparse  # importado na primeira análise, não na partida do app
+
+        # Colunas categóricas são fatoradas pelos códigos, sem hashing de texto
+        cliente, _ = pd.factorize(pd.Series(cliente_id, copy=False))
+        coluna, produtos = pd.factorize(pd.Series(produto, copy=False), sort=True)
+        validos = (cliente >= 0) & (coluna >= 0)
+        cliente, coluna = cliente[validos], coluna[validos]
+        n_clientes = int(cliente.max()) + 1 if len(cliente) else 0
+
+        compras = sparse.csr_matrix((np.ones(len(cliente), dtype=np.int64), (cliente, coluna)),
+                                    shape=(n_clientes, len(produtos)))
+        compras.data[:] = 1  # comprou ou não: repetições do mesmo par não contam
+        coocorrencia = (compras.T @ compras).tocsr()
+        return cls(pd.Index(np.asarray(produtos), name='produto'), coocorrencia, n_clientes)
+
+    @property
+    def nbytes(self):
+        """Memória da matriz esparsa (dados e índices), das contagens e dos nomes de produto."""
+        matriz = self.coocorrencia
+        return (matriz.data.nbytes + matriz.indices.nbytes + matriz.indptr.nbytes
+                + self.clientes_por_produto.nbytes + int(self.produtos.memory_usage(deep=True)))
+
+    def pares(self, minimo_clientes=MINIMO_CLIENTES_PAR):
+        """Todas as regras A → B com pelo menos `minimo_clientes` em comum."""
+        celulas = self.coocorrencia.tocoo()
+        manter = (celulas.row != celulas.col) & (celulas.data >= minimo_clientes)
+        a, b, juntos = celulas.row[manter], celulas.col[manter], celulas.data[manter].astype(np.float64)
+        clientes_a = self.clientes_por_produto[a]
+        clientes_b = self.clientes_por_produto[b]
+        confianca = juntos / clientes_a
+        return pd.DataFrame({
+            'produto': self.produtos[a],
+            'comprado_junto': self.produtos[b],
+            'clientes': juntos.astype(np.int64),
+            'suporte %': juntos / self.total_clientes * 100,
+            'confiança %': confianca * 100,
+            'lift': confianca / (clientes_b / self.total_clientes),
+        })
+
+    def top_pares(self, n=10, minimo_clientes=MINIMO_CLIENTES_PAR):
+        """Pares de maior lift, cada par uma vez só (A → B e B → A têm o mesmo lift)."""
+        pares = self.pares(minimo_clientes)
+        pares = pares[pares['produto'] < pares['comprado_junto']]
+        return pares.nlargest(n, ['lift', 'clientes']).reset_index(drop=True)
+
+    def top_por_produto(self, produto, n=5, minimo_clientes=MINIMO_CLIENTES_PAR):
+        """Produtos mais associados a `produto` (por lift), com confiança e suporte."""
+        posicao = self.produtos.get_indexer([produto])[0]
+        if posicao < 0:
+            return self.pares(minimo_clientes).iloc[:0]
+        linha = self.coocorrencia.getrow(posicao).tocoo()
+        manter = (linha.col != posicao) & (linha.data >= minimo_clientes)
+        b, juntos = linha.col[manter], linha.data[manter].astype(np.float64)
+        confianca = juntos / self.clientes_por_produto[posicao]
+        regras = pd.DataFrame({
+            'comprado_junto': self.produtos[b],
+            'clientes': juntos.astype(np.int64),
+            'suporte %': juntos / self.total_clientes * 100,
+            'confiança %': confianca * 100,
+            'lift': confianca / (self.clientes_por_produto[b] / self.total_clientes),
+        })
+        return regras.nlargest(n, ['lift', 'clientes']).reset_index(drop=True)
@@ -0,0 +1,126 @@
+"""Armazém de datasets do processo: uma cópia por conteúdo, compartilhada pelas sessões.
+
+Cada planilha (identificada pelo hash do conteúdo) fica uma única vez em
+memória, não importa quantas sessões ou reruns a usem. As sessões recebem
+visões rasas do DataFrame (mesmos arrays, outro objeto), então acrescentar
+uma coluna numa sessão não afeta as outras. As colunas numéricas e de data
+vêm do Arrow mapeado em memória e são somente leitura; o DataFrame guardado
+não deve ser alterado.
+
+Cada sessão segura uma `Reserva` do dataset que está usando (guardada no
+session_state). Quando a sessão troca de arquivo ou termina, a reserva é
+coletada e a referência cai sozinha. Ao passar do orçamento de memória, os
+datasets sem reservas são descartados do menos recente para o mais recente.
+Datasets em uso (e o que acabou de ser guardado) nunca são descartados, mesmo
+acima do orçamento.
+"""
+import os
+import threading
+import weakref
+from collections import OrderedDict
+
+MB = 1024 * 1024
+
+ORCAMENTO_PADRAO_MB = int(os.environ.get("THE_WAY_ARMAZEM_MB", "1024"))
+
+
+class Reserva:
+    """Ficha de uso de um dataset por uma sessão."""
+
+    __slots__ = ('chave', '__weakref__')
+
+    def __init__(self, chave):
+        self.chave = chave
+
+
+class _Item:
+    __slots__ = ('df', 'tamanho', 'reservas')
+
+    def __init__(self, df, tamanho):
+        self.df = df
+        self.tamanho = tamanho
+        self.reservas = weakref.WeakSet()
+
+
+class ArmazemDatasets:
+    def __init__(self, orcamento_bytes):
+        self.orcamento = orcamento_bytes
+        self.uso = 0
+        self.descartes = 0
+        self._itens = OrderedDict()
+        self._trava = threading.RLock()
+
+    def obter(self, chave):
+        """Visão rasa do dataset guardado (ou None)."""
+        with self._trava:
+            item = self._itens.get(chave)
+            if item is None:
+                return None
+            self._itens.move_to_end(chave)
+            return item.df.copy(deep=False)
+
+    def guardar(self, chave, df):
+        """Guarda o dataset (se outra sessão guardou antes, vale o que já está lá)."""
+        tamanho = int(df.memory_usage(deep=True).sum())
+        with self._trava:
+            if chave not in self._itens:
+                self._itens[chave] = _Item(df, tamanho)
+                self.uso += tamanho
+                # O recém-guardado fica, mesmo acima do orçamento: quem chamou ainda vai reservá-lo
+                self._descartar_excedente(protegida=chave)
+            return self.obter(chave)
+
+    def reservar(self, chave, atual=None):
+        """Marca o dataset como em uso enquanto a reserva devolvida existir.
+
+        `atual` é a reserva que a sessão já tem: se for do mesmo dataset ela é
+        reaproveitada (e volta a contar, caso o dataset tenha sido recarregado).
+        """
+        reserva = atual if atual is not None and atual.chave == chave else Reserva(chave)
+        with self._trava:
+            item = self._itens.get(chave)
+            if item is not None:
+                item.reservas.add(reserva)
+        if reserva is not atual:
+            weakref.finalize(reserva, self._liberado)
+        return reserva
+
+    def referencias(self, chave):
+        with self._trava:
+            item = self._itens.get(chave)
+            return len(item.reservas) if item is not None else 0
+
+    def _liberado(self):
+        with self._trava:
+            self._descartar_excedente()
+
+    def _descartar_excedente(self, protegida=None):
+        if self.uso <= self.orcamento:
+            return
+        # Itera as reservas em vez de usar len(): dentro do finalize da última, o WeakSet ainda a conta
+        livres = [c for c, item in self._itens.items() if not any(True for _ in item.reservas) and c != protegida]
+        for chave in livres:
+            self.uso -= self._itens.pop(chave).tamanho
+            self.descartes += 1
+            if self.uso <= self.orcamento:
+                break
+
+    def limpar(self):
+        with self._trava:
+            self._itens.clear()
+            self.uso = 0
+
+    def __len__(self):
+        return len(self._itens)
+
+    def __contains__(self, chave):
+        return chave in self._itens
+
+    def descricao(self):
+        sessoes = sum(len(item.reservas) for item in self._itens.values())
+        return (f"🗄️ Datasets em memória: {len(self._itens)} · {self.uso / MB:.0f} de {self.orcamento / MB:.0f} MB "
+                f"· {sessoes} reservas")
+
+
+# Instância do processo, compartilhada por todas as sessões
+ARMAZEM = ArmazemDatasets(ORCAMENTO_PADRAO_MB * MB)
@@ -0,0 +1,318 @@
+"""Backend SQLite: as transações ficam num banco local indexado, fora da memória do processo.
+
+Alternativa ao DataFrame em memória para históricos que não cabem na RAM de
+cada worker. A planilha é lida em lotes (o mesmo leitor do modo streaming) e
+gravada uma vez por conteúdo num arquivo SQLite no diretório de cache, com
+índices em data, cliente_id e produto. Datas ficam como inteiros
+(nanossegundos desde 1970, mais o mês já calculado para as coortes) e os
+valores também em centavos inteiros, para as somas baterem com o cubo em
+memória.
+
+Filtros e agrupamentos vão para o SQL: o Python recebe só resultados
+agregados (células dia × produto, uma linha por cliente, coortes, percentis).
+As métricas do grafo de estatísticas que leem transações têm uma versão
+`*_sql`, usada quando a entrada `banco` está presente; todo o resto do grafo
+é o mesmo nos dois backends.
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from the_way import clientes, cubo, ingestao
+from the_way.coortes import MatrizCoortes
+
+BACKENDS = {
+    'pandas': "🐼 Em memória (pandas)",
+    'sqlite': "🗃️ Banco local (SQLite)",
+}
+
+# Backend inicial dos apps (a barra lateral permite trocar)
+BACKEND_PADRAO = os.environ.get("THE_WAY_BACKEND", "pandas")
+if BACKEND_PADRAO not in BACKENDS:
+    BACKEND_PADRAO = "pandas"
+
+# Mudou o esquema? Incremente para não reaproveitar bancos antigos.
+VERSAO_BANCO = 1
+
+NS_DIA = 86_400 * 10 ** 9
+
+LINHAS_POR_INSERCAO = 50_000
+
+_ESQUEMA = """
+CREATE TABLE vendas (
+    data INTEGER,
+    mes INTEGER,
+    cliente_id TEXT,
+    produto TEXT,
+    valor REAL,
+    centavos INTEGER
+)
+"""
+
+_INDICES = [
+    "CREATE INDEX vendas_data ON vendas (data)",
+    "CREATE INDEX vendas_cliente ON vendas (cliente_id)",
+    "CREATE INDEX vendas_produto ON vendas (produto)",
+]
+
+_memoria = OrderedDict()
+_trava = threading.Lock()
+
+
+def caminho_banco(chave):
+    return ingestao.DIRETORIO_CACHE / f"{chave}.v{VERSAO_BANCO}.sqlite"
+
+
+def _linhas_do_lote(lote):
+    """Tuplas (data, mes, cliente_id, produto, valor, centavos) de um RecordBatch; nulos viram None."""
+    datas = lote.column('data').cast(pa.int64()).to_pylist()
+    instantes = lote.column('data').to_numpy(zero_copy_only=False)
+    meses = np.where(np.isnat(instantes), None, instantes.astype('datetime64[M]').astype(np.int64)).tolist()
+    valores = lote.column('valor').to_numpy(zero_copy_only=False)
+    validos = ~np.isnan(valores)
+    centavos = np.zeros(len(valores), dtype=np.int64)
+    centavos[validos] = np.rint(valores[validos] * 100).astype(np.int64)
+    return zip(datas, meses, lote.column('cliente_id').to_pylist(), lote.column('produto').to_pylist(),
+               np.where(validos, valores, None).tolist(), np.where(validos, centavos, None).tolist())
+
+
+def criar_banco(arquivo_arrow, destino):
+    """Grava as transações do Arrow (esquema do modo streaming) num SQLite indexado."""
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    temporario = destino.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    temporario.unlink(missing_ok=True)
+    try:
+        conexao = sqlite3.connect(temporario)
+        try:
+            # Arquivo temporário: sem journal, e os índices só depois da carga
+            conexao.execute("PRAGMA journal_mode = OFF")
+            conexao.execute("PRAGMA synchronous = OFF")
+            conexao.execute(_ESQUEMA)
+            with pa.memory_map(str(arquivo_arrow)) as fonte:
+                leitor = pa.ipc.open_file(fonte)
+                for i in range(leitor.num_record_batches):
+                    lote = leitor.get_batch(i)
+                    for inicio in range(0, lote.num_rows, LINHAS_POR_INSERCAO):
+                        conexao.executemany("INSERT INTO vendas VALUES (?, ?, ?, ?, ?, ?)",
+                                            _linhas_do_lote(lote.slice(inicio, LINHAS_POR_INSERCAO)))
+            for indice in _INDICES:
+                conexao.execute(indice)
+            conexao.execute("ANALYZE")
+            conexao.commit()
+        finally:
+            conexao.close()
+        os.replace(temporario, destino)
+    finally:
+        temporario.unlink(missing_ok=True)
+
+
+class BancoVendas:
+    """Consultas agregadas sobre o banco de um dataset (uma conexão somente leitura por thread)."""
+
+    def __init__(self, chave, caminho):
+        self.chave = chave
+        self.caminho = caminho
+        self._local = threading.local()
+        self._cubo = None
+        self._trava = threading.Lock()
+
+    def _conexao(self):
+        conexao = getattr(self._local, 'conexao', None)
+        if conexao is None:
+            conexao = sqlite3.connect(f"{self.caminho.resolve().as_uri()}?mode=ro", uri=True)
+            self._local.conexao = conexao
+        return conexao
+
+    def consultar(self, sql, parametros=()):
+        return self._conexao().execute(sql, parametros).fetchall()
+
+    def tabela(self, sql, parametros=()):
+        return pd.read_sql_query(sql, self._conexao(), params=parametros)
+
+    @staticmethod
+    def _filtro(produtos=None, inicio=None, fim=None, extra=()):
+        """Cláusula WHERE e parâmetros para período [inicio, fim] (datas) e lista de produtos."""
+        condicoes, parametros = list(extra), []
+        if inicio is not None:
+            condicoes.append("data >= ?")
+            parametros.append(ingestao.numero_dia(inicio) * NS_DIA)
+        if fim is not None:
+            condicoes.append("data < ?")
+            parametros.append((ingestao.numero_dia(fim) + 1) * NS_DIA)
+        if produtos is not None:
+            condicoes.append(f"produto IN ({', '.join('?' * len(produtos))})")
+            parametros.extend(produtos)
+        return (" WHERE " + " AND ".join(condicoes)) if condicoes else "", parametros
+
+    @property
+    def hoje(self):
+        """Data da última transação."""
+        return pd.Timestamp(self.consultar("SELECT MAX(data) FROM vendas")[0][0])
+
+    def cubo(self):
+        """Cubo dia × produto montado com um GROUP BY (uma vez por banco)."""
+        with self._trava:
+            if self._cubo is None:
+                self._cubo = self._montar_cubo()
+            return self._cubo
+
+    def _montar_cubo(self):
+        celulas = self.tabela(
+            f"SELECT data / {NS_DIA} AS dia, produto, SUM(centavos) AS centavos, COUNT(*) AS vendas,"
+            " MIN(valor) AS minimo, MAX(valor) AS maximo"
+            " FROM vendas WHERE produto IS NOT NULL AND data IS NOT NULL GROUP BY dia, produto"
+        )
+        dia_idx, dias = pd.factorize(celulas['dia'], sort=True)
+        prod_idx, produtos = pd.factorize(celulas['produto'], sort=True)
+        formato = (len(dias), len(produtos))
+        soma = np.zeros(formato, dtype=np.int64)
+        vendas = np.zeros(formato, dtype=np.int64)
+        minimo = np.full(formato, np.nan)
+        maximo = np.full(formato, np.nan)
+        soma[dia_idx, prod_idx] = celulas['centavos'].fillna(0).to_numpy(dtype=np.int64)
+        vendas[dia_idx, prod_idx] = celulas['vendas'].to_numpy(dtype=np.int64)
+        minimo[dia_idx, prod_idx] = celulas['minimo'].to_numpy(dtype=np.float64)
+        maximo[dia_idx, prod_idx] = celulas['maximo'].to_numpy(dtype=np.float64)
+        return cubo.CuboVendas(np.asarray(dias, dtype=np.int64).astype('datetime64[D]'),
+                               pd.Index(produtos, name='produto'), soma, vendas, minimo, maximo)
+
+    def tabela_clientes(self, produtos=None, inicio=None, fim=None):
+        """Mesma tabela de `clientes.tabela_clientes`, agregada no banco."""
+        where, parametros = self._filtro(produtos, inicio, fim, extra=["cliente_id IS NOT NULL"])
+        fatos = self.tabela(
+            "SELECT cliente_id, MIN(data) AS primeira_compra, MAX(data) AS ultima_compra, COUNT(*) AS compras,"
+            f" SUM(valor) AS total, AVG(valor) AS ticket_medio FROM vendas{where}"
+            " GROUP BY cliente_id ORDER BY cliente_id", parametros
+        ).set_index('cliente_id')
+        for coluna in ('primeira_compra', 'ultima_compra'):
+            fatos[coluna] = pd.to_datetime(fatos[coluna], unit='ns')
+        fatos['total'] = fatos['total'].fillna(0.0)
+        return clientes.completar_intervalos(fatos)
+
+    def transacoes(self, produtos=None, inicio=None, fim=None):
+        """Transações do filtro, ordenadas por data (só para exportação e consultas pontuais)."""
+        where, parametros = self._filtro(produtos, inicio, fim)
+        df = self.tabela(f"SELECT data, cliente_id, produto, valor FROM vendas{where} ORDER BY data, rowid",
+                         parametros)
+        df['data'] = pd.to_datetime(df['data'], unit='ns')
+        return ingestao.ordenar_por_data(df)
+
+    def quantis(self, qs, produtos=None, inicio=None, fim=None):
+        """Percentis exatos com interpolação linear (como `Series.quantile`).
+
+        Do banco sai só a contagem por valor distinto; as posições são buscadas
+        na contagem acumulada.
+        """
+        where, parametros = self._filtro(produtos, inicio, fim, extra=["valor IS NOT NULL"])
+        contagem = self.tabela(f"SELECT valor, COUNT(*) AS n FROM vendas{where} GROUP BY valor ORDER BY valor",
+                               parametros)
+        resultado = pd.Series(np.nan, index=pd.Index(qs, dtype=np.float64))
+        if contagem.empty:
+            return resultado
+        valores = contagem['valor'].to_numpy(dtype=np.float64)
+        acumulado = np.cumsum(contagem['n'].to_numpy())
+        for q in qs:
+            posicao = q * (acumulado[-1] - 1)
+            abaixo, acima = valores[np.searchsorted(acumulado, [np.floor(posicao), np.ceil(posicao)], side='right')]
+            resultado[q] = abaixo + (acima - abaixo) * (posicao - np.floor(posicao))
+        return resultado
+
+    def desvio_padrao(self, produtos=None, inicio=None, fim=None):
+        """Desvio padrão amostral do valor (duas passadas no banco: média e soma dos quadrados)."""
+        where, parametros = self._filtro(produtos, inicio, fim, extra=["valor IS NOT NULL"])
+        quadrados, n = self.consultar(
+            f"SELECT SUM((valor - m.media) * (valor - m.media)), COUNT(valor)"
+            f" FROM vendas, (SELECT AVG(valor) AS media FROM vendas{where}) AS m{where}", parametros * 2
+        )[0]
+        return float(np.sqrt(quadrados / (n - 1))) if n and n > 1 else np.nan
+
+    def coortes(self):
+        """Matriz de coortes agregada no banco (mês da primeira compra × meses desde ela)."""
+        celulas = self.tabela(
+            "WITH inicio AS (SELECT cliente_id, MIN(mes) AS coorte FROM vendas"
+            " WHERE cliente_id IS NOT NULL AND mes IS NOT NULL GROUP BY cliente_id)"
+            " SELECT inicio.coorte, vendas.mes - inicio.coorte AS idade,"
+            " COUNT(DISTINCT vendas.cliente_id) AS clientes, TOTAL(vendas.valor) AS receita"
+            " FROM vendas JOIN inicio USING (cliente_id) WHERE vendas.mes IS NOT NULL"
+            " GROUP BY inicio.coorte, idade"
+        )
+        if celulas.empty:
+            vazia = np.zeros((0, 0))
+            return MatrizCoortes(0, vazia.astype(np.int64), vazia)
+        inicio = int(celulas['coorte'].min())
+        n_meses = int((celulas['coorte'] + celulas['idade']).max()) - inicio + 1
+        linha, coluna = celulas['coorte'].to_numpy() - inicio, celulas['idade'].to_numpy()
+        matriz_clientes = np.zeros((n_meses, n_meses), dtype=np.int64)
+        matriz_receita = np.zeros((n_meses, n_meses))
+        matriz_clientes[linha, coluna] = celulas['clientes'].to_numpy()
+        matriz_receita[linha, coluna] = celulas['receita'].to_numpy()
+        return MatrizCoortes(inicio, matriz_clientes, matriz_receita)
+
+    def clientes_produtos(self, produtos=None, inicio=None, fim=None):
+        """Pares distintos cliente × produto do filtro (base da afinidade de produtos)."""
+        where, parametros = self._filtro(produtos, inicio, fim,
+                                         extra=["cliente_id IS NOT NULL", "produto IS NOT NULL"])
+        return self.tabela(f"SELECT DISTINCT cliente_id, produto FROM vendas{where}", parametros)
+
+    def descricao(self):
+        linhas = self.consultar("SELECT COUNT(*) FROM vendas")[0][0]
+        tamanho = self.caminho.stat().st_size / (1024 * 1024)
+        return f"{BACKENDS['sqlite']} · {linhas:,} linhas · {tamanho:.0f} MB em disco"
+
+
+@dataclass
+class ResultadoBanco:
+    banco: BancoVendas
+    chave: str
+    origem: str
+    segundos: float
+
+    def descricao(self):
+        return f"{ingestao.ORIGENS[self.origem]} · {self.segundos:.2f}s"
+
+
+def banco_para(chave, caminho):
+    """Objeto do banco (com o cubo já montado, se alguém pediu) por chave."""
+    with _trava:
+        if chave in _memoria:
+            _memoria.move_to_end(chave)
+            return _memoria[chave]
+        banco = BancoVendas(chave, caminho)
+        _memoria[chave] = banco
+        while len(_memoria) > ingestao.MAX_EM_MEMORIA:
+            _memoria.popitem(last=False)
+        return banco
+
+
+def carregar_banco(conteudo, progresso=None):
+    """Abre o banco da planilha, criando-o na primeira vez (leitura em lotes, sem DataFrame inteiro).
+
+    Se o modo streaming já gravou o Arrow desta planilha, ele é reaproveitado.
+    """
+    inicio = time.perf_counter()
+    conteudo_hash = ingestao.chave_conteudo(conteudo)
+    chave = conteudo_hash + '.sqlite'
+    caminho = caminho_banco(chave)
+    if caminho.exists():
+        origem = 'memoria' if chave in _memoria else 'disco'
+    else:
+        arrow = ingestao.caminho_cache(conteudo_hash + '.lotes')
+        if arrow.exists():
+            criar_banco(arrow, caminho)
+            origem = 'disco'
+        else:
+            temporario = caminho.with_name(caminho.name + '.lotes')
+            try:
+                ingestao.ler_excel_em_lotes(conteudo, temporario, progresso=progresso)
+                criar_banco(temporario, caminho)
+            finally:
+                temporario.unlink(missing_ok=True)
+            origem = 'excel'
+    return ResultadoBanco(banco_para(chave, caminho), chave, origem, time.perf_counter() - inicio)
@@ -0,0 +1,95 @@
+"""Cache LRU de resultados de estatísticas, compartilhado pelo processo.
+
+As chaves combinam a impressão digital do dataset, os filtros normalizados e o
+horizonte de projeção (só os parâmetros de que cada métrica realmente depende).
+O cache respeita um orçamento de memória: ao passar do limite, os itens usados
+há mais tempo são descartados. Contadores de acertos e falhas aparecem na tela.
+"""
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+MB = 1024 * 1024
+
+ORCAMENTO_PADRAO_MB = int(os.environ.get("THE_WAY_CACHE_RESULTADOS_MB", "256"))
+
+
+def tamanho_em_bytes(valor):
+    """Estimativa da memória ocupada por um resultado."""
+    if isinstance(valor, (pd.DataFrame, pd.Series)):
+        uso = valor.memory_usage(deep=True)
+        return int(uso.sum()) if isinstance(valor, pd.DataFrame) else int(uso)
+    if isinstance(valor, pd.Index):
+        return int(valor.memory_usage(deep=True))
+    if isinstance(valor, np.ndarray):
+        return int(valor.nbytes)
+    if hasattr(valor, 'nbytes'):
+        # Estruturas do pacote (afinidade, coortes, recência) informam a memória dos seus arrays
+        return int(valor.nbytes)
+    if isinstance(valor, (list, tuple)):
+        return sys.getsizeof(valor) + sum(tamanho_em_bytes(v) for v in valor)
+    if isinstance(valor, dict):
+        return sys.getsizeof(valor) + sum(tamanho_em_bytes(v) for v in valor.values())
+    return sys.getsizeof(valor)
+
+
+class CacheLRU:
+    def __init__(self, orcamento_bytes):
+        self.orcamento = orcamento_bytes
+        self.uso = 0
+        self.acertos = 0
+        self.falhas = 0
+        self.descartes = 0
+        self._itens = OrderedDict()
+        self._trava = threading.Lock()
+
+    def obter(self, chave):
+        """Devolve (encontrado, valor) e marca o item como usado recentemente."""
+        with self._trava:
+            item = self._itens.get(chave)
+            if item is None:
+                self.falhas += 1
+                return False, None
+            self._itens.move_to_end(chave)
+            self.acertos += 1
+            return True, item[0]
+
+    def guardar(self, chave, valor):
+        tamanho = tamanho_em_bytes(valor)
+        if tamanho > self.orcamento:
+            return
+        with self._trava:
+            anterior = self._itens.pop(chave, None)
+            if anterior is not None:
+                self.uso -= anterior[1]
+            self._itens[chave] = (valor, tamanho)
+            self.uso += tamanho
+            while self.uso > self.orcamento:
+                _, (_, liberado) = self._itens.popitem(last=False)
+                self.uso -= liberado
+                self.descartes += 1
+
+    def limpar(self):
+        with self._trava:
+            self._itens.clear()
+            self.uso = 0
+
+    def __len__(self):
+        return len(self._itens)
+
+    @property
+    def taxa_acerto(self):
+        consultas = self.acertos + self.falhas
+        return self.acertos / consultas * 100 if consultas else 0.0
+
+    def descricao(self):
+        return (f"♻️ Cache de resultados: {self.taxa_acerto:.0f}% acertos "
+                f"({self.acertos} ✓ / {self.falhas} ✗) · {self.uso / MB:.1f} de {self.orcamento / MB:.0f} MB")
+
+
+# Instância do processo, compartilhada por todas as sessões
+CACHE = CacheLRU(ORCAMENTO_PADRAO_MB * MB)
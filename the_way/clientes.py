@@ -0,0 +1,49 @@
+"""Tabela fato de clientes: uma linha por cliente, calculada em uma única passada.
+
+Todas as estatísticas por cliente (AOV, LTV, top clientes, última visita, RFM,
+segmentação, projeção, frequência) leem desta tabela em vez de repetir
+`groupby('cliente_id')` sobre as transações.
+"""
+import pandas as pd
+
+from the_way.ingestao import numero_dia, numeros_dia, sem_categorias
+
+
+def tabela_clientes(df):
+    """Agrega as transações por cliente.
+
+    Colunas: primeira_compra, ultima_compra, compras, total, ticket_medio,
+    dias_entre_compras (soma dos intervalos) e intervalo_medio (NaN para quem
+    comprou uma única vez). O índice é o cliente_id, em ordem crescente.
+    """
+    fatos = df.groupby('cliente_id', observed=True).agg(
+        primeira_compra=('data', 'min'),
+        ultima_compra=('data', 'max'),
+        compras=('data', 'size'),
+        total=('valor', 'sum'),
+        ticket_medio=('valor', 'mean'),
+    )
+    fatos.index = sem_categorias(fatos.index)
+    return completar_intervalos(fatos)
+
+
+def completar_intervalos(fatos):
+    """Acrescenta dias_entre_compras e intervalo_medio a uma tabela já agregada."""
+    # Ordenadas por data, os intervalos consecutivos somam (última - primeira)
+    fatos['dias_entre_compras'] = (fatos['ultima_compra'] - fatos['primeira_compra']).dt.days
+    intervalos = fatos['compras'] - 1
+    fatos['intervalo_medio'] = fatos['dias_entre_compras'] / intervalos.where(intervalos > 0)
+    return fatos
+
+
+def intervalo_medio_global(fatos):
+    """Média dos dias entre compras consecutivas, considerando todos os clientes."""
+    intervalos = (fatos['compras'] - 1).sum()
+    if intervalos == 0:
+        return float('nan')
+    return fatos['dias_entre_compras'].sum() / intervalos
+
+
+def dias_parado(fatos, hoje):
+    """Dias desde a última compra de cada cliente (diferença dos números de dia, int64)."""
+    return pd.Series(numero_dia(hoje) - numeros_dia(fatos['ultima_compra']), index=fatos.index)
@@ -0,0 +1,236 @@
+"""Consolidação de várias planilhas (uma por loja ou por mês) por map-reduce.
+
+Cada planilha é reduzida num processo separado a um parcial compacto: o
+estado agregado por cliente (`incremental.EstadoAgregado`), o cubo dia ×
+produto com somas, contagens, mínimo e máximo (`cubo.CuboVendas`), os
+sketches das mesmas células, a receita por cliente × mês (para as coortes) e
+os pares distintos cliente × produto (para a afinidade). As transações ficam
+no processo que as leu; o app só recebe e mescla os parciais, então a
+memória depende do tamanho dos agregados, não da soma das planilhas.
+
+Os parciais são guardados por conteúdo: trocar uma planilha do conjunto só
+reduz a nova. Como cada loja mantém o seu parcial, o detalhamento por loja
+sai deles, sem reler as linhas.
+
+As métricas por cliente da visão consolidada usam o histórico inteiro (os
+parciais não guardam cliente × dia × produto); percentis, clientes únicos e
+desvio padrão do recorte vêm dos sketches (modo aproximado).
+"""
+import multiprocessing
+import os
+import sys
+import threading
+import types
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from the_way import cubo, ingestao, sketches
+from the_way.afinidade import AfinidadeProdutos
+from the_way.coortes import MatrizCoortes, _codigo_mes
+from the_way.incremental import EstadoAgregado, centavos
+
+# Parciais mantidos em memória (são pequenos: agregados, não transações)
+MAX_PARCIAIS = 64
+
+_parciais = OrderedDict()
+_consolidados = OrderedDict()
+_trava = threading.Lock()
+
+# Processos de trabalho saem de um forkserver (processo limpo, com este módulo
+# pré-importado), nunca de um fork do servidor: com várias threads rodando,
+# o filho de um fork pode herdar travas presas (logging, pyarrow, as deste pacote)
+_CONTEXTO = (multiprocessing.get_context("forkserver")
+             if "forkserver" in multiprocessing.get_all_start_methods() else None)
+if _CONTEXTO is not None:
+    _CONTEXTO.set_forkserver_preload([__name__])
+
+
+@dataclass
+class ParcialLoja:
+    """Agregados mescláveis de uma planilha."""
+    nome: str
+    chave: str
+    hoje: pd.Timestamp
+    estado: EstadoAgregado
+    cubo: cubo.CuboVendas
+    sketches: sketches.SketchesVendas
+    clientes_mes: pd.DataFrame  # cliente_id, mes (código), centavos
+    clientes_produtos: pd.DataFrame  # pares distintos cliente_id, produto
+
+    @classmethod
+    def de_transacoes(cls, nome, chave, df):
+        cubo_vendas = cubo.CuboVendas.de_transacoes(df)
+        validas = df['cliente_id'].notna().to_numpy()
+        clientes_mes = pd.DataFrame({
+            'cliente_id': df['cliente_id'].to_numpy()[validas],
+            'mes': _codigo_mes(df['data'].to_numpy()[validas]),
+            'centavos': centavos(df['valor'].to_numpy()[validas]),
+        }).groupby(['cliente_id', 'mes'], as_index=False)['centavos'].sum()
+        clientes_produtos = df.loc[validas & df['produto'].notna().to_numpy(),
+                                   ['cliente_id', 'produto']].drop_duplicates(ignore_index=True)
+        return cls(nome, chave, df['data'].max(), EstadoAgregado.de_transacoes(df), cubo_vendas,
+                   sketches.SketchesVendas.de_transacoes(df, cubo_vendas), clientes_mes, clientes_produtos)
+
+
+def reduzir_planilha(nome, conteudo, streaming=False):
+    """Etapa map (roda no processo de trabalho): planilha -> ParcialLoja.
+
+    Usa o cache em disco da ingestão, mas não o armazém do processo: as
+    transações morrem com o processo de trabalho.
+    """
+    chave = ingestao.chave_conteudo(conteudo)
+    df, _ = ingestao.ler_planilha(conteudo, chave + ('.lotes' if streaming else ''), streaming)
+    return ParcialLoja.de_transacoes(nome, chave, df)
+
+
+class Consolidado:
+    """Visão única de várias lojas, montada só a partir dos parciais."""
+
+    def __init__(self, parciais):
+        self.parciais = list(parciais)
+        self.chave = "+".join(sorted(p.chave for p in self.parciais))
+        self.hoje = max(p.hoje for p in self.parciais)
+        self.cubo = cubo.CuboVendas.mesclar([p.cubo for p in self.parciais])
+        self.sketches = sketches.SketchesVendas.mesclar([p.sketches for p in self.parciais], self.cubo)
+        self.estado = EstadoAgregado()
+        for parcial in self.parciais:
+            self.estado.mesclar(parcial.estado)
+        self._coortes = None
+        self._afinidade = None
+
+    @property
+    def lojas(self):
+        return [p.nome for p in self.parciais]
+
+    def coortes(self):
+        """Coortes de todas as lojas: a aquisição é a primeira compra em qualquer uma delas."""
+        if self._coortes is None:
+            pares = pd.concat([p.clientes_mes for p in self.parciais], ignore_index=True)
+            pares = pares.groupby(['cliente_id', 'mes'], as_index=False)['centavos'].sum()
+            self._coortes = MatrizCoortes.de_clientes_mes(pares['cliente_id'], pares['mes'], pares['centavos'] / 100)
+        return self._coortes
+
+    def afinidade(self):
+        """Afinidade de produtos do histórico de todas as lojas (o mesmo cliente pode comprar em várias)."""
+        if self._afinidade is None:
+            pares = pd.concat([p.clientes_produtos for p in self.parciais], ignore_index=True)
+            self._afinidade = AfinidadeProdutos.de_pares(pares['cliente_id'], pares['produto'])
+        return self._afinidade
+
+    def entradas(self):
+        """Métricas prontas para `Estatisticas`, no lugar das que leriam transações.
+
+        Completam df_bruto=None, estado, cubo_vendas, sketches_vendas e aproximado=True.
+        Os parciais não têm cliente × dia × produto, então tudo que é por cliente
+        (inclusive o total de clientes, denominador da recorrência) é do
+        histórico inteiro, qualquer que seja o filtro.
+        """
+        fatos = self.estado.tabela_clientes()
+        return dict(fatos=fatos, total_clientes=len(fatos), coortes=self.coortes(), afinidade=self.afinidade())
+
+    def por_loja(self, inicio=None, fim=None, produtos=None):
+        """Faturamento, vendas, ticket, clientes e datas de cada loja, todos no recorte.
+
+        Sem filtro os clientes são exatos (estado da loja); com filtro, saem dos
+        sketches do recorte (HyperLogLog) e a coluna vira 'Clientes ≈'.
+        """
+        filtrado = not (inicio is None and fim is None and produtos is None)
+        linhas = []
+        for parcial in self.parciais:
+            recorte = parcial.cubo.recortar(inicio, fim, produtos)
+            vendas = recorte.linhas
+            if filtrado:
+                clientes = parcial.sketches.recortar(inicio, fim, produtos).clientes_distintos() if vendas else 0
+            else:
+                clientes = len(parcial.estado.clientes)
+            dias_com_vendas = recorte.dias[recorte.vendas.sum(axis=1) > 0]
+            linhas.append({
+                'Loja': parcial.nome,
+                'Faturamento': recorte.faturamento_total,
+                'Vendas': vendas,
+                'Ticket Médio': recorte.faturamento_total / vendas if vendas else np.nan,
+                'Clientes': clientes,
+                'Primeira Venda': pd.Timestamp(dias_com_vendas[0]).date() if len(dias_com_vendas) else None,
+                'Última Venda': pd.Timestamp(dias_com_vendas[-1]).date() if len(dias_com_vendas) else None,
+            })
+        tabela = pd.DataFrame(linhas)
+        total = tabela['Faturamento'].sum()
+        tabela['% do Total'] = tabela['Faturamento'] / total * 100 if total else 0.0
+        return tabela.rename(columns={'Clientes': 'Clientes ≈'}) if filtrado else tabela
+
+    def descricao(self):
+        return f"🏬 {len(self.parciais)} planilhas consolidadas · {self.estado.linhas:,} linhas"
+
+
+def _guardar_parcial(parcial):
+    with _trava:
+        _parciais[parcial.chave] = parcial
+        _parciais.move_to_end(parcial.chave)
+        while len(_parciais) > MAX_PARCIAIS:
+            _parciais.popitem(last=False)
+
+
+@contextmanager
+def _sem_script_do_app():
+    """Esconde o `__main__` enquanto os processos de trabalho iniciam.
+
+    No Streamlit o `__main__` é o script do app, e o multiprocessing
+    reexecutaria o script em cada processo novo (como `__mp_main__`).
+    """
+    principal = sys.modules['__main__']
+    sys.modules['__main__'] = types.ModuleType('__main__')
+    try:
+        yield
+    finally:
+        sys.modules['__main__'] = principal
+
+
+def consolidar(arquivos, processos=None, streaming=False, progresso=None):
+    """Reduz as planilhas que ainda não têm parcial (em paralelo) e mescla todas.
+
+    `arquivos` é uma lista de (nome, conteúdo); `processos` limita o pool
+    (padrão: número de núcleos; com um só, ou sem forkserver, reduz em série).
+    `progresso(fracao, prontas)` é chamado a cada planilha reduzida.
+    """
+    chaves = [ingestao.chave_conteudo(conteudo) for _, conteudo in arquivos]
+    with _trava:
+        faltando = [(nome, conteudo) for (nome, conteudo), chave in zip(arquivos, chaves) if chave not in _parciais]
+    processos = min(processos or os.cpu_count() or 1, len(faltando))
+    if processos > 1 and _CONTEXTO is not None:
+        # Os processos iniciam no primeiro submit; o filho só lê a planilha e agrega
+        with ProcessPoolExecutor(max_workers=processos, mp_context=_CONTEXTO) as pool:
+            with _sem_script_do_app():
+                tarefas = [pool.submit(reduzir_planilha, nome, conteudo, streaming) for nome, conteudo in faltando]
+            for prontas, tarefa in enumerate(as_completed(tarefas), start=1):
+                _guardar_parcial(tarefa.result())
+                if progresso is not None:
+                    progresso(prontas / len(tarefas), prontas)
+    else:
+        for prontas, (nome, conteudo) in enumerate(faltando, start=1):
+            _guardar_parcial(reduzir_planilha(nome, conteudo, streaming))
+            if progresso is not None:
+                progresso(prontas / len(faltando), prontas)
+
+    with _trava:
+        parciais = []
+        for (nome, _), chave in zip(arquivos, chaves):
+            _parciais.move_to_end(chave)
+            # O mesmo conteúdo enviado com outro nome vale pelo nome atual
+            parciais.append(_parciais[chave] if _parciais[chave].nome == nome
+                            else ParcialLoja(**{**_parciais[chave].__dict__, 'nome': nome}))
+        chave_conjunto = tuple(chaves), tuple(nome for nome, _ in arquivos)
+        consolidado = _consolidados.get(chave_conjunto)
+        if consolidado is not None:
+            _consolidados.move_to_end(chave_conjunto)
+            return consolidado
+    consolidado = Consolidado(parciais)
+    with _trava:
+        _consolidados[chave_conjunto] = consolidado
+        while len(_consolidados) > ingestao.MAX_EM_MEMORIA:
+            _consolidados.popitem(last=False)
+    return consolidado
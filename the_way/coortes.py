@@ -0,0 +1,127 @@
+"""Coortes de aquisição: mês da primeira compra × meses desde a aquisição.
+
+Meses viram códigos inteiros (meses desde 1970) e cada transação cai numa
+célula `coorte * n_meses + idade` de uma grade densa. Receita por célula é um
+`np.bincount` com pesos; clientes ativos por célula saem de um `pd.unique`
+dos pares (cliente, idade), seguido de outro `bincount`. Nenhum groupby
+aninhado, então a matriz inteira custa algumas passadas lineares sobre as
+transações.
+
+As células depois do último mês dos dados ficam NaN (o triângulo).
+"""
+import numpy as np
+import pandas as pd
+
+from the_way.ingestao import posicoes_em
+
+# Coortes mais recentes mostradas no mapa de calor
+COORTES_NO_GRAFICO = 24
+
+
+def _codigo_mes(datas):
+    return np.asarray(datas, dtype='datetime64[ns]').astype('datetime64[M]').astype(np.int64)
+
+
+class MatrizCoortes:
+    """Matriz densa de coortes; as tabelas têm índice `coorte` (Period mensal) e colunas 0..n-1 (meses)."""
+
+    def __init__(self, inicio, clientes, receita):
+        self.inicio = inicio            # código do primeiro mês
+        self._clientes = clientes       # int64 (n_meses, n_meses), coorte × idade
+        self._receita = receita         # float64 (n_meses, n_meses)
+
+    @classmethod
+    def de_transacoes(cls, df, fatos):
+        """Monta a matriz a partir das transações e da tabela fato de clientes (primeira_compra)."""
+        if len(df) == 0:
+            vazia = np.zeros((0, 0))
+            return cls(0, vazia.astype(np.int64), vazia)
+        mes = _codigo_mes(df['data'])
+        cliente = posicoes_em(fatos.index, df['cliente_id'])
+        coorte_cliente = _codigo_mes(fatos['primeira_compra'])
+        inicio = int(coorte_cliente.min())
+        n_meses = int(mes.max()) - inicio + 1
+
+        validas = cliente >= 0
+        cliente, mes = cliente[validas], mes[validas]
+        coorte = coorte_cliente[cliente] - inicio
+        idade = mes - inicio - coorte
+        celula = coorte * n_meses + idade
+        receita = np.bincount(celula, weights=df['valor'].to_numpy(dtype=np.float64)[validas],
+                              minlength=n_meses * n_meses)
+
+        # Um par por cliente ativo em cada idade (a coorte é do cliente)
+        pares = pd.unique(cliente.astype(np.int64) * n_meses + idade)
+        celula_par = (coorte_cliente[pares // n_meses] - inicio) * n_meses + pares % n_meses
+        clientes = np.bincount(celula_par, minlength=n_meses * n_meses)
+        return cls(inicio, clientes.reshape(n_meses, n_meses), receita.reshape(n_meses, n_meses))
+
+    @classmethod
+    def de_clientes_mes(cls, cliente_id, mes, receita):
+        """Monta a matriz a partir de pares (cliente, mês) já agregados, sem repetição.
+
+        `mes` é o código do mês (meses desde 1970) e `receita`, a soma do cliente
+        no mês. É o caminho usado quando não há transações, só parciais mesclados.
+        """
+        if len(mes) == 0:
+            vazia = np.zeros((0, 0))
+            return cls(0, vazia.astype(np.int64), vazia)
+        cliente, _ = pd.factorize(np.asarray(cliente_id))
+        mes = np.asarray(mes, dtype=np.int64)
+        coorte_cliente = np.full(cliente.max() + 1, np.iinfo(np.int64).max)
+        np.minimum.at(coorte_cliente, cliente, mes)
+        inicio = int(coorte_cliente.min())
+        n_meses = int(mes.max()) - inicio + 1
+
+        coorte = coorte_cliente[cliente] - inicio
+        celula = coorte * n_meses + mes - inicio - coorte
+        receita = np.bincount(celula, weights=np.asarray(receita, dtype=np.float64), minlength=n_meses * n_meses)
+        clientes = np.bincount(celula, minlength=n_meses * n_meses)
+        return cls(inicio, clientes.reshape(n_meses, n_meses), receita.reshape(n_meses, n_meses))
+
+    @property
+    def n_meses(self):
+        return len(self._clientes)
+
+    @property
+    def nbytes(self):
+        """Memória das duas matrizes (usada pelo orçamento do cache de resultados)."""
+        return self._clientes.nbytes + self._receita.nbytes
+
+    def _meses(self):
+        return pd.period_range(pd.Period(ordinal=self.inicio, freq='M'), periods=self.n_meses, freq='M')
+
+    def _tabela(self, matriz):
+        """Só coortes com clientes; células depois do último mês viram NaN."""
+        coortes = np.arange(self.n_meses)
+        futuro = coortes[:, None] + coortes[None, :] >= self.n_meses
+        tabela = pd.DataFrame(np.where(futuro, np.nan, matriz),
+                              index=self._meses().rename('coorte'),
+                              columns=pd.RangeIndex(self.n_meses, name='meses'))
+        return tabela[self._clientes[:, :1].any(axis=1)]
+
+    @property
+    def clientes(self):
+        """Clientes da coorte que compraram em cada mês desde a aquisição."""
+        return self._tabela(self._clientes)
+
+    @property
+    def receita(self):
+        return self._tabela(self._receita)
+
+    @property
+    def retencao(self):
+        """% da coorte ativa em cada mês (mês 0 = 100%)."""
+        clientes = self.clientes
+        if clientes.empty:
+            return clientes
+        return clientes.div(clientes[0], axis=0) * 100
+
+    def ativos_por_mes(self):
+        """Clientes distintos por mês do calendário (soma das diagonais)."""
+        coortes = np.arange(self.n_meses)
+        calendario = (coortes[:, None] + coortes[None, :]).ravel()
+        ativos = np.bincount(calendario, weights=self._clientes.ravel(), minlength=self.n_meses)[:self.n_meses]
+        serie = pd.Series(ativos.astype(np.int64), name='cliente_id',
+                          index=self._meses().rename('cohort_mes'))
+        return serie[serie > 0]
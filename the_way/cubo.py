@@ -0,0 +1,168 @@
+"""Cubo pré-agregado dia × produto.
+
+Cada célula guarda faturamento (em centavos), quantidade de transações e
+valores mínimo e máximo. Os filtros de período e de produto da barra lateral
+viram um recorte do cubo (fatia contígua de dias e seleção de colunas), e os
+KPIs dependentes de filtro, a curva ABC e as séries mensal e por dia da semana
+são somas de células: o custo depende de produtos × dias, não do número de
+transações.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from the_way import ingestao
+from the_way.incremental import DIAS_SEMANA, centavos
+
+_memoria = OrderedDict()
+_trava = threading.Lock()
+
+
+class CuboVendas:
+    def __init__(self, dias, produtos, centavos, vendas, minimo, maximo):
+        self.dias = dias            # datetime64[D], ordenado
+        self.produtos = produtos    # pd.Index ordenado
+        self.centavos = centavos    # int64 [dia, produto]
+        self.vendas = vendas        # int64 [dia, produto]
+        self.minimo = minimo        # float64 [dia, produto], NaN em células vazias
+        self.maximo = maximo
+
+    @classmethod
+    def de_transacoes(cls, df):
+        dia_idx, dias = pd.factorize(df['data'].to_numpy().astype('datetime64[D]'), sort=True)
+        prod_idx, produtos = pd.factorize(df['produto'], sort=True)
+        # Sem data ou sem produto (código -1) a linha não cai em nenhuma célula
+        validas = (dia_idx >= 0) & (prod_idx >= 0)
+        dia_idx, prod_idx = dia_idx[validas], prod_idx[validas]
+        valores = df['valor'].to_numpy(dtype=np.float64)[validas]
+
+        formato = (len(dias), len(produtos))
+        celula = dia_idx * formato[1] + prod_idx
+        tamanho = formato[0] * formato[1]
+        soma = np.bincount(celula, weights=centavos(valores), minlength=tamanho)
+        vendas = np.bincount(celula, minlength=tamanho)
+
+        extremos = pd.Series(valores).groupby(celula).agg(['min', 'max'])
+        minimo = np.full(tamanho, np.nan)
+        maximo = np.full(tamanho, np.nan)
+        minimo[extremos.index] = extremos['min'].to_numpy()
+        maximo[extremos.index] = extremos['max'].to_numpy()
+
+        return cls(np.asarray(dias, dtype='datetime64[D]'), pd.Index(np.asarray(produtos), name='produto'),
+                   np.rint(soma).astype(np.int64).reshape(formato), vendas.astype(np.int64).reshape(formato),
+                   minimo.reshape(formato), maximo.reshape(formato))
+
+    @classmethod
+    def mesclar(cls, cubos):
+        """Cubo único de vários cubos (linhas disjuntas, ex.: uma planilha por loja)."""
+        dias = np.unique(np.concatenate([c.dias for c in cubos])).astype('datetime64[D]')
+        produtos = pd.Index(sorted(set().union(*(c.produtos for c in cubos))), name='produto')
+        formato = (len(dias), len(produtos))
+        soma = np.zeros(formato, dtype=np.int64)
+        vendas = np.zeros(formato, dtype=np.int64)
+        minimo = np.full(formato, np.nan)
+        maximo = np.full(formato, np.nan)
+        for c in cubos:
+            celulas = c.posicoes_em(dias, produtos)
+            soma[celulas] += c.centavos
+            vendas[celulas] += c.vendas
+            minimo[celulas] = np.fmin(minimo[celulas], c.minimo)
+            maximo[celulas] = np.fmax(maximo[celulas], c.maximo)
+        return cls(dias, produtos, soma, vendas, minimo, maximo)
+
+    def posicoes_em(self, dias, produtos):
+        """Índice (np.ix_) das células deste cubo numa grade maior que contém os seus dias e produtos."""
+        return np.ix_(np.searchsorted(dias, self.dias), produtos.get_indexer(self.produtos))
+
+    def recortar(self, inicio=None, fim=None, produtos=None):
+        """Recorte para o período [inicio, fim] (datas, inclusivo) e a lista de produtos."""
+        d0 = 0 if inicio is None else np.searchsorted(self.dias, np.datetime64(inicio, 'D'), side='left')
+        d1 = len(self.dias) if fim is None else np.searchsorted(self.dias, np.datetime64(fim, 'D'), side='right')
+        if produtos is None:
+            colunas = np.arange(len(self.produtos))
+        else:
+            colunas = self.produtos.get_indexer(pd.Index(produtos))
+            colunas = np.sort(colunas[colunas >= 0])
+        return RecorteCubo(
+            self.dias[d0:d1], self.produtos[colunas],
+            self.centavos[d0:d1, colunas], self.vendas[d0:d1, colunas],
+            self.minimo[d0:d1, colunas], self.maximo[d0:d1, colunas],
+        )
+
+
+class RecorteCubo:
+    """Agregados de um filtro; mesma interface de leitura do EstadoAgregado."""
+
+    def __init__(self, dias, produtos, centavos, vendas, minimo, maximo):
+        self.dias = dias
+        self.produtos = produtos
+        self.centavos = centavos
+        self.vendas = vendas
+        self.minimo = minimo
+        self.maximo = maximo
+
+    @property
+    def linhas(self):
+        return int(self.vendas.sum())
+
+    @property
+    def faturamento_total(self):
+        return int(self.centavos.sum()) / 100
+
+    @property
+    def valor_minimo(self):
+        return np.nanmin(self.minimo) if self.linhas > 0 else np.nan
+
+    @property
+    def valor_maximo(self):
+        return np.nanmax(self.maximo) if self.linhas > 0 else np.nan
+
+    def totais_produto(self):
+        """Faturamento (sum) e vendas (count) dos produtos com vendas no recorte."""
+        vendas = self.vendas.sum(axis=0)
+        totais = pd.DataFrame({'sum': self.centavos.sum(axis=0) / 100, 'count': vendas}, index=self.produtos)
+        return totais[vendas > 0]
+
+    def _por_dia(self):
+        vendas = self.vendas.sum(axis=1)
+        return self.centavos.sum(axis=1), vendas, vendas > 0
+
+    def vendas_diarias(self):
+        """Faturamento e quantidade por dia com vendas."""
+        soma, vendas, com_vendas = self._por_dia()
+        return pd.DataFrame({
+            'Data': pd.to_datetime(self.dias[com_vendas]).date,
+            'Faturamento': soma[com_vendas] / 100,
+            'Quantidade': vendas[com_vendas],
+        })
+
+    def vendas_mensais(self):
+        soma, _, com_vendas = self._por_dia()
+        meses = pd.PeriodIndex(pd.to_datetime(self.dias[com_vendas]), freq='M', name='mes_ano')
+        mensal = pd.Series(soma[com_vendas], index=meses).groupby(level=0).sum()
+        return (mensal / 100).rename('valor')
+
+    def vendas_por_dia_semana(self):
+        soma, _, com_vendas = self._por_dia()
+        # 1970-01-01 foi uma quinta-feira (dayofweek 3)
+        dia_semana = (self.dias[com_vendas].astype(np.int64) + 3) % 7
+        presentes = np.bincount(dia_semana, minlength=7) > 0
+        totais = np.bincount(dia_semana, weights=soma[com_vendas], minlength=7)
+        nomes = pd.Index(np.array(DIAS_SEMANA)[presentes], name='dia_semana')
+        return pd.Series(totais[presentes] / 100, index=nomes, name='valor').sort_index()
+
+
+def cubo_para(chave, df):
+    """Cubo do dataset, montado uma vez por chave de ingestão."""
+    with _trava:
+        if chave in _memoria:
+            _memoria.move_to_end(chave)
+            return _memoria[chave]
+    cubo = CuboVendas.de_transacoes(df)
+    with _trava:
+        _memoria[chave] = cubo
+        while len(_memoria) > ingestao.MAX_EM_MEMORIA:
+            _memoria.popitem(last=False)
+    return cubo
@@ -0,0 +1,741 @@
+"""As 33 estatísticas do dashboard como um grafo de dependências preguiçoso.
+
+Cada métrica é uma função registrada com `@metrica`; os nomes dos parâmetros
+são as dependências (outras métricas ou entradas). `Estatisticas` calcula uma
+métrica só quando ela é lida, junto com as dependências, e memoriza o
+resultado para a versão das entradas. Assim uma seção da tela avalia apenas o
+que usa.
+
+Com `impressao` (a chave do dataset) os resultados também vão para o cache LRU
+do processo, indexados só pelos parâmetros de que cada métrica depende: o LTV
+é o mesmo para qualquer filtro, a projeção muda com o horizonte etc. Métricas
+que passam por uma variante (sketch ou SQL) também levam o modo na chave.
+
+`Estatisticas.calcular` avalia várias métricas de uma vez num pool de threads:
+cada uma entra no pool assim que as dependências ficam prontas, então ramos
+independentes do grafo (clientes, produtos, séries no tempo, distribuição)
+rodam ao mesmo tempo. O ganho vem das partes que liberam o GIL (numpy, Arrow,
+consultas SQLite).
+
+Entradas: df_bruto, hoje, dias_projecao e, opcionalmente, estado (incremental),
+cubo_vendas, sketches_vendas, aproximado (contagem de clientes e percentis por
+sketches), banco (backend SQLite no lugar de df_bruto, ver the_way.banco), os
+limites de recência limite_risco, limite_dormente e limite_churn e os filtros
+produtos_selecionados, data_inicio e data_fim.
+"""
+import inspect
+import os
+from collections.abc import Mapping
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from the_way import cache_resultados, clientes, cubo, ingestao, sketches
+from the_way.afinidade import AfinidadeProdutos
+from the_way.coortes import MatrizCoortes
+from the_way.projecao import curva_projecao, projecao_para
+from the_way.recencia import LIMITES_PADRAO, IndiceRecencia
+from the_way.rfm import resumo_segmentos, tabela_rfm
+
+METRICAS = {}
+
+# Threads de `Estatisticas.calcular` (padrão: núcleos disponíveis, até 4); em servidor
+# compartilhado, reduza com THE_WAY_TRABALHADORES (1 = em série)
+_NUCLEOS = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else (os.cpu_count() or 1)
+TRABALHADORES_PADRAO = int(os.environ.get("THE_WAY_TRABALHADORES", str(min(4, _NUCLEOS))))
+
+# Entradas que variam para um mesmo dataset e por isso entram na chave do cache
+PARAMETROS = ('hoje', 'dias_projecao', 'produtos_selecionados', 'data_inicio', 'data_fim',
+              'limite_risco', 'limite_dormente', 'limite_churn')
+
+ENTRADAS_PADRAO = {
+    'estado': None,
+    'banco': None,
+    'aproximado': False,
+    'limite_risco': LIMITES_PADRAO['risco'],
+    'limite_dormente': LIMITES_PADRAO['dormente'],
+    'limite_churn': LIMITES_PADRAO['churn'],
+    'produtos_selecionados': None,
+    'data_inicio': None,
+    'data_fim': None,
+}
+
+# As 33 estatísticas, na ordem em que aparecem no relatório
+ESTATISTICAS = [
+    'total_vendas', 'faturamento_total', 'ticket_medio', 'ticket_mediano', 'valor_minimo',
+    'valor_maximo', 'total_clientes', 'clientes_recorrentes', 'taxa_recorrencia',
+    'produto_mais_vendido', 'valor_produto_mais_vendido', 'produto_menos_vendido',
+    'valor_produto_menos_vendido', 'aov', 'ltv_medio', 'ltv_max', 'freq_compra_dias', 'taxa_churn',
+    'taxa_retencao', 'clientes_dormentes', 'taxa_dormentes', 'clientes_risco', 'cliente_top',
+    'valor_cliente_top', 'top_5_clientes', 'crescimento_mom', 'vendas_mensais',
+    'vendas_por_dia_semana', 'faturamento_projecao', 'rfm', 'segmentos_rfm', 'segmentacao_clientes',
+    'elasticidade_preco', 'produtos_frequentes', 'desvio_padrao', 'coeficiente_variacao',
+    'percentil_25', 'percentil_50', 'percentil_75', 'percentil_90', 'curva_abc', 'cohort_periodo',
+    'recomendacoes',
+]
+
+
+class Metrica:
+    def __init__(self, funcao, compartilhar=True, aproximacao=None, banco=None):
+        self.nome = funcao.__name__
+        self.funcao = funcao
+        self.dependencias = tuple(inspect.signature(funcao).parameters)
+        self.compartilhar = compartilhar
+        self.aproximacao = aproximacao
+        self.banco = banco
+
+
+def metrica(funcao=None, *, compartilhar=True, aproximacao=None, banco=None):
+    """Registra `funcao` como a métrica de mesmo nome.
+
+    `compartilhar=False` mantém o resultado fora do cache do processo (para
+    valores baratos de refazer ou que apenas apontam para os dados brutos).
+    `aproximacao` é o nome da métrica usada no lugar desta quando a entrada
+    `aproximado` está ligada (modo sketch); `banco`, o da versão em SQL usada
+    quando a entrada `banco` está presente.
+    """
+    def registrar(funcao):
+        METRICAS[funcao.__name__] = Metrica(funcao, compartilhar, aproximacao, banco)
+        return funcao
+    return registrar(funcao) if funcao is not None else registrar
+
+
+def _preparar_para_threads(valor):
+    """Monta as tabelas de busca dos índices de `valor` antes de compartilhá-lo.
+
+    O pandas monta o hash de um índice na primeira busca por rótulo, e isso não
+    é seguro entre threads (outra thread pode ver a tabela ainda vazia).
+    """
+    if isinstance(valor, (pd.Series, pd.DataFrame)):
+        for indice in valor.axes:
+            indice.is_unique
+            indice.is_monotonic_increasing
+
+
+def _alcancaveis(definicao):
+    """Dependências da métrica e as variantes (sketch e SQL) que podem substituí-la."""
+    return definicao.dependencias + tuple(v for v in (definicao.aproximacao, definicao.banco) if v is not None)
+
+
+@lru_cache(maxsize=None)
+def parametros_de(nome):
+    """Parâmetros (entre PARAMETROS) de que a métrica depende, direta ou indiretamente."""
+    if nome not in METRICAS:
+        return frozenset([nome]) if nome in PARAMETROS else frozenset()
+    return frozenset().union(*(parametros_de(dep) for dep in _alcancaveis(METRICAS[nome])))
+
+
+@lru_cache(maxsize=None)
+def modos_de(nome):
+    """Entradas de modo ('aproximado', 'banco') que trocam a métrica ou alguma dependência por uma variante."""
+    if nome not in METRICAS:
+        return frozenset()
+    definicao = METRICAS[nome]
+    modos = {modo for modo, variante in (('aproximado', definicao.aproximacao), ('banco', definicao.banco))
+             if variante is not None}
+    return frozenset(modos).union(*(modos_de(dep) for dep in _alcancaveis(definicao)))
+
+
+def normalizar_filtros(cubo_vendas, produtos_selecionados, data_inicio, data_fim):
+    """Filtros equivalentes a "tudo" viram None; a lista de produtos vira tupla ordenada."""
+    if produtos_selecionados is not None:
+        selecionados = set(produtos_selecionados)
+        if selecionados.issuperset(cubo_vendas.produtos):
+            produtos_selecionados = None
+        else:
+            produtos_selecionados = tuple(sorted(selecionados))
+    if len(cubo_vendas.dias):
+        if data_inicio is not None and np.datetime64(data_inicio, 'D') <= cubo_vendas.dias[0]:
+            data_inicio = None
+        if data_fim is not None and np.datetime64(data_fim, 'D') >= cubo_vendas.dias[-1]:
+            data_fim = None
+    return produtos_selecionados, data_inicio, data_fim
+
+
+class Estatisticas(Mapping):
+    """Avaliação sob demanda: `stats['x']` calcula x (e dependências) uma única vez."""
+
+    def __init__(self, versao=None, impressao=None, cache=None, **entradas):
+        self.versao = versao
+        self.impressao = impressao
+        self.cache = cache if cache is not None else cache_resultados.CACHE
+        self.observador = None
+        self._valores = {**ENTRADAS_PADRAO, **entradas}
+
+    def _chave_cache(self, nome):
+        parametros = tuple(sorted((p, self._valores[p]) for p in parametros_de(nome)))
+        # O resultado exato, o de sketches e o do banco não se misturam no cache
+        modos = tuple(sorted((m, self._valores[m] is not None if m == 'banco' else bool(self._valores[m]))
+                             for m in modos_de(nome)))
+        return (self.impressao, nome, parametros + modos)
+
+    def _variante(self, nome):
+        """Métrica calculada no lugar de `nome` (sketch ou SQL), ou None."""
+        definicao = METRICAS[nome]
+        if definicao.aproximacao is not None and self['aproximado']:
+            # Modo sketch: as dependências da versão exata nem chegam a ser avaliadas
+            return definicao.aproximacao
+        if definicao.banco is not None and self['banco'] is not None:
+            # Backend SQLite: a versão em SQL lê agregados do banco, não transações
+            return definicao.banco
+        return None
+
+    def _do_cache(self, nome):
+        """Traz `nome` do cache do processo, se estiver lá."""
+        if self.impressao is None or not METRICAS[nome].compartilhar:
+            return False
+        encontrado, valor = self.cache.obter(self._chave_cache(nome))
+        if encontrado:
+            self._valores[nome] = valor
+        return encontrado
+
+    def __getitem__(self, nome):
+        if nome not in self._valores:
+            if nome not in METRICAS:
+                raise KeyError(nome)
+            definicao = METRICAS[nome]
+            variante = self._variante(nome)
+            if variante is not None:
+                self._valores[nome] = self[variante]
+                return self._valores[nome]
+            if self._do_cache(nome):
+                return self._valores[nome]
+            argumentos = {dep: self[dep] for dep in definicao.dependencias}
+            if self.observador is None:
+                valor = definicao.funcao(**argumentos)
+            else:
+                # Instrumentação: o observador cronometra só o cálculo desta métrica
+                valor = self.observador(nome, lambda: definicao.funcao(**argumentos))
+            if self.impressao is not None and definicao.compartilhar:
+                self.cache.guardar(self._chave_cache(nome), valor)
+            self._valores[nome] = valor
+        return self._valores[nome]
+
+    def _pendencias(self, nomes):
+        """Grafo do que falta calcular para `nomes`: métrica -> dependências ainda sem valor."""
+        pendencias = {}
+
+        def visitar(nome):
+            if nome in self._valores or nome in pendencias:
+                return
+            if nome not in METRICAS:
+                raise KeyError(nome)
+            variante = self._variante(nome)
+            if variante is None and self._do_cache(nome):
+                return
+            dependencias = (variante,) if variante is not None else METRICAS[nome].dependencias
+            for dependencia in dependencias:
+                visitar(dependencia)
+            pendencias[nome] = {d for d in dependencias if d not in self._valores}
+
+        for nome in nomes:
+            visitar(nome)
+        return pendencias
+
+    def _calcular_compartilhada(self, nome):
+        _preparar_para_threads(self[nome])
+
+    def calcular(self, nomes=None, trabalhadores=None):
+        """Avalia `nomes` (padrão: as ESTATISTICAS) em paralelo e devolve {nome: valor}.
+
+        Cada métrica vai para o pool quando todas as dependências já têm valor,
+        então nenhuma thread espera por outra. `trabalhadores=1` calcula em série.
+        """
+        nomes = list(ESTATISTICAS if nomes is None else nomes)
+        trabalhadores = TRABALHADORES_PADRAO if trabalhadores is None else trabalhadores
+        if trabalhadores > 1:
+            pendencias = self._pendencias(nomes)
+            dependentes = {nome: [] for nome in pendencias}
+            for nome, dependencias in pendencias.items():
+                for dependencia in dependencias:
+                    dependentes[dependencia].append(nome)
+            for valor in list(self._valores.values()):
+                _preparar_para_threads(valor)
+            with ThreadPoolExecutor(max_workers=trabalhadores, thread_name_prefix="estatisticas") as pool:
+                tarefas = {pool.submit(self._calcular_compartilhada, nome): nome
+                           for nome, dependencias in pendencias.items() if not dependencias}
+                while tarefas:
+                    prontas, _ = wait(tarefas, return_when=FIRST_COMPLETED)
+                    for tarefa in prontas:
+                        nome = tarefas.pop(tarefa)
+                        tarefa.result()
+                        for dependente in dependentes[nome]:
+                            pendencias[dependente].discard(nome)
+                            if not pendencias[dependente]:
+                                tarefas[pool.submit(self._calcular_compartilhada, dependente)] = dependente
+        return {nome: self[nome] for nome in nomes}
+
+    def __iter__(self):
+        return iter(ESTATISTICAS)
+
+    def __len__(self):
+        return len(ESTATISTICAS)
+
+    def calculadas(self):
+        """Nomes das métricas já avaliadas nesta versão."""
+        return [nome for nome in self._valores if nome in METRICAS]
+
+
+def da_sessao(sessao, chave, versao, impressao=None, **entradas):
+    """Reaproveita o avaliador guardado na sessão enquanto a versão das entradas não mudar."""
+    atual = sessao.get(chave)
+    if atual is None or atual.versao != versao:
+        atual = Estatisticas(versao=versao, impressao=impressao, **entradas)
+        sessao[chave] = atual
+    return atual
+
+
+def calcular_todas_estatisticas(df_bruto, df, hoje, dias_projecao, estado=None, agregados=None, trabalhadores=None):
+    """Calcula todas as 33 estatísticas de uma vez (relatórios e exportação).
+
+    Com `estado` (EstadoAgregado incremental do df_bruto) as métricas por cliente
+    do histórico leem dele. `agregados` é o recorte do cubo dia × produto
+    correspondente ao filtro de `df`; sem ele o recorte é montado a partir de `df`.
+    `trabalhadores` é o tamanho do pool de threads (ver `Estatisticas.calcular`).
+    """
+    if agregados is None:
+        agregados = cubo.CuboVendas.de_transacoes(df).recortar()
+    stats = Estatisticas(df_bruto=df_bruto, df=df, hoje=hoje, dias_projecao=dias_projecao,
+                         estado=estado, agregados=agregados)
+    return stats.calcular(trabalhadores=trabalhadores)
+
+
+# --- BASES: FILTRO, CUBO E TABELAS FATO ---
+
+@metrica(compartilhar=False, banco='df_sql')
+def df(df_bruto, produtos_selecionados, data_inicio, data_fim):
+    """Transações do filtro atual (None = sem filtro naquela dimensão)."""
+    periodo = ingestao.fatia_periodo(df_bruto, data_inicio, data_fim)
+    if produtos_selecionados is None:
+        return periodo
+    mascara = periodo['produto'].isin(produtos_selecionados).to_numpy()
+    return periodo if mascara.all() else periodo[mascara]
+
+
+@metrica(compartilhar=False, banco='cubo_vendas_sql')
+def cubo_vendas(df_bruto):
+    return cubo.CuboVendas.de_transacoes(df_bruto)
+
+
+@metrica(compartilhar=False)
+def agregados(cubo_vendas, produtos_selecionados, data_inicio, data_fim):
+    return cubo_vendas.recortar(data_inicio, data_fim, produtos_selecionados)
+
+
+@metrica(compartilhar=False)
+def sketches_vendas(df_bruto, cubo_vendas):
+    return sketches.SketchesVendas.de_transacoes(df_bruto, cubo_vendas)
+
+
+@metrica(compartilhar=False)
+def recorte_sketches(sketches_vendas, produtos_selecionados, data_inicio, data_fim):
+    return sketches_vendas.recortar(data_inicio, data_fim, produtos_selecionados)
+
+
+@metrica(banco='fatos_bruto_sql')
+def fatos_bruto(df_bruto, estado):
+    return estado.tabela_clientes() if estado is not None else clientes.tabela_clientes(df_bruto)
+
+
+@metrica(banco='fatos_sql')
+def fatos(df, df_bruto, fatos_bruto):
+    # Sem filtro ativo a tabela do histórico já serve
+    return fatos_bruto if len(df) == len(df_bruto) else clientes.tabela_clientes(df)
+
+
+@metrica
+def produtos(agregados):
+    """Totais por produto, somados das células do cubo."""
+    return agregados.totais_produto()
+
+
+@metrica
+def ultima_visita(fatos_bruto, hoje):
+    ultima = fatos_bruto[['ultima_compra']].rename(columns={'ultima_compra': 'data'})
+    ultima['dias_parado'] = clientes.dias_parado(fatos_bruto, hoje)
+    return ultima
+
+
+@metrica
+def indice_recencia(ultima_visita):
+    """Recências ordenadas: contagens por janela são buscas binárias (ver the_way.recencia)."""
+    return IndiceRecencia(ultima_visita['dias_parado'])
+
+
+@metrica
+def imr_global(fatos):
+    return clientes.intervalo_medio_global(fatos)
+
+
+@metrica(aproximacao='percentis_sketch', banco='percentis_sql')
+def percentis(df):
+    return df['valor'].quantile([0.25, 0.50, 0.75, 0.90])
+
+
+@metrica
+def percentis_sketch(recorte_sketches):
+    """Percentis a no máximo 1% do valor exato (ver the_way.sketches)."""
+    return recorte_sketches.quantis([0.25, 0.50, 0.75, 0.90])
+
+
+# --- BACKEND SQLITE: AS MESMAS BASES, AGREGADAS NO BANCO ---
+
+@metrica(compartilhar=False)
+def df_sql(banco, produtos_selecionados, data_inicio, data_fim):
+    """Transações do filtro lidas do banco (só quando alguém as pede, como na exportação)."""
+    return banco.transacoes(produtos_selecionados, data_inicio, data_fim)
+
+
+@metrica(compartilhar=False)
+def cubo_vendas_sql(banco):
+    return banco.cubo()
+
+
+@metrica
+def fatos_bruto_sql(banco):
+    return banco.tabela_clientes()
+
+
+@metrica
+def fatos_sql(banco, fatos_bruto, produtos_selecionados, data_inicio, data_fim):
+    if produtos_selecionados is None and data_inicio is None and data_fim is None:
+        return fatos_bruto
+    return banco.tabela_clientes(produtos_selecionados, data_inicio, data_fim)
+
+
+@metrica
+def percentis_sql(banco, produtos_selecionados, data_inicio, data_fim):
+    return banco.quantis([0.25, 0.50, 0.75, 0.90], produtos_selecionados, data_inicio, data_fim)
+
+
+@metrica
+def desvio_padrao_sql(banco, produtos_selecionados, data_inicio, data_fim):
+    return banco.desvio_padrao(produtos_selecionados, data_inicio, data_fim)
+
+
+@metrica
+def coortes_sql(banco):
+    return banco.coortes()
+
+
+@metrica
+def afinidade_sql(banco, produtos_selecionados, data_inicio, data_fim):
+    pares = banco.clientes_produtos(produtos_selecionados, data_inicio, data_fim)
+    return AfinidadeProdutos.de_pares(pares['cliente_id'], pares['produto'])
+
+
+# 1. TOTAL DE VENDAS (quantidade de transações)
+@metrica
+def total_vendas(agregados):
+    return agregados.linhas
+
+
+# 2. FATURAMENTO TOTAL
+@metrica
+def faturamento_total(agregados):
+    return agregados.faturamento_total
+
+
+# 3. TICKET MÉDIO
+@metrica
+def ticket_medio(agregados):
+    return agregados.faturamento_total / agregados.linhas if agregados.linhas > 0 else np.nan
+
+
+# 4. TICKET MEDIANO (mesma ordenação dos percentis)
+@metrica
+def ticket_mediano(percentis):
+    return percentis.loc[0.50]
+
+
+# 5. VALOR MÍNIMO
+@metrica
+def valor_minimo(agregados):
+    return agregados.valor_minimo
+
+
+# 6. VALOR MÁXIMO
+@metrica
+def valor_maximo(agregados):
+    return agregados.valor_maximo
+
+
+# 7. TOTAL DE CLIENTES ÚNICOS
+@metrica(aproximacao='total_clientes_sketch')
+def total_clientes(fatos):
+    return len(fatos)
+
+
+@metrica
+def total_clientes_sketch(recorte_sketches):
+    """Estimativa HyperLogLog (erro padrão ≈ 1,6%)."""
+    return recorte_sketches.clientes_distintos()
+
+
+# 8. CLIENTES RECORRENTES (2+ compras)
+@metrica
+def clientes_recorrentes(fatos):
+    return int((fatos['compras'] >= 2).sum())
+
+
+# 9. TAXA DE CLIENTES RECORRENTES
+@metrica
+def taxa_recorrencia(clientes_recorrentes, fatos):
+    """Sobre os clientes da tabela fato, a mesma do numerador (nunca a estimativa HyperLogLog)."""
+    return (clientes_recorrentes / len(fatos) * 100) if len(fatos) > 0 else 0
+
+
+# 10. PRODUTO MAIS VENDIDO
+@metrica
+def produto_mais_vendido(produtos):
+    return produtos['sum'].idxmax()
+
+
+@metrica
+def valor_produto_mais_vendido(produtos):
+    return produtos['sum'].max()
+
+
+# 11. PRODUTO MENOS VENDIDO
+@metrica
+def produto_menos_vendido(produtos):
+    return produtos['sum'].idxmin()
+
+
+@metrica
+def valor_produto_menos_vendido(produtos):
+    return produtos['sum'].min()
+
+
+# 12. AOV (Average Order Value)
+@metrica
+def aov(fatos):
+    return fatos['total'].mean()
+
+
+# 13. LIFETIME VALUE (LTV) - Total gasto por cliente
+@metrica
+def ltv_medio(fatos_bruto):
+    return fatos_bruto['total'].mean()
+
+
+@metrica
+def ltv_max(fatos_bruto):
+    return fatos_bruto['total'].max()
+
+
+# 14. FREQUÊNCIA MÉDIA DE COMPRA (dias entre compras)
+@metrica
+def freq_compra_dias(imr_global):
+    return imr_global if pd.notna(imr_global) else 0
+
+
+# 15. TAXA DE CHURN (180 dias por padrão)
+@metrica
+def taxa_churn(indice_recencia, limite_churn):
+    return (indice_recencia.acima(limite_churn) / len(indice_recencia) * 100) if len(indice_recencia) > 0 else 0
+
+
+# 16. TAXA DE RETENÇÃO
+@metrica
+def taxa_retencao(taxa_churn):
+    return 100 - taxa_churn
+
+
+# 17. CLIENTES DORMENTES (90-180 dias sem comprar, por padrão; acima disso é churn)
+@metrica
+def clientes_dormentes(indice_recencia, limite_dormente, limite_churn):
+    """A mesma faixa 'Dormente' de `status_clientes`."""
+    return indice_recencia.entre(limite_dormente, limite_churn)
+
+
+@metrica
+def taxa_dormentes(clientes_dormentes, indice_recencia):
+    return (clientes_dormentes / len(indice_recencia) * 100) if len(indice_recencia) > 0 else 0
+
+
+# 18. CLIENTES EM RISCO (30-90 dias, por padrão)
+@metrica
+def clientes_risco(indice_recencia, limite_risco, limite_dormente):
+    return indice_recencia.entre(limite_risco, limite_dormente)
+
+
+@metrica
+def status_clientes(indice_recencia, limite_risco, limite_dormente, limite_churn):
+    """Clientes por faixa de recência (Ativo, Risco, Dormente, Churn), sem sobreposição."""
+    return indice_recencia.status(limite_risco, limite_dormente, limite_churn)
+
+
+# 19. CLIENTE MELHOR PAGADOR
+@metrica
+def cliente_top(fatos):
+    return fatos['total'].idxmax()
+
+
+@metrica
+def valor_cliente_top(fatos):
+    return fatos['total'].max()
+
+
+# 20. TOP 5 CLIENTES
+@metrica
+def top_5_clientes(fatos):
+    return fatos['total'].nlargest(5).rename('valor').reset_index()
+
+
+# 21. CRESCIMENTO MOM (Mês a Mês)
+@metrica
+def crescimento_mom(vendas_mensais):
+    if len(vendas_mensais) >= 2:
+        return ((vendas_mensais.iloc[-1] - vendas_mensais.iloc[-2]) / vendas_mensais.iloc[-2] * 100) if vendas_mensais.iloc[-2] > 0 else 0
+    return 0
+
+
+# 22. SAZONALIDADE MENSAL
+@metrica
+def vendas_mensais(agregados):
+    return agregados.vendas_mensais()
+
+
+# Série diária do recorte (gráfico de tendência; reduzida com LTTB na tela)
+@metrica
+def vendas_diarias(agregados):
+    diario = agregados.vendas_diarias()
+    return pd.Series(diario['Faturamento'].to_numpy(), index=pd.DatetimeIndex(diario['Data'], name='data'),
+                     name='valor')
+
+
+# 23. DISTRIBUIÇÃO POR DIA DA SEMANA
+@metrica
+def vendas_por_dia_semana(agregados):
+    return agregados.vendas_por_dia_semana()
+
+
+# 24. PROJEÇÃO FINANCEIRA
+@metrica
+def projecao_acumulada(ultima_visita, fatos, imr_global, hoje, limite_churn):
+    """Curva de 1 a 90 dias (ver the_way.projecao): não depende do horizonte escolhido."""
+    return curva_projecao(ultima_visita, fatos, imr_global, hoje, limite_churn)
+
+
+@metrica
+def faturamento_projecao(projecao_acumulada, dias_projecao):
+    return projecao_para(projecao_acumulada, dias_projecao)
+
+
+# 25. MATRIZ RFM (Recency, Frequency, Monetary)
+@metrica
+def rfm(ultima_visita, fatos_bruto):
+    """Tabela RFM completa: dimensões, notas por quintil e segmento de cada cliente."""
+    return tabela_rfm(ultima_visita['dias_parado'], fatos_bruto['compras'], fatos_bruto['total'])
+
+
+@metrica
+def segmentos_rfm(rfm):
+    return resumo_segmentos(rfm)
+
+
+# 26. SEGMENTAÇÃO DE CLIENTES POR FAIXA DE GASTO
+@metrica
+def segmentacao_clientes(fatos_bruto):
+    ltv = fatos_bruto['total']
+    segmento = pd.cut(ltv, bins=[0, ltv.quantile(0.33), ltv.quantile(0.66), ltv.max()],
+                      labels=['Básico', 'Standard', 'Premium'])
+    return segmento.rename('segmento').value_counts()
+
+
+# 27. ELASTICIDADE DE PREÇO (variação de preço vs quantidade)
+@metrica
+def elasticidade_preco(produtos):
+    return pd.concat({'valor': pd.DataFrame({'mean': produtos['sum'] / produtos['count'],
+                                             'count': produtos['count']})}, axis=1)
+
+
+# 28. PRODUTOS MAIS FREQUENTES
+@metrica
+def produtos_frequentes(produtos):
+    return produtos['count'].nlargest(5)
+
+
+# 29. VARIÂNCIA DE VENDAS
+@metrica(aproximacao='desvio_padrao_sketch', banco='desvio_padrao_sql')
+def desvio_padrao(df):
+    return df['valor'].std()
+
+
+@metrica
+def desvio_padrao_sketch(recorte_sketches):
+    """Desvio padrão pelo histograma dos sketches (erro relativo ~1%)."""
+    return recorte_sketches.desvio_padrao()
+
+
+@metrica
+def coeficiente_variacao(desvio_padrao, ticket_medio):
+    return (desvio_padrao / ticket_medio * 100) if ticket_medio > 0 else 0
+
+
+# 30. PERCENTIS DE VENDA (uma única ordenação para os quatro)
+@metrica
+def percentil_25(percentis):
+    return percentis.loc[0.25]
+
+
+@metrica
+def percentil_50(percentis):
+    return percentis.loc[0.50]
+
+
+@metrica
+def percentil_75(percentis):
+    return percentis.loc[0.75]
+
+
+@metrica
+def percentil_90(percentis):
+    return percentis.loc[0.90]
+
+
+# 31. ÍNDICE DE CONCENTRAÇÃO (Curva ABC)
+@metrica
+def curva_abc(produtos):
+    abc = produtos['sum'].rename('valor').sort_values(ascending=False).reset_index()
+    abc['Participação %'] = (abc['valor'] / abc['valor'].sum() * 100).round(1)
+    abc['Cumulative %'] = abc['Participação %'].cumsum()
+    return abc
+
+
+# 31b. AFINIDADE DE PRODUTOS (comprados pelos mesmos clientes no recorte)
+@metrica(banco='afinidade_sql')
+def afinidade(df):
+    return AfinidadeProdutos.de_pares(df['cliente_id'], df['produto'])
+
+
+# 32. ANÁLISE DE COHORT (Clientes por período e retenção por coorte de aquisição)
+@metrica(banco='coortes_sql')
+def coortes(df_bruto, fatos_bruto):
+    """Matriz de coortes do histórico inteiro (ver the_way.coortes)."""
+    return MatrizCoortes.de_transacoes(df_bruto, fatos_bruto)
+
+
+@metrica
+def cohort_periodo(coortes):
+    return coortes.ativos_por_mes()
+
+
+# 33. RECOMENDAÇÃO DE AÇÕES
+@metrica
+def recomendacoes(taxa_churn, taxa_dormentes, crescimento_mom, taxa_recorrencia):
+    recomendacoes = []
+    if taxa_churn > 30:
+        recomendacoes.append("🔴 ALERTA: Taxa de churn acima de 30%! Foco em retenção.")
+    if taxa_dormentes > 20:
+        recomendacoes.append("🟡 AVISO: Mais de 20% de clientes dormentes. Campanhas de reativação necessárias.")
+    if crescimento_mom < 0:
+        recomendacoes.append("📉 Vendas em queda MoM. Revisar estratégia.")
+    if taxa_recorrencia > 50:
+        recomendacoes.append("✅ Excelente! Mais de 50% de clientes recorrentes.")
+    if len(recomendacoes) == 0:
+        recomendacoes.append("✅ Dashboard operacional. Monitore continuamente.")
+    return recomendacoes
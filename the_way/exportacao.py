@@ -0,0 +1,167 @@
+"""Exportações sob demanda (Excel e CSV) geradas em segundo plano.
+
+Nada é montado enquanto ninguém pede o arquivo. Ao pedir, a geração vai para
+um pool de threads do processo e grava direto em disco (CSV em blocos, Excel
+com o xlsxwriter quando instalado). O arquivo fica em cache pela chave do
+filtro, então um novo download do mesmo recorte, de qualquer sessão, é imediato.
+
+O diretório é limpo a cada nova geração: saem os arquivos sem uso há mais de
+IDADE_MAXIMA_DIAS e, se ainda passar de LIMITE_MB, os usados há mais tempo.
+Cada consulta a um arquivo pronto renova a data dele, e nada usado nos
+últimos CARENCIA_SEGUNDOS é apagado (o download oferecido segue valendo).
+"""
+import hashlib
+import importlib.util
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from the_way import ingestao
+
+DIRETORIO = ingestao.DIRETORIO_CACHE / "exportacoes"
+
+# xlsxwriter é bem mais rápido que o openpyxl para escrever; usa se estiver instalado
+MOTOR_EXCEL = 'xlsxwriter' if importlib.util.find_spec('xlsxwriter') else 'openpyxl'
+
+LINHAS_POR_BLOCO = 100_000
+
+# Limpeza do cache de exportações (por idade e por tamanho total)
+IDADE_MAXIMA_DIAS = float(os.environ.get("THE_WAY_EXPORTACOES_DIAS", "7"))
+LIMITE_MB = float(os.environ.get("THE_WAY_EXPORTACOES_MB", "1024"))
+CARENCIA_SEGUNDOS = 600
+
+# Espera curta após o clique: arquivos pequenos já saem prontos no mesmo rerun
+ESPERA_SEGUNDOS = 3
+
+TIPOS = {
+    'xlsx': "application/vnd.ms-excel",
+    'csv': "text/csv",
+}
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="exportacao")
+_tarefas = {}
+_trava = threading.Lock()
+
+
+def chave_exportacao(*partes):
+    """Chave estável para um recorte (dataset, filtros, tipo de relatório...)."""
+    return hashlib.blake2b(repr(partes).encode(), digest_size=16).hexdigest()
+
+
+def caminho(chave, extensao):
+    return DIRETORIO / f"{chave}.{extensao}"
+
+
+def escrever_csv(destino, df):
+    """CSV gravado em blocos de linhas, sem montar a string inteira em memória."""
+    # Categorias viram objeto uma vez só (só referências aos valores distintos), não a cada bloco
+    df = df.astype({coluna: object for coluna in df.columns if isinstance(df[coluna].dtype, pd.CategoricalDtype)})
+    df.to_csv(destino, index=False, chunksize=LINHAS_POR_BLOCO)
+
+
+def escrever_excel(destino, planilhas):
+    """`planilhas`: {nome da aba: (DataFrame, incluir índice?)}."""
+    with pd.ExcelWriter(destino, engine=MOTOR_EXCEL) as writer:
+        for nome, (tabela, com_indice) in planilhas.items():
+            tabela.to_excel(writer, sheet_name=nome, index=com_indice)
+
+
+ESCRITORES = {
+    'xlsx': escrever_excel,
+    'csv': escrever_csv,
+}
+
+
+def _gerar(escritor, dados, destino):
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    temporario = destino.with_name(f"{destino.stem}.{threading.get_ident()}.tmp{destino.suffix}")
+    try:
+        escritor(temporario, dados)
+        os.replace(temporario, destino)
+    finally:
+        temporario.unlink(missing_ok=True)
+    return destino
+
+
+def limpar_antigos():
+    """Apaga exportações vencidas e, acima do limite de espaço, as usadas há mais tempo.
+
+    Arquivos em geração ou usados há menos de CARENCIA_SEGUNDOS ficam
+    (temporários só saem depois de vencidos). Devolve quantos foram apagados.
+    """
+    try:
+        entradas = sorted((item.stat().st_mtime, item.stat().st_size, item)
+                          for item in DIRETORIO.iterdir() if item.is_file())
+    except OSError:
+        return 0
+    with _trava:
+        em_geracao = set(_tarefas)
+    agora = time.time()
+    vencimento = agora - IDADE_MAXIMA_DIAS * 86400
+    total = sum(tamanho for _, tamanho, _ in entradas)
+    apagados = 0
+    for modificado, tamanho, item in entradas:
+        if modificado >= vencimento and total <= LIMITE_MB * 1024 * 1024:
+            break
+        if (item in em_geracao or modificado > agora - CARENCIA_SEGUNDOS
+                or (".tmp" in item.suffixes and modificado >= vencimento)):
+            continue
+        item.unlink(missing_ok=True)
+        total -= tamanho
+        apagados += 1
+    return apagados
+
+
+def solicitar(chave, extensao, dados):
+    """Agenda a geração (se ainda não existe nem está em andamento) e devolve a situação.
+
+    `dados` é o DataFrame (csv) ou o dicionário de abas (xlsx); a escrita roda
+    numa thread do pool.
+    """
+    destino = caminho(chave, extensao)
+    with _trava:
+        nova = not destino.exists() and destino not in _tarefas
+        if nova:
+            _tarefas[destino] = _executor.submit(_gerar, ESCRITORES[extensao], dados, destino)
+    if nova:
+        limpar_antigos()
+    return situacao(chave, extensao)
+
+
+def situacao(chave, extensao):
+    """'pronto', 'gerando', 'erro' ou None (nunca solicitado)."""
+    destino = caminho(chave, extensao)
+    with _trava:
+        tarefa = _tarefas.get(destino)
+        if tarefa is not None and tarefa.done():
+            del _tarefas[destino]
+            if tarefa.exception() is not None:
+                return 'erro'
+    try:
+        # Renova a data de uso: o arquivo oferecido para download fica na carência da limpeza
+        os.utime(destino)
+        return 'pronto'
+    except FileNotFoundError:
+        return 'gerando' if tarefa is not None else None
+
+
+def aguardar(chave, extensao, segundos):
+    """Espera a geração por até `segundos` (para o caso comum de arquivos pequenos)."""
+    with _trava:
+        tarefa = _tarefas.get(caminho(chave, extensao))
+    if tarefa is not None:
+        try:
+            tarefa.result(timeout=segundos)
+        except Exception:
+            pass
+
+
+def ler(chave, extensao):
+    """Conteúdo do arquivo pronto, ou None se ele já saiu do cache."""
+    try:
+        return caminho(chave, extensao).read_bytes()
+    except FileNotFoundError:
+        return None
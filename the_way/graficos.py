@@ -0,0 +1,108 @@
+"""Gráficos e tabelas leves: agregação e redução de pontos no servidor.
+
+Séries diárias longas viram baldes de semana ou mês conforme o tamanho do
+período, linhas com muitos pontos são reduzidas com LTTB (Largest Triangle
+Three Buckets, que preserva picos e vales) e acima de LIMITE_WEBGL pontos o
+Plotly desenha em WebGL. Tabelas longas vão para o navegador em páginas.
+"""
+import math
+
+import numpy as np
+import pandas as pd
+
+# Barras por gráfico antes de trocar dia -> semana -> mês
+ALVO_BARRAS = 120
+
+# Pontos de uma linha depois do LTTB
+LIMITE_PONTOS_LINHA = 500
+
+# Acima disso o traço usa WebGL (scattergl)
+LIMITE_WEBGL = 1000
+
+LINHAS_POR_PAGINA = 50
+
+BALDES = {
+    'D': "dia",
+    'W': "semana",
+    'M': "mês",
+}
+
+
+def escolher_balde(dias, alvo=ALVO_BARRAS):
+    """'D', 'W' ou 'M': o menor balde que deixa até `alvo` barras num período de `dias` dias."""
+    if dias <= alvo:
+        return 'D'
+    if dias / 7 <= alvo:
+        return 'W'
+    return 'M'
+
+
+def agrupar_periodo(diario, balde, coluna_data='Data'):
+    """Soma as colunas numéricas de uma tabela diária por semana ou mês (início do período)."""
+    if balde == 'D' or len(diario) == 0:
+        return diario
+    inicio = pd.to_datetime(diario[coluna_data]).dt.to_period(balde).dt.start_time.dt.date
+    return diario.drop(columns=coluna_data).groupby(inicio.rename(coluna_data)).sum().reset_index()
+
+
+def lttb(x, y, limite=LIMITE_PONTOS_LINHA):
+    """Índices dos `limite` pontos escolhidos pelo LTTB (primeiro e último sempre ficam)."""
+    n = len(x)
+    if limite >= n or limite < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    bordas = np.linspace(1, n - 1, limite - 1).astype(np.int64)
+    escolhidos = np.empty(limite, dtype=np.int64)
+    escolhidos[0], escolhidos[-1] = 0, n - 1
+    anterior = 0
+    for i in range(limite - 2):
+        inicio, fim = bordas[i], bordas[i + 1]
+        # Vértice do triângulo no balde seguinte: a média dele
+        proximo_fim = bordas[i + 2] if i + 2 < len(bordas) else n
+        media_x, media_y = x[fim:proximo_fim].mean(), y[fim:proximo_fim].mean()
+        area = np.abs((x[anterior] - media_x) * (y[inicio:fim] - y[anterior])
+                      - (x[anterior] - x[inicio:fim]) * (media_y - y[anterior]))
+        anterior = inicio + int(np.argmax(area))
+        escolhidos[i + 1] = anterior
+    return escolhidos
+
+
+def reduzir_serie(serie, limite=LIMITE_PONTOS_LINHA):
+    """Série com no máximo `limite` pontos (x = data num índice de datas; senão, a posição)."""
+    if len(serie) <= limite:
+        return serie
+    x = serie.index.asi8 if isinstance(serie.index, pd.DatetimeIndex) else np.arange(len(serie))
+    return serie.iloc[lttb(x, serie.to_numpy(), limite)]
+
+
+def modo_render(pontos):
+    """`render_mode` do plotly express: WebGL acima de LIMITE_WEBGL pontos."""
+    return 'webgl' if pontos > LIMITE_WEBGL else 'svg'
+
+
+def mostrar_tabela_paginada(alvo, tabela, chave, linhas_por_pagina=LINHAS_POR_PAGINA, ordenavel=False):
+    """Mostra `tabela` em `alvo` (st, coluna...) enviando só a página atual ao navegador.
+
+    Com `ordenavel=True` a ordenação é escolhida aqui e aplicada à tabela inteira
+    antes do recorte (no navegador só daria para ordenar a página).
+    """
+    if ordenavel and len(tabela) > linhas_por_pagina:
+        col_ordem, col_sentido = alvo.columns([3, 1])
+        opcoes = [tabela.index.name or 'índice'] + tabela.columns.tolist()
+        coluna = col_ordem.selectbox("Ordenar por:", opcoes, key=f"{chave}_ordem")
+        crescente = col_sentido.checkbox("Crescente", value=False, key=f"{chave}_crescente")
+        if coluna == opcoes[0]:
+            tabela = tabela.sort_index(ascending=crescente)
+        else:
+            tabela = tabela.sort_values(coluna, ascending=crescente, kind='stable')
+
+    total = len(tabela)
+    if total <= linhas_por_pagina:
+        alvo.dataframe(tabela, use_container_width=True)
+        return
+    paginas = math.ceil(total / linhas_por_pagina)
+    pagina = alvo.number_input(f"Página (de {paginas}):", min_value=1, max_value=paginas, value=1, key=f"{chave}_pagina")
+    inicio = (pagina - 1) * linhas_por_pagina
+    alvo.dataframe(tabela.iloc[inicio:inicio + linhas_por_pagina], use_container_width=True)
+    alvo.caption(f"Linhas {inicio + 1}–{min(inicio + linhas_por_pagina, total)} de {total}")
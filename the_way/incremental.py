@@ -0,0 +1,195 @@
+"""Estado agregado incremental dos clientes.
+
+Guarda só dados por cliente: primeira e última compra, número de compras e
+total gasto (a tabela fato das métricas de cliente). Totais por dia e por
+produto saem do cubo (the_way.cubo). Valores são acumulados em centavos
+inteiros, então atualizar o estado com as linhas novas dá exatamente o mesmo
+resultado que recalcular tudo do zero.
+
+O estado é persistido no diretório de cache, um por nome de arquivo, com a
+chave do dataset de origem: reabrir a mesma planilha não relê nada. Quando o
+upload do dia começa com as mesmas linhas já ingeridas, só o delta é
+agregado. A conferência do prefixo ainda passa por todas as linhas antigas
+(uma assinatura somada linha a linha, vetorizada: ~0,1s por milhão de
+linhas), então o custo de uma atualização é esse hash mais a agregação do
+delta, não só o delta.
+"""
+import os
+import pickle
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from the_way import ingestao
+
+DIAS_SEMANA = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+MODOS = {
+    'memoria': "🧮 Estatísticas em memória",
+    'persistido': "🧮 Estatísticas do cache",
+    'incremental': "🧮 Estatísticas incrementais",
+    'completo': "🧮 Estatísticas recalculadas",
+}
+
+_memoria = OrderedDict()
+_trava = threading.Lock()
+
+
+def centavos(valores):
+    """Converte reais (float) em centavos inteiros."""
+    return np.rint(np.asarray(valores, dtype=np.float64) * 100).astype(np.int64)
+
+
+def assinatura_linhas(df):
+    """Soma (mod 2**64) dos hashes de cada linha, índice (dia ou posição) incluído."""
+    hashes = pd.util.hash_pandas_object(df[ingestao.COLUNAS], index=True)
+    return int(hashes.to_numpy().sum(dtype=np.uint64))
+
+
+def _vazio_clientes():
+    return pd.DataFrame({
+        'primeira_compra': pd.Series(dtype='datetime64[ns]'),
+        'ultima_compra': pd.Series(dtype='datetime64[ns]'),
+        'compras': pd.Series(dtype=np.int64),
+        'centavos': pd.Series(dtype=np.int64),
+    })
+
+
+@dataclass
+class EstadoAgregado:
+    linhas: int = 0
+    assinatura: int = 0
+    chave: str = None  # dataset (ingestao.chave_conteudo) de que o estado saiu
+    clientes: pd.DataFrame = field(default_factory=_vazio_clientes)
+    _fatos: pd.DataFrame = field(default=None, repr=False, compare=False)
+
+    @classmethod
+    def de_transacoes(cls, df):
+        """Recalcula o estado do zero."""
+        estado = cls()
+        estado.atualizar(df)
+        return estado
+
+    def atualizar(self, delta):
+        """Agrega as linhas novas ao estado. Custo proporcional ao tamanho do delta."""
+        if len(delta) == 0:
+            return self
+        self.mesclar(EstadoAgregado._agregar(delta))
+        self.assinatura = (self.assinatura + assinatura_linhas(delta)) % 2 ** 64
+        return self
+
+    @staticmethod
+    def _agregar(df):
+        parcial = EstadoAgregado(linhas=len(df))
+        parcial.clientes = pd.DataFrame({'data': df['data'], 'centavos': centavos(df['valor']),
+                                         'cliente_id': df['cliente_id']}).groupby('cliente_id', observed=True).agg(
+            primeira_compra=('data', 'min'),
+            ultima_compra=('data', 'max'),
+            compras=('data', 'size'),
+            centavos=('centavos', 'sum'),
+        )
+        parcial.clientes.index = ingestao.sem_categorias(parcial.clientes.index)
+        return parcial
+
+    def mesclar(self, outro):
+        """Incorpora outro estado (de linhas disjuntas) a este."""
+        if outro.linhas == 0:
+            return self
+        self._fatos = None
+        self.linhas += outro.linhas
+        self.clientes = _mesclar_clientes(self.clientes, outro.clientes)
+        return self
+
+    def tabela_clientes(self):
+        """Mesmas colunas de `clientes.tabela_clientes`, a partir do estado (memorizada)."""
+        if self._fatos is not None:
+            return self._fatos
+        fatos = self.clientes.rename(columns={'centavos': 'total'})
+        fatos['total'] = fatos['total'] / 100
+        fatos['ticket_medio'] = fatos['total'] / fatos['compras']
+        fatos['dias_entre_compras'] = (fatos['ultima_compra'] - fatos['primeira_compra']).dt.days
+        intervalos = fatos['compras'] - 1
+        fatos['intervalo_medio'] = fatos['dias_entre_compras'] / intervalos.where(intervalos > 0)
+        self._fatos = fatos
+        return fatos
+
+
+def _mesclar_clientes(base, novos):
+    if len(base) == 0:
+        return novos.copy()
+    posicoes = base.index.get_indexer(novos.index)
+    existentes = posicoes >= 0
+    if existentes.any():
+        ids = novos.index[existentes]
+        atuais = base.loc[ids]
+        chegando = novos.loc[ids]
+        base.loc[ids, 'primeira_compra'] = np.minimum(atuais['primeira_compra'], chegando['primeira_compra'])
+        base.loc[ids, 'ultima_compra'] = np.maximum(atuais['ultima_compra'], chegando['ultima_compra'])
+        base.loc[ids, 'compras'] = atuais['compras'] + chegando['compras']
+        base.loc[ids, 'centavos'] = atuais['centavos'] + chegando['centavos']
+    if not existentes.all():
+        base = pd.concat([base, novos[~existentes]]).sort_index()
+    return base
+
+
+def _caminho_estado(nome_arquivo):
+    nome = re.sub(r'[^A-Za-z0-9_.-]+', '_', nome_arquivo)
+    return ingestao.DIRETORIO_CACHE / f"estado_{nome}.v{ingestao.VERSAO_FORMATO}.pkl"
+
+
+def _ler_estado(caminho):
+    try:
+        with open(caminho, 'rb') as arquivo:
+            return pickle.load(arquivo)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+        return None
+
+
+def _gravar_estado(estado, caminho):
+    """Grava num temporário próprio da thread e renomeia (duas sessões podem gravar o mesmo arquivo)."""
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    temporario = caminho.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(temporario, 'wb') as arquivo:
+            pickle.dump(estado, arquivo, protocol=pickle.HIGHEST_PROTOCOL)
+        temporario.replace(caminho)
+    finally:
+        temporario.unlink(missing_ok=True)
+
+
+def estado_para(nome_arquivo, chave, df):
+    """Devolve (estado, modo) para o dataset, reaproveitando o que já foi ingerido.
+
+    `modo` é 'memoria', 'persistido', 'incremental' ou 'completo'. O estado
+    persistido do mesmo dataset é conferido só pela chave; o incremental
+    confere a assinatura do prefixo (O(histórico)) antes de agregar o delta.
+    """
+    with _trava:
+        if chave in _memoria:
+            _memoria.move_to_end(chave)
+            return _memoria[chave], 'memoria'
+
+    caminho = _caminho_estado(nome_arquivo)
+    estado = _ler_estado(caminho)
+    if estado is not None and estado.chave == chave and estado.linhas == len(df):
+        modo = 'persistido'
+    elif (estado is not None and 0 < estado.linhas < len(df)
+            and estado.assinatura == assinatura_linhas(df.iloc[:estado.linhas])):
+        estado.atualizar(df.iloc[estado.linhas:])
+        modo = 'incremental'
+    else:
+        estado = EstadoAgregado.de_transacoes(df)
+        modo = 'completo'
+
+    if modo != 'persistido':
+        estado.chave = chave
+        _gravar_estado(estado, caminho)
+    with _trava:
+        _memoria[chave] = estado
+        while len(_memoria) > ingestao.MAX_EM_MEMORIA:
+            _memoria.popitem(last=False)
+    return estado, modo
@@ -0,0 +1,370 @@
+"""Ingestão das planilhas de vendas com cache colunar em disco.
+
+A planilha enviada é identificada pelo hash do conteúdo. Na primeira carga ela
+é lida do Excel e gravada em formato Arrow (Feather v2, sem compressão) no
+diretório de cache; as cargas seguintes, mesmo em outra sessão ou depois de um
+restart do servidor, abrem esse arquivo por memory-map.
+
+As linhas são gravadas ordenadas por data (ordenação estável) e com índice
+`dia` (int32, dias desde 1970-01-01); linhas sem data ficam de fora. Um
+filtro de período vira então duas buscas binárias no índice e uma fatia
+contígua, sem cópia.
+
+O modelo em memória é compacto: cliente_id e produto são categorias (códigos
+inteiros sobre os valores distintos ordenados), gravadas no Arrow como
+dictionary. `relatorio_memoria` compara os bytes por coluna com o modelo
+amplo (texto como objeto Python, dia em int64).
+
+Para planilhas grandes há o modo streaming: as linhas são lidas com o openpyxl
+em modo read-only, em lotes de tamanho fixo, convertidas e validadas lote a
+lote e gravadas direto no arquivo Arrow do cache; ordenação e categorias
+são feitas no próprio Arrow (`ordenar_lotes`), sem colunas de objetos no
+pandas. O pico de memória fica próximo do tamanho final dos dados em vez de
+várias vezes maior.
+"""
+import hashlib
+import io
+import os
+import threading
+import time
+import warnings
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from pyarrow import feather
+
+from the_way.armazem import ARMAZEM
+
+DIRETORIO_CACHE = Path(os.environ.get("THE_WAY_CACHE_DIR", ".cache_the_way"))
+
+# Mudou a conversão? Incremente para não reaproveitar arquivos antigos.
+VERSAO_FORMATO = 4
+
+# Quantos datasets têm estruturas derivadas (estado, cubo, sketches) em memória.
+# Os próprios DataFrames ficam no armazém do processo (the_way.armazem).
+MAX_EM_MEMORIA = 4
+
+# Colunas obrigatórias da planilha (o modo streaming lê apenas estas)
+COLUNAS = ['data', 'cliente_id', 'produto', 'valor']
+
+TAMANHO_LOTE = 50_000
+
+# Acima deste tamanho o app sugere o modo streaming
+LIMITE_STREAMING_BYTES = 20 * 1024 * 1024
+
+INDICE_DIA = 'dia'
+
+# Colunas de texto guardadas como categorias: códigos inteiros + valores distintos ordenados
+COLUNAS_CATEGORICAS = ('cliente_id', 'produto')
+
+ESQUEMA_LOTES = pa.schema([
+    ('data', pa.timestamp('ns')),
+    ('cliente_id', pa.string()),
+    ('produto', pa.string()),
+    ('valor', pa.float64()),
+])
+
+ORIGENS = {
+    'memoria': "🧠 Cache em memória",
+    'disco': "💾 Cache em disco",
+    'excel': "📄 Lido do Excel",
+}
+
+@dataclass
+class ResultadoIngestao:
+    df: pd.DataFrame
+    chave: str
+    origem: str
+    segundos: float
+
+    @property
+    def cache_hit(self):
+        return self.origem != 'excel'
+
+    def descricao(self):
+        return f"{ORIGENS[self.origem]} · {self.segundos:.2f}s"
+
+
+def chave_conteudo(conteudo):
+    """Hash do conteúdo do arquivo (identifica a planilha no cache)."""
+    return hashlib.blake2b(conteudo, digest_size=16).hexdigest()
+
+
+def ler_excel(conteudo):
+    """Leitura direta da planilha, sem cache."""
+    df = pd.read_excel(io.BytesIO(conteudo))
+    df['data'] = pd.to_datetime(df['data'], format='mixed', dayfirst=True)
+    return df
+
+
+def numero_dia(data):
+    """Dias desde 1970-01-01 de uma data (date, Timestamp ou datetime64)."""
+    return int(np.datetime64(data, 'D').astype(np.int64))
+
+
+def numeros_dia(datas):
+    """`numero_dia` vetorizado (int64)."""
+    return np.asarray(datas, dtype='datetime64[ns]').astype('datetime64[D]').astype(np.int64)
+
+
+def ordenar_por_data(df):
+    """Ordena por data (estável: mesma data mantém a ordem da planilha), indexa pelo dia e compacta.
+
+    Linhas sem data (célula vazia) não têm dia: saem do dataset com um aviso.
+    """
+    sem_data = df['data'].isna().to_numpy()
+    if sem_data.any():
+        warnings.warn(f"{int(sem_data.sum())} linha(s) sem data ignorada(s)", stacklevel=2)
+        df = df[~sem_data]
+    if not df['data'].is_monotonic_increasing:
+        df = df.sort_values('data', kind='stable')
+    return compactar(df.set_axis(pd.Index(numeros_dia(df['data']).astype(np.int32), name=INDICE_DIA), axis=0))
+
+
+def compactar(df):
+    """cliente_id e produto de texto viram categorias (se repetirem o bastante).
+
+    Agrupar, filtrar e contar passam a trabalhar nos códigos inteiros, sem
+    hashing de strings, e cada valor distinto fica uma vez só na memória. O
+    Arrow do cache guarda as colunas já codificadas (dictionary).
+    """
+    colunas = {}
+    for coluna in COLUNAS_CATEGORICAS:
+        if coluna in df and df[coluna].dtype == object:
+            categorica = df[coluna].astype('category')
+            if len(categorica.cat.categories) <= len(df) // 2:
+                colunas[coluna] = categorica
+    return df.assign(**colunas) if colunas else df
+
+
+def ordenar_lotes(tabela):
+    """`ordenar_por_data` + `compactar` feitos no Arrow, para a tabela do modo streaming.
+
+    Os textos viram dictionary primeiro (valores distintos ordenados, como no
+    `astype('category')`), direto do arquivo mapeado; depois descarte das
+    linhas sem data e ordenação são um único `take` sobre códigos, datas e
+    valores. O pandas só recebe as colunas já compactas.
+    """
+    import pyarrow.compute as pc
+
+    sem_data = tabela['data'].null_count
+    for coluna in COLUNAS_CATEGORICAS:
+        distintos = pc.unique(tabela[coluna]).drop_null()
+        if len(distintos) > (len(tabela) - sem_data) // 2:
+            continue
+        distintos = distintos.take(pc.sort_indices(distintos))
+        codigos = pc.index_in(tabela[coluna], value_set=distintos).cast(pa.int32())
+        codificada = pa.chunked_array([pa.DictionaryArray.from_arrays(parte, distintos) for parte in codigos.chunks],
+                                      type=pa.dictionary(pa.int32(), distintos.type))
+        tabela = tabela.set_column(tabela.schema.get_field_index(coluna), coluna, codificada)
+
+    if sem_data:
+        warnings.warn(f"{sem_data} linha(s) sem data ignorada(s)", stacklevel=2)
+    # Ordenação estável; as linhas sem data ficam no fim e são cortadas
+    ordem = pc.sort_indices(tabela, sort_keys=[('data', 'ascending')], null_placement='at_end')
+    tabela = tabela.take(ordem[:len(tabela) - sem_data])
+    del ordem
+    df = tabela.to_pandas(split_blocks=True, self_destruct=True)
+    del tabela
+    return df.set_axis(pd.Index(numeros_dia(df['data']).astype(np.int32), name=INDICE_DIA), axis=0)
+
+
+def posicoes_em(indice, coluna):
+    """`indice.get_indexer(coluna)`; numa coluna categórica só os valores distintos são procurados."""
+    if isinstance(coluna.dtype, pd.CategoricalDtype):
+        codigos = coluna.cat.codes.to_numpy()
+        return np.where(codigos >= 0, indice.get_indexer(coluna.cat.categories)[codigos], -1)
+    return indice.get_indexer(coluna)
+
+
+def sem_categorias(indice):
+    """Índice de um groupby sobre coluna categórica com os próprios valores (como no groupby do texto)."""
+    if isinstance(indice, pd.CategoricalIndex):
+        return indice.astype(indice.categories.dtype)
+    return indice
+
+
+def relatorio_memoria(df):
+    """Bytes por coluna (e do índice) no modelo compacto e no amplo (texto como objeto, dia em int64)."""
+    amplo = df.astype({coluna: object for coluna in df.columns if isinstance(df[coluna].dtype, pd.CategoricalDtype)})
+    amplo.index = amplo.index.astype(np.int64)
+
+    def tipos(tabela):
+        return pd.concat([pd.Series({'Index': tabela.index.dtype}), tabela.dtypes]).astype(str)
+
+    relatorio = pd.DataFrame({
+        'tipo antes': tipos(amplo),
+        'bytes antes': amplo.memory_usage(deep=True),
+        'tipo depois': tipos(df),
+        'bytes depois': df.memory_usage(deep=True),
+    })
+    relatorio.loc['Total'] = ['', relatorio['bytes antes'].sum(), '', relatorio['bytes depois'].sum()]
+    relatorio['redução %'] = (1 - relatorio['bytes depois'] / relatorio['bytes antes']) * 100
+    return relatorio
+
+
+def fatia_periodo(df, inicio=None, fim=None):
+    """Linhas com data em [inicio, fim] (datas, inclusivo; None = sem limite).
+
+    Com o índice de `ordenar_por_data` são duas buscas binárias e uma fatia
+    sem cópia; sem ele, uma máscara sobre os números de dia.
+    """
+    if inicio is None and fim is None:
+        return df
+    d0 = None if inicio is None else numero_dia(inicio)
+    d1 = None if fim is None else numero_dia(fim)
+    if df.index.name == INDICE_DIA and df.index.is_monotonic_increasing:
+        return df.loc[d0:d1]
+    dias = numeros_dia(df['data'])
+    mascara = np.ones(len(df), dtype=bool)
+    if d0 is not None:
+        mascara &= dias >= d0
+    if d1 is not None:
+        mascara &= dias <= d1
+    return df[mascara]
+
+
+def caminho_cache(chave):
+    return DIRETORIO_CACHE / f"{chave}.v{VERSAO_FORMATO}.arrow"
+
+
+def _converter_lote(linhas, posicoes, primeira_linha):
+    """Converte um lote de tuplas do openpyxl em RecordBatch, validando os tipos."""
+    colunas = {nome: [linha[i] if i < len(linha) else None for linha in linhas]
+               for nome, i in posicoes.items()}
+
+    datas = pd.to_datetime(pd.Series(colunas['data'], dtype=object), format='mixed',
+                           dayfirst=True, errors='coerce')
+    valores = pd.to_numeric(pd.Series(colunas['valor'], dtype=object), errors='coerce')
+
+    for nome, convertida in (('data', datas), ('valor', valores)):
+        invalidas = np.flatnonzero(convertida.isna().to_numpy()
+                                   & pd.notna(pd.Series(colunas[nome], dtype=object)).to_numpy())
+        if len(invalidas):
+            linha = primeira_linha + int(invalidas[0])
+            raise ValueError(f"Linha {linha}: valor inválido na coluna '{nome}' "
+                             f"({colunas[nome][invalidas[0]]!r})")
+
+    return pa.record_batch([
+        pa.array(datas.to_numpy(), type=pa.timestamp('ns')),
+        pa.array([None if v is None else str(v) for v in colunas['cliente_id']], type=pa.string()),
+        pa.array([None if v is None else str(v) for v in colunas['produto']], type=pa.string()),
+        pa.array(valores.to_numpy(dtype=np.float64), type=pa.float64()),
+    ], schema=ESQUEMA_LOTES)
+
+
+def ler_excel_em_lotes(conteudo, destino, tamanho_lote=TAMANHO_LOTE, progresso=None):
+    """Lê a planilha em lotes (openpyxl read-only) gravando direto no Arrow de destino.
+
+    `progresso(fracao, linhas_lidas)` é chamado a cada lote. Levanta ValueError
+    se faltar coluna obrigatória ou se alguma célula de data/valor for inválida.
+    """
+    import openpyxl  # só aqui: fora do streaming, é o pandas que o importa (e só numa leitura a frio)
+
+    livro = openpyxl.load_workbook(io.BytesIO(conteudo), read_only=True, data_only=True)
+    temporario = destino.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        planilha = livro.active
+        total = max((planilha.max_row or 0) - 1, 0)
+        linhas = planilha.iter_rows(values_only=True)
+
+        cabecalho = [str(c).strip() if c is not None else '' for c in next(linhas, ())]
+        faltando = [c for c in COLUNAS if c not in cabecalho]
+        if faltando:
+            raise ValueError(f"Colunas obrigatórias ausentes: {', '.join(faltando)}")
+        posicoes = {c: cabecalho.index(c) for c in COLUNAS}
+
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        lidas = 0
+        with pa.OSFile(str(temporario), 'wb') as arquivo, \
+                pa.ipc.new_file(arquivo, ESQUEMA_LOTES) as escritor:
+            lote = []
+            numero_linha = 2  # linha 1 é o cabeçalho
+            for linha in linhas:
+                if linha is None or all(v is None for v in linha):
+                    numero_linha += 1
+                    continue
+                if not lote:
+                    inicio_lote = numero_linha
+                lote.append(linha)
+                numero_linha += 1
+                if len(lote) == tamanho_lote:
+                    escritor.write_batch(_converter_lote(lote, posicoes, inicio_lote))
+                    lidas += len(lote)
+                    lote = []
+                    if progresso is not None:
+                        progresso(min(lidas / total, 1.0) if total else 0.0, lidas)
+            if lote:
+                escritor.write_batch(_converter_lote(lote, posicoes, inicio_lote))
+                lidas += len(lote)
+        if progresso is not None:
+            progresso(1.0, lidas)
+        os.replace(temporario, destino)
+    finally:
+        livro.close()
+        temporario.unlink(missing_ok=True)
+
+
+def _gravar_cache(df, caminho):
+    """Grava o Arrow num temporário e renomeia (outra sessão pode estar lendo)."""
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    temporario = caminho.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        feather.write_feather(df, temporario, compression='uncompressed')
+        os.replace(temporario, caminho)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, OSError):
+        # Colunas com tipos misturados ou disco sem espaço: segue sem cache em disco
+        temporario.unlink(missing_ok=True)
+
+
+def _ler_cache(caminho):
+    tabela = feather.read_table(caminho, memory_map=True)
+    return tabela.to_pandas(split_blocks=True)
+
+
+def ler_planilha(conteudo, chave, streaming=False, progresso=None):
+    """Lê do cache em disco ou do Excel (gravando o cache), sem passar pelo armazém.
+
+    Devolve (df, origem). É o caminho dos processos de trabalho, que não
+    devem guardar nada no armazém do processo.
+    """
+    caminho = caminho_cache(chave)
+    if caminho.exists():
+        return _ler_cache(caminho), 'disco'
+    if streaming:
+        # Os lotes chegam na ordem da planilha: ordena e compacta no Arrow e grava o cache final
+        lotes = caminho.with_name(caminho.name + '.lotes')
+        ler_excel_em_lotes(conteudo, lotes, progresso=progresso)
+        df = ordenar_lotes(feather.read_table(lotes, memory_map=True))
+        _gravar_cache(df, caminho)
+        lotes.unlink(missing_ok=True)
+    else:
+        df = ordenar_por_data(ler_excel(conteudo))
+        _gravar_cache(df, caminho)
+    if caminho.exists():
+        # Guarda a versão mapeada do arquivo: a cópia lida do Excel é liberada antes
+        del df
+        df = _ler_cache(caminho)
+    return df, 'excel'
+
+
+def carregar_planilha(conteudo, streaming=False, progresso=None):
+    """Carrega a planilha pelo caminho mais rápido disponível: memória, disco ou Excel.
+
+    Com `streaming=True` uma leitura a frio usa `ler_excel_em_lotes`; o resultado
+    fica num cache separado, pois só traz as colunas obrigatórias.
+    """
+    inicio = time.perf_counter()
+    chave = chave_conteudo(conteudo) + ('.lotes' if streaming else '')
+
+    df = ARMAZEM.obter(chave)
+    if df is not None:
+        origem = 'memoria'
+    else:
+        df, origem = ler_planilha(conteudo, chave, streaming, progresso)
+        df = ARMAZEM.guardar(chave, df)
+
+    return ResultadoIngestao(df, chave, origem, time.perf_counter() - inicio)
@@ -0,0 +1,177 @@
+"""Instrumentação opcional do caminho quente: tempo e memória por etapa e por métrica.
+
+Cada rerun cria um `Medidor`. O script chama `marcar("etapa")` ao entrar em
+cada trecho (carga, filtros, seções da tela...): a etapa anterior termina
+onde a próxima começa, sem reindentar o código da tela. As métricas do grafo
+de estatísticas são cronometradas pelo observador de `Estatisticas` (tempo
+próprio, sem as dependências). `finalizar()` devolve o registro do rerun, que
+vai para o histórico da sessão.
+
+A memória (opcional) usa tracemalloc, que é do processo inteiro e deixa o
+código mais lento: com várias sessões simultâneas os números se misturam.
+"""
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+from datetime import datetime
+
+import pandas as pd
+
+MB = 1024 * 1024
+
+HISTORICO_MAXIMO = 50
+
+# Liga a instrumentação em todas as sessões (o painel continua só para admin)
+ATIVA_POR_PADRAO = os.environ.get("THE_WAY_INSTRUMENTACAO", "0") == "1"
+
+_usuarios_tracemalloc = 0
+_trava = threading.Lock()
+
+
+def _iniciar_tracemalloc():
+    global _usuarios_tracemalloc
+    with _trava:
+        if _usuarios_tracemalloc == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _usuarios_tracemalloc += 1
+
+
+def _parar_tracemalloc():
+    global _usuarios_tracemalloc
+    with _trava:
+        _usuarios_tracemalloc -= 1
+        if _usuarios_tracemalloc == 0:
+            tracemalloc.stop()
+
+
+class Medidor:
+    """Cronômetro de um rerun. Inativo, todos os métodos são no-ops baratos."""
+
+    def __init__(self, ativo=ATIVA_POR_PADRAO, memoria=False):
+        self.ativo = ativo
+        self.memoria = memoria and ativo
+        self.instante = datetime.now().isoformat(timespec='seconds')
+        self.etapas = []
+        self.metricas = []
+        self._atual = None
+        self._inicio = time.perf_counter()
+        if self.memoria:
+            _iniciar_tracemalloc()
+
+    def marcar(self, nome):
+        """Encerra a etapa em andamento e começa `nome`."""
+        if not self.ativo:
+            return
+        self._encerrar_etapa()
+        if self.memoria:
+            tracemalloc.reset_peak()
+        self._atual = (nome, time.perf_counter(), self._memoria_atual())
+
+    def _memoria_atual(self):
+        return tracemalloc.get_traced_memory()[0] if self.memoria else 0
+
+    def _encerrar_etapa(self):
+        if self._atual is None:
+            return
+        nome, inicio, memoria_inicial = self._atual
+        etapa = {'nome': nome, 'segundos': time.perf_counter() - inicio}
+        if self.memoria:
+            etapa['pico_mb'] = (tracemalloc.get_traced_memory()[1] - memoria_inicial) / MB
+        self.etapas.append(etapa)
+        self._atual = None
+
+    def medir_metrica(self, nome, calcular):
+        """Observador de `Estatisticas`: roda `calcular()` e registra tempo e memória alocada."""
+        memoria_inicial = self._memoria_atual()
+        inicio = time.perf_counter()
+        valor = calcular()
+        metrica = {'nome': nome, 'segundos': time.perf_counter() - inicio}
+        if self.memoria:
+            metrica['alocado_mb'] = (self._memoria_atual() - memoria_inicial) / MB
+        self.metricas.append(metrica)
+        return valor
+
+    def observar(self, stats):
+        """Liga (ou desliga) o cronômetro de métricas num avaliador `Estatisticas`."""
+        stats.observador = self.medir_metrica if self.ativo else None
+        return stats
+
+    def _liberar_tracemalloc(self):
+        if self.memoria:
+            _parar_tracemalloc()
+            self.memoria = False
+
+    def __del__(self):
+        # Rerun interrompido (st.stop, exceção) antes de finalizar()
+        self._liberar_tracemalloc()
+
+    def finalizar(self):
+        """Registro do rerun (ou None se inativo)."""
+        if not self.ativo:
+            return None
+        self._encerrar_etapa()
+        self._liberar_tracemalloc()
+        return {
+            'instante': self.instante,
+            'total_segundos': time.perf_counter() - self._inicio,
+            'etapas': self.etapas,
+            'metricas': self.metricas,
+        }
+
+
+def medidor_da_sessao(sessao):
+    """Medidor do rerun conforme as opções do painel (ou THE_WAY_INSTRUMENTACAO=1)."""
+    return Medidor(ativo=sessao.get('instrumentar', ATIVA_POR_PADRAO),
+                   memoria=sessao.get('instrumentar_memoria', False))
+
+
+def historico_da_sessao(sessao, chave="historico_instrumentacao"):
+    """Histórico rolante (últimos HISTORICO_MAXIMO reruns) guardado na sessão."""
+    if chave not in sessao:
+        sessao[chave] = deque(maxlen=HISTORICO_MAXIMO)
+    return sessao[chave]
+
+
+def concluir(sessao, medidor):
+    """Fecha o rerun e guarda o registro no histórico da sessão."""
+    registro = medidor.finalizar()
+    historico = historico_da_sessao(sessao)
+    if registro is not None:
+        historico.append(registro)
+    return historico
+
+
+def para_json(historico):
+    return json.dumps(list(historico), ensure_ascii=False, indent=2)
+
+
+def mostrar_painel(alvo, historico):
+    """Painel do admin em `alvo` (st.sidebar ou st): opções, último rerun, latência e JSON."""
+    painel = alvo.expander("🛠️ Instrumentação")
+    painel.checkbox("Instrumentar reruns", value=ATIVA_POR_PADRAO, key='instrumentar')
+    painel.checkbox("Medir memória (mais lento)", key='instrumentar_memoria')
+    if not historico:
+        painel.caption("Nenhum rerun registrado ainda.")
+        return
+
+    ultimo = historico[-1]
+    painel.metric("⏱️ Último rerun", f"{ultimo['total_segundos'] * 1000:.0f} ms")
+    painel.line_chart(pd.DataFrame({'segundos': [r['total_segundos'] for r in historico]}), height=120)
+
+    painel.markdown("**Etapas**")
+    painel.dataframe(pd.DataFrame(ultimo['etapas']).sort_values('segundos', ascending=False),
+                     hide_index=True, use_container_width=True)
+    if ultimo['metricas']:
+        painel.markdown("**Métricas calculadas**")
+        painel.dataframe(pd.DataFrame(ultimo['metricas']).sort_values('segundos', ascending=False).head(10),
+                         hide_index=True, use_container_width=True)
+
+    painel.download_button(
+        label="📥 Histórico (JSON)",
+        data=para_json(historico),
+        file_name=f"instrumentacao_theway_{datetime.now().strftime('%Y%m%d_%H%M')}.json",
+        mime="application/json"
+    )
@@ -0,0 +1,101 @@
+"""Pré-aquecimento do processo: o primeiro usuário depois de um restart já encontra tudo pronto.
+
+Cada planilha carregada fica registrada como o último dataset (nome e chave,
+num arquivo do diretório de cache). Com THE_WAY_PREAQUECER=1, a primeira
+execução do app num processo novo dispara uma thread que, enquanto a tela de
+login é exibida:
+
+- importa os módulos que o app só carrega quando a função é usada (leitura
+  em streaming, afinidade de produtos, exportação Excel);
+- abre o último dataset do cache em disco no armazém, com estado agregado e
+  cubo;
+- calcula as estatísticas sem filtro no cache de resultados do processo.
+
+Quando o usuário envia a mesma planilha, leitura, estado e estatísticas saem
+da memória.
+"""
+import importlib
+import json
+import os
+import threading
+import time
+
+from the_way import cubo, estatisticas, exportacao, incremental, ingestao
+from the_way.armazem import ARMAZEM
+
+ATIVO = os.environ.get("THE_WAY_PREAQUECER", "0") == "1"
+
+# Importados sob demanda pelo app (ver ingestao.ler_excel_em_lotes e afinidade.AfinidadeProdutos)
+MODULOS_SOB_DEMANDA = ('openpyxl', 'scipy.sparse', exportacao.MOTOR_EXCEL)
+
+ARQUIVO_ULTIMO = ingestao.DIRETORIO_CACHE / "ultimo_dataset.json"
+
+_iniciado = False
+_trava = threading.Lock()
+situacao = {'etapa': None, 'chave': None, 'segundos': None}
+
+
+def registrar(nome_arquivo, chave):
+    """Anota o dataset carregado como o próximo a pré-aquecer."""
+    try:
+        ARQUIVO_ULTIMO.parent.mkdir(parents=True, exist_ok=True)
+        ARQUIVO_ULTIMO.write_text(json.dumps({'nome': nome_arquivo, 'chave': chave}), encoding='utf-8')
+    except OSError:
+        pass
+
+
+def ultimo_dataset():
+    """(nome, chave) do último dataset com cache em disco, ou None."""
+    try:
+        registro = json.loads(ARQUIVO_ULTIMO.read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return None
+    if not ingestao.caminho_cache(registro['chave']).exists():
+        return None
+    return registro['nome'], registro['chave']
+
+
+def importar_modulos(modulos=MODULOS_SOB_DEMANDA):
+    for modulo in modulos:
+        try:
+            importlib.import_module(modulo)
+        except ImportError:
+            pass
+
+
+def aquecer_dataset(nome_arquivo, chave, dias_projecao=30):
+    """Carrega o dataset no armazém e calcula as estatísticas sem filtro no cache do processo."""
+    df_bruto = ARMAZEM.obter(chave)
+    if df_bruto is None:
+        df_bruto = ARMAZEM.guardar(chave, ingestao._ler_cache(ingestao.caminho_cache(chave)))
+    estado, _ = incremental.estado_para(nome_arquivo, chave, df_bruto)
+    stats = estatisticas.Estatisticas(
+        impressao=chave, df_bruto=df_bruto, hoje=df_bruto['data'].max(), dias_projecao=dias_projecao,
+        estado=estado, cubo_vendas=cubo.cubo_para(chave, df_bruto))
+    stats.calcular(trabalhadores=1)
+
+
+def preaquecer():
+    inicio = time.perf_counter()
+    try:
+        situacao['etapa'] = 'modulos'
+        importar_modulos()
+        ultimo = ultimo_dataset()
+        if ultimo is not None:
+            situacao.update(etapa='dataset', chave=ultimo[1])
+            aquecer_dataset(*ultimo)
+    except Exception:
+        situacao['etapa'] = 'erro'
+        raise
+    situacao.update(etapa='pronto', segundos=time.perf_counter() - inicio)
+
+
+def iniciar():
+    """Dispara o pré-aquecimento em segundo plano uma vez por processo (se ATIVO)."""
+    global _iniciado
+    with _trava:
+        if _iniciado or not ATIVO:
+            return False
+        _iniciado = True
+    threading.Thread(target=preaquecer, name="preaquecimento", daemon=True).start()
+    return True
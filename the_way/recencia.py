@@ -0,0 +1,40 @@
+"""Índice de recência: dias desde a última compra de cada cliente, ordenados.
+
+Montado uma vez por dataset (e data de referência). Quantos clientes estão
+em qualquer janela de recência é uma busca binária, então os limites de
+risco, dormência e churn podem mudar na tela sem recalcular nada.
+"""
+import numpy as np
+import pandas as pd
+
+# Limites padrão (dias sem comprar)
+LIMITES_PADRAO = {'risco': 30, 'dormente': 90, 'churn': 180}
+
+STATUS = ['Ativo', 'Risco', 'Dormente', 'Churn']
+
+
+class IndiceRecencia:
+    def __init__(self, dias_parado):
+        self.dias = np.sort(np.asarray(dias_parado, dtype=np.int64))
+
+    def __len__(self):
+        return len(self.dias)
+
+    @property
+    def nbytes(self):
+        return self.dias.nbytes
+
+    def acima(self, limite):
+        """Clientes com mais de `limite` dias sem comprar."""
+        return len(self.dias) - int(np.searchsorted(self.dias, limite, side='right'))
+
+    def entre(self, inicio, fim):
+        """Clientes com recência em (inicio, fim]."""
+        lo, hi = np.searchsorted(self.dias, [inicio, fim], side='right')
+        return int(max(hi - lo, 0))
+
+    def status(self, risco, dormente, churn):
+        """Clientes por faixa, sem sobreposição: Ativo (até `risco` dias), Risco, Dormente e Churn."""
+        cortes = np.searchsorted(self.dias, [risco, dormente, churn], side='right')
+        bordas = np.concatenate([[0], np.maximum.accumulate(cortes), [len(self.dias)]])
+        return pd.Series(np.diff(bordas), index=pd.Index(STATUS, name='status'), name='clientes')
@@ -0,0 +1,67 @@
+"""RFM vetorizado: recência, frequência e valor com notas de 1 a 5 e segmentos nomeados.
+
+As três dimensões vêm da tabela fato por cliente (um único groupby já feito
+na ingestão). Cada dimensão vira nota de 1 a 5 por quintil do ranking; a
+recência é invertida (comprou há menos dias = nota maior). O segmento sai de
+uma tabela 5 × 5 indexada pela nota de recência e pela média das notas de
+frequência e valor, então a classificação inteira são operações de array,
+sem laço por cliente.
+"""
+import numpy as np
+import pandas as pd
+
+# Segmentos na ordem de exibição (do melhor para o pior)
+SEGMENTOS = [
+    'Champions', 'Loyal Customers', 'Potential Loyalists', 'New Customers', 'Promising',
+    'Need Attention', 'About to Sleep', "Can't Lose Them", 'At Risk', 'Hibernating',
+]
+
+# Linhas: nota de recência 1..5; colunas: nota média de frequência/valor 1..5
+_MAPA_SEGMENTOS = np.array([
+    ['Hibernating', 'Hibernating', 'At Risk', 'At Risk', "Can't Lose Them"],
+    ['Hibernating', 'Hibernating', 'At Risk', 'At Risk', "Can't Lose Them"],
+    ['About to Sleep', 'About to Sleep', 'Need Attention', 'Loyal Customers', 'Loyal Customers'],
+    ['Promising', 'Potential Loyalists', 'Potential Loyalists', 'Loyal Customers', 'Loyal Customers'],
+    ['New Customers', 'Potential Loyalists', 'Potential Loyalists', 'Champions', 'Champions'],
+])
+_CODIGOS_MAPA = pd.Categorical(_MAPA_SEGMENTOS.ravel(), categories=SEGMENTOS).codes.reshape(5, 5)
+
+
+def notas_quintil(valores, maior_melhor=True):
+    """Nota de 1 a 5 pelo quintil do ranking; valores empatados recebem a mesma nota."""
+    ranking = pd.Series(valores).rank(method='average', pct=True, ascending=maior_melhor).to_numpy()
+    return np.ceil(ranking * 5).clip(1, 5).astype(np.int8)
+
+
+def tabela_rfm(recencia, frequencia, valor):
+    """Tabela completa por cliente: dimensões, notas R/F/M, código RFM e segmento."""
+    notas_r = notas_quintil(recencia, maior_melhor=False)
+    notas_f = notas_quintil(frequencia)
+    notas_m = notas_quintil(valor)
+    # Média de F e M arredondada para cima (3 e 4 -> 4)
+    notas_fm = (notas_f.astype(np.int16) + notas_m + 1) // 2
+    segmento = pd.Categorical.from_codes(_CODIGOS_MAPA[notas_r - 1, notas_fm - 1], categories=SEGMENTOS)
+    return pd.DataFrame({
+        'recency': recencia,
+        'frequency': frequencia,
+        'monetary': valor,
+        'R': notas_r,
+        'F': notas_f,
+        'M': notas_m,
+        'rfm': notas_r.astype(np.int16) * 100 + notas_f * 10 + notas_m,
+        'segmento': segmento,
+    }, index=recencia.index)
+
+
+def resumo_segmentos(tabela):
+    """Clientes, faturamento e médias por segmento, com participação percentual."""
+    resumo = tabela.groupby('segmento', observed=False).agg(
+        clientes=('monetary', 'size'),
+        faturamento=('monetary', 'sum'),
+        recencia_media=('recency', 'mean'),
+        frequencia_media=('frequency', 'mean'),
+    )
+    resumo['pct_clientes'] = resumo['clientes'] / max(len(tabela), 1) * 100
+    total = resumo['faturamento'].sum()
+    resumo['pct_faturamento'] = resumo['faturamento'] / total * 100 if total else 0.0
+    return resumo[resumo['clientes'] > 0]
@@ -0,0 +1,220 @@
+"""Sketches por célula dia × produto para contagem de distintos e percentis aproximados.
+
+Modo opcional para datasets muito grandes: em vez de ordenar os valores ou
+fazer hash dos clientes do recorte a cada mudança de filtro, cada célula do
+cubo guarda dois resumos mescláveis, montados uma vez por dataset:
+
+- Clientes distintos: HyperLogLog com 2**12 registros, guardado de forma
+  esparsa (só os registros tocados pela célula). Mesclar é tirar o máximo por
+  registro. Erro padrão de 1,04/√4096 ≈ 1,6% (≈ 3,2% em 95% dos casos); para
+  poucos clientes a correção por contagem linear deixa o resultado bem mais
+  preciso que isso.
+- Percentis de valor: histograma logarítmico no estilo DDSketch com precisão
+  relativa α = 1%. As contagens por faixa são exatas e nenhuma faixa é
+  descartada, então o percentil devolvido fica a no máximo 1% do valor
+  verdadeiro (mais a diferença de interpolação entre duas vendas vizinhas).
+
+Um filtro vira a mesma fatia de células do cubo (`CuboVendas.recortar`), e os
+sketches da fatia são mesclados sob demanda.
+"""
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from the_way import ingestao
+
+# HyperLogLog
+PRECISAO_HLL = 12
+REGISTROS = 1 << PRECISAO_HLL
+_BITS_RESTO = 64 - PRECISAO_HLL
+_ALFA_HLL = 0.7213 / (1 + 1.079 / REGISTROS)
+ERRO_PADRAO_CLIENTES = 1.04 / math.sqrt(REGISTROS)
+
+# Histograma logarítmico (DDSketch)
+PRECISAO_RELATIVA = 0.01
+_GAMA = (1 + PRECISAO_RELATIVA) / (1 - PRECISAO_RELATIVA)
+_LOG_GAMA = math.log(_GAMA)
+VALOR_MINIMO = 0.01  # valores absolutos menores contam como zero
+_DESLOCAMENTO = 1 << 15  # faixas negativas (estornos) ficam abaixo do deslocamento
+
+_memoria = OrderedDict()
+_trava = threading.Lock()
+
+
+def _hll_registros(cliente_id):
+    """Registro (12 bits mais altos do hash) e posição do primeiro bit 1 no resto."""
+    if isinstance(cliente_id, pd.Categorical):
+        # Um hash por cliente distinto; o último (código -1) é o do cliente vazio
+        distintos = np.append(np.asarray(cliente_id.categories, dtype=object), None)
+        hashes = pd.util.hash_array(distintos)[cliente_id.codes]
+    else:
+        hashes = pd.util.hash_array(np.asarray(cliente_id, dtype=object))
+    registro = (hashes >> np.uint64(_BITS_RESTO)).astype(np.int64)
+    resto = (hashes & np.uint64((1 << _BITS_RESTO) - 1)).astype(np.float64)  # < 2**53: conversão exata
+    _, expoente = np.frexp(resto)
+    posto = np.where(resto > 0, _BITS_RESTO + 1 - expoente, _BITS_RESTO + 1)
+    return registro, posto.astype(np.uint8)
+
+
+def _faixas(valores):
+    """Faixa logarítmica de cada valor: 0 para |v| < VALOR_MINIMO, sinal preservado."""
+    absolutos = np.abs(valores)
+    positivos = absolutos >= VALOR_MINIMO
+    faixa = np.zeros(len(valores), dtype=np.int64)
+    faixa[positivos] = np.ceil(np.log(absolutos[positivos] / VALOR_MINIMO) / _LOG_GAMA - 1e-9).astype(np.int64) + 1
+    return np.where(valores < 0, -faixa, faixa)
+
+
+def _valor_da_faixa(faixa):
+    """Representante da faixa: erro relativo de no máximo PRECISAO_RELATIVA."""
+    indice = np.abs(faixa) - 1
+    valor = VALOR_MINIMO * 2 * _GAMA ** indice / (_GAMA + 1)
+    return np.where(faixa == 0, 0.0, np.sign(faixa) * valor)
+
+
+class SketchesVendas:
+    """Sketches esparsos por célula, na mesma grade dia × produto do cubo."""
+
+    def __init__(self, dias, produtos, hll_celula, hll_registro, hll_posto, dd_celula, dd_faixa, dd_contagem):
+        self.dias = dias
+        self.produtos = produtos
+        self.hll_celula = hll_celula        # int64, ordenado
+        self.hll_registro = hll_registro    # uint16
+        self.hll_posto = hll_posto          # uint8
+        self.dd_celula = dd_celula          # int64, ordenado
+        self.dd_faixa = dd_faixa            # int32
+        self.dd_contagem = dd_contagem      # int64
+
+    @classmethod
+    def de_transacoes(cls, df, cubo_vendas):
+        dia = np.searchsorted(cubo_vendas.dias, df['data'].to_numpy().astype('datetime64[D]'))
+        produto = ingestao.posicoes_em(cubo_vendas.produtos, df['produto'])
+        validas = produto >= 0
+        celula = dia[validas].astype(np.int64) * len(cubo_vendas.produtos) + produto[validas]
+
+        registro, posto = _hll_registros(df['cliente_id'].array[validas])
+        hll = pd.Series(posto).groupby(celula * REGISTROS + registro).max()
+        chaves_hll = hll.index.to_numpy()
+
+        faixa = _faixas(df['valor'].to_numpy(dtype=np.float64)[validas])
+        dd = pd.Series(celula * (2 * _DESLOCAMENTO) + faixa + _DESLOCAMENTO).value_counts(sort=False).sort_index()
+        chaves_dd = dd.index.to_numpy()
+
+        return cls(
+            cubo_vendas.dias, cubo_vendas.produtos,
+            chaves_hll // REGISTROS, (chaves_hll % REGISTROS).astype(np.uint16), hll.to_numpy(dtype=np.uint8),
+            chaves_dd // (2 * _DESLOCAMENTO), (chaves_dd % (2 * _DESLOCAMENTO) - _DESLOCAMENTO).astype(np.int32),
+            dd.to_numpy(dtype=np.int64),
+        )
+
+    @classmethod
+    def mesclar(cls, sketches, cubo_vendas):
+        """Sketches de várias bases na grade de `cubo_vendas` (o cubo mesclado delas)."""
+        n_produtos = len(cubo_vendas.produtos)
+        hll_chaves, hll_postos, dd_chaves, dd_contagens = [], [], [], []
+        for s in sketches:
+            linhas, colunas = s.dias_e_produtos_em(cubo_vendas)
+            hll_celula = linhas[s.hll_celula // len(s.produtos)] * n_produtos + colunas[s.hll_celula % len(s.produtos)]
+            dd_celula = linhas[s.dd_celula // len(s.produtos)] * n_produtos + colunas[s.dd_celula % len(s.produtos)]
+            hll_chaves.append(hll_celula * REGISTROS + s.hll_registro)
+            hll_postos.append(s.hll_posto)
+            dd_chaves.append(dd_celula * (2 * _DESLOCAMENTO) + s.dd_faixa + _DESLOCAMENTO)
+            dd_contagens.append(s.dd_contagem)
+        # Mesclar é o máximo por registro (HLL) e a soma por faixa (histograma)
+        hll = pd.Series(np.concatenate(hll_postos)).groupby(np.concatenate(hll_chaves)).max()
+        dd = pd.Series(np.concatenate(dd_contagens)).groupby(np.concatenate(dd_chaves)).sum()
+        chaves_hll, chaves_dd = hll.index.to_numpy(), dd.index.to_numpy()
+        return cls(
+            cubo_vendas.dias, cubo_vendas.produtos,
+            chaves_hll // REGISTROS, (chaves_hll % REGISTROS).astype(np.uint16), hll.to_numpy(dtype=np.uint8),
+            chaves_dd // (2 * _DESLOCAMENTO), (chaves_dd % (2 * _DESLOCAMENTO) - _DESLOCAMENTO).astype(np.int32),
+            dd.to_numpy(dtype=np.int64),
+        )
+
+    def dias_e_produtos_em(self, cubo_vendas):
+        """Posição de cada dia e produto destes sketches na grade de `cubo_vendas`."""
+        return (np.searchsorted(cubo_vendas.dias, self.dias).astype(np.int64),
+                cubo_vendas.produtos.get_indexer(self.produtos).astype(np.int64))
+
+    def _fatia(self, celulas, inicio_celula, fim_celula, mascara_produtos):
+        lo, hi = np.searchsorted(celulas, [inicio_celula, fim_celula])
+        if mascara_produtos is None:
+            return slice(lo, hi)
+        return np.arange(lo, hi)[mascara_produtos[celulas[lo:hi] % len(self.produtos)]]
+
+    def recortar(self, inicio=None, fim=None, produtos=None):
+        """Mescla os sketches do período [inicio, fim] e dos produtos escolhidos."""
+        d0 = 0 if inicio is None else np.searchsorted(self.dias, np.datetime64(inicio, 'D'), side='left')
+        d1 = len(self.dias) if fim is None else np.searchsorted(self.dias, np.datetime64(fim, 'D'), side='right')
+        mascara = None
+        if produtos is not None:
+            mascara = np.zeros(len(self.produtos), dtype=bool)
+            colunas = self.produtos.get_indexer(pd.Index(produtos))
+            mascara[colunas[colunas >= 0]] = True
+        inicio_celula, fim_celula = d0 * len(self.produtos), d1 * len(self.produtos)
+
+        hll = self._fatia(self.hll_celula, inicio_celula, fim_celula, mascara)
+        dd = self._fatia(self.dd_celula, inicio_celula, fim_celula, mascara)
+        return RecorteSketches(self.hll_registro[hll], self.hll_posto[hll], self.dd_faixa[dd], self.dd_contagem[dd])
+
+
+class RecorteSketches:
+    def __init__(self, registro, posto, faixa, contagem):
+        # Máximo posto por registro: presença de cada (registro, posto) e o maior presente
+        presentes = np.bincount(registro.astype(np.int64) * 64 + posto, minlength=REGISTROS * 64).reshape(REGISTROS, 64) > 0
+        self.registros = np.where(presentes.any(axis=1), 63 - np.argmax(presentes[:, ::-1], axis=1), 0)
+        self.histograma = np.bincount(faixa.astype(np.int64) + _DESLOCAMENTO, weights=contagem,
+                                      minlength=2 * _DESLOCAMENTO)
+
+    def clientes_distintos(self):
+        """Estimativa HyperLogLog (com contagem linear para cardinalidades pequenas)."""
+        estimativa = _ALFA_HLL * REGISTROS ** 2 / np.sum(np.exp2(-self.registros.astype(np.float64)))
+        vazios = int(np.count_nonzero(self.registros == 0))
+        if estimativa <= 2.5 * REGISTROS and vazios > 0:
+            estimativa = REGISTROS * math.log(REGISTROS / vazios)
+        return int(round(estimativa))
+
+    @property
+    def linhas(self):
+        return int(self.histograma.sum())
+
+    def desvio_padrao(self):
+        """Desvio padrão amostral com cada venda no representante da sua faixa (erro relativo ~1%)."""
+        if self.linhas < 2:
+            return np.nan
+        faixas = np.flatnonzero(self.histograma)
+        contagem, valores = self.histograma[faixas], _valor_da_faixa(faixas - _DESLOCAMENTO)
+        media = np.dot(contagem, valores) / self.linhas
+        return float(np.sqrt(np.dot(contagem, (valores - media) ** 2) / (self.linhas - 1)))
+
+    def quantis(self, qs):
+        """Percentis (interpolação linear, como `Series.quantile`) sobre as faixas do histograma."""
+        total = self.linhas
+        resultado = pd.Series(np.nan, index=pd.Index(qs, dtype=np.float64))
+        if total == 0:
+            return resultado
+        acumulado = np.cumsum(self.histograma)
+        for q in qs:
+            posicao = q * (total - 1)
+            abaixo, acima = math.floor(posicao), math.ceil(posicao)
+            faixas = np.searchsorted(acumulado, [abaixo, acima], side='right') - _DESLOCAMENTO
+            valor_abaixo, valor_acima = _valor_da_faixa(faixas)
+            resultado[q] = valor_abaixo + (valor_acima - valor_abaixo) * (posicao - abaixo)
+        return resultado
+
+
+def sketches_para(chave, df, cubo_vendas):
+    """Sketches do dataset, montados uma vez por chave de ingestão."""
+    with _trava:
+        if chave in _memoria:
+            _memoria.move_to_end(chave)
+            return _memoria[chave]
+    sketches = SketchesVendas.de_transacoes(df, cubo_vendas)
+    with _trava:
+        _memoria[chave] = sketches
+        while len(_memoria) > ingestao.MAX_EM_MEMORIA:
+            _memoria.popitem(last=False)
+    return sketches